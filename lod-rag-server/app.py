@@ -13,22 +13,34 @@ from urllib.parse import urlparse, parse_qs
 
 from fastapi import FastAPI, HTTPException, Header, BackgroundTasks, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional
 from loguru import logger
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from rag.deadline import SEARCH_DEADLINE_MAX_SECONDS
+from rag.query_log import QUERY_LOG_ENABLED
 from rag.retriever import Retriever
 from rag.bookmark_creator import BookmarkCreator
 from rag.embedder import Embedder
+from rag.corpus import bump_corpus_version
+from rag.rate_limit import limiter_stats
+from rag.reindex import Reindexer, ReindexRunning, get_progress, is_running
 from crawler.lod_crawler import LodCrawler
 from crawler.naver_cafe_crawler import NaverCafeCrawler, CookieExpiredException
-from scheduler.job import start_scheduler, stop_scheduler
+from scheduler.job import start_scheduler, stop_scheduler, warm_popular_queries
+from scheduler.pipeline import PipelineRun, get_pipeline_lock, run_blocking
+from utils.metrics import render as render_metrics
+from utils.stats import (
+    qdrant_stats, readiness, record_bookmark, record_post, snapshot,
+    start_stats_refresher, stop_stats_refresher
+)
 
 ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY", "your-secret-key")
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "100"))
 
 # 전역 인스턴스
 retriever = None
@@ -42,28 +54,35 @@ async def lifespan(app: FastAPI):
 
     logger.info("LOD RAG Server 시작 중...")
 
+    # 검색은 Qdrant가 없어도 로컬 인덱스로 응답 가능 → 먼저 초기화
+    retriever = Retriever(query_log=QUERY_LOG_ENABLED)
+    await retriever.prepare_local_index()
+
     # Qdrant 연결 + 서비스 초기화 (재시도 포함)
     import asyncio
     for attempt in range(5):
         try:
-            retriever = Retriever()
             embedder = Embedder()
             logger.info("Qdrant 연결 완료")
             break
         except Exception as e:
             logger.warning(f"Qdrant 연결 실패 (시도 {attempt + 1}/5): {e}")
-            retriever = None
             embedder = None
             if attempt < 4:
                 await asyncio.sleep(3)
 
-    # 스케줄러 시작
-    start_scheduler()
+    # 스케줄러 시작 (수집 작업 뒤 인기 질문 캐시 예열에 retriever 사용)
+    start_scheduler(retriever)
+    # /health, /stats 카운터: 파일 집계 + Qdrant 건수를 백그라운드로 갱신
+    start_stats_refresher(lambda: embedder)
 
     yield
 
     # 정리
     stop_scheduler()
+    await stop_stats_refresher()
+    if retriever:
+        await retriever.close()
     logger.info("LOD RAG Server 종료")
 
 
@@ -80,6 +99,12 @@ app = FastAPI(
 class SearchRequest(BaseModel):
     query: str
     source_filter: Optional[str] = None  # "lod_nexon" | "naver_cafe" | None
+    # 미지정 시 SEARCH_DEADLINE_SECONDS (1초 단위로 올림)
+    deadline_seconds: Optional[float] = Field(None, gt=0, le=SEARCH_DEADLINE_MAX_SECONDS)
+
+class BatchSearchRequest(BaseModel):
+    queries: list[str]
+    source_filter: Optional[str] = None
 
 class AddRequest(BaseModel):
     title: str
@@ -95,6 +120,11 @@ class CrawlRequest(BaseModel):
 class CrawlUrlRequest(BaseModel):
     url: str
 
+class ReindexRequest(BaseModel):
+    model: Optional[str] = None  # 미지정 시 EMBEDDING_MODEL
+    swap: bool = True  # False면 빌드/검사만
+    force: bool = False  # 검사 실패해도 교체
+
 
 # ─── 엔드포인트 ───
 
@@ -110,13 +140,72 @@ async def search(req: SearchRequest):
     if not req.query.strip():
         raise HTTPException(status_code=400, detail="검색어를 입력해주세요")
 
-    result = retriever.search(
+    result = await retriever.search(
         question=req.query.strip(),
-        source_filter=req.source_filter
+        source_filter=req.source_filter,
+        deadline_seconds=req.deadline_seconds
     )
     return result
 
 
+@app.post("/search/batch")
+async def search_batch(req: BatchSearchRequest, x_admin_key: str = Header(None)):
+    """
+    여러 질문 일괄 검색 (평가 스크립트 / 캐시 예열용)
+    결과는 queries 순서대로 {"results": [/search 응답, ...]}
+    요청 1건이 GPT 답변을 최대 SEARCH_BATCH_MAX_QUERIES번 만들 수 있으므로 관리자 전용
+    """
+    if x_admin_key != ADMIN_SECRET_KEY:
+        raise HTTPException(status_code=403, detail="인증 실패")
+
+    if not retriever:
+        raise HTTPException(status_code=503, detail="RAG 서비스 초기화 중")
+
+    queries = [q.strip() for q in req.queries]
+    if not queries or not all(queries):
+        raise HTTPException(status_code=400, detail="검색어를 입력해주세요")
+    if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 최대 {SEARCH_BATCH_MAX_QUERIES}개까지 검색할 수 있습니다"
+        )
+
+    results = await retriever.search_batch(queries, source_filter=req.source_filter)
+    return {"results": results}
+
+
+@app.post("/search/stream")
+async def search_stream(req: SearchRequest):
+    """
+    /search의 스트리밍 버전 (Server-Sent Events)
+    sources 이벤트(출처+신뢰도)를 먼저 보내고, token 이벤트로 답변을 이어서 전송
+    """
+    if not retriever:
+        raise HTTPException(status_code=503, detail="RAG 서비스 초기화 중")
+
+    if not req.query.strip():
+        raise HTTPException(status_code=400, detail="검색어를 입력해주세요")
+
+    async def event_stream():
+        try:
+            async for event, data in retriever.search_stream(
+                question=req.query.strip(),
+                source_filter=req.source_filter,
+                deadline_seconds=req.deadline_seconds
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"스트리밍 검색 실패: {e}")
+            error = {"message": "검색 중 오류가 발생했습니다."}
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/add")
 async def add(req: AddRequest):
     """수동 데이터 추가 → 책갈피 생성 → 임베딩"""
@@ -152,69 +241,64 @@ async def add(req: AddRequest):
     filepath = os.path.join(data_path, f"{post_id}.json")
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump(raw_post, f, ensure_ascii=False, indent=2)
+    record_post(source)
 
     # 책갈피 생성
     creator = BookmarkCreator()
-    bookmark = creator.create_bookmark(raw_post)
+    bookmark = await run_blocking(creator.create_bookmark, raw_post)
     if not bookmark:
         return {"success": False, "message": "책갈피 생성 실패"}
 
     # 임베딩
     if embedder:
-        embedder.embed_and_save(bookmark)
+        await run_blocking(embedder.embed_and_save, bookmark)
 
     return {"success": True, "bookmark_id": bookmark["bookmark_id"]}
 
 
 @app.get("/health")
 async def health():
-    """헬스체크"""
+    """
+    생존 확인 (Docker HEALTHCHECK용). 디스크/Qdrant 요청 없이 메모리 값만 응답.
+    Qdrant 건수는 백그라운드에서 마지막으로 센 값
+    """
     qdrant_status = "connected" if embedder else "disconnected"
-    stats = embedder.get_stats() if embedder else {}
 
     return {
         "status": "healthy" if embedder else "degraded",
         "qdrant": qdrant_status,
-        **stats
+        **qdrant_stats()
     }
 
 
-@app.get("/stats")
-async def stats():
-    """수집 현황"""
-    import glob
-
-    lod_path = os.getenv("DATA_LOD_PATH", "./data/lod_nexon")
-    cafe_path = os.getenv("DATA_CAFE_PATH", "./data/naver_cafe")
-    bookmark_path = os.getenv("DATA_BOOKMARK_PATH", "./data/bookmarks")
+@app.get("/ready")
+async def ready():
+    """
+    준비 확인: Qdrant 연결 + 시작 시 파일 집계 완료 + 마지막 백그라운드 Qdrant 확인 성공.
+    준비되지 않았으면 503 (로드밸런서/오케스트레이터가 트래픽을 보내지 않도록)
+    """
+    status = readiness()
+    status["checks"]["embedder"] = embedder is not None
+    status["ready"] = status["ready"] and embedder is not None
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
 
-    lod_count = len(glob.glob(os.path.join(lod_path, "*.json")))
-    cafe_count = len(glob.glob(os.path.join(cafe_path, "*.json")))
-    bookmark_count = len(glob.glob(os.path.join(bookmark_path, "*.json")))
 
-    qdrant_stats = embedder.get_stats() if embedder else {}
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 메트릭 (검색 단계별 지연, 캐시 적중, 파이프라인 처리량, 토큰 사용량)"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
-    # 이미지 통계
-    lod_img_count = 0
-    cafe_img_count = 0
-    lod_img_dir = os.path.join(lod_path, "images")
-    cafe_img_dir = os.path.join(cafe_path, "images")
-    if os.path.isdir(lod_img_dir):
-        lod_img_count = len(os.listdir(lod_img_dir))
-    if os.path.isdir(cafe_img_dir):
-        cafe_img_count = len(os.listdir(cafe_img_dir))
 
+@app.get("/stats")
+async def stats():
+    """수집 현황 (이벤트로 갱신되는 카운터 + 백그라운드로 센 Qdrant 건수, 요청 경로에서 glob/Qdrant 호출 없음)"""
     return {
-        "raw_posts": {
-            "lod_nexon": lod_count,
-            "naver_cafe": cafe_count
-        },
-        "images": {
-            "lod_nexon": lod_img_count,
-            "naver_cafe": cafe_img_count
-        },
-        "bookmarks": bookmark_count,
-        "qdrant": qdrant_stats
+        **snapshot(),
+        "cache": retriever.cache_stats() if retriever else {},
+        "rate_limits": limiter_stats()
     }
 
 
@@ -231,36 +315,92 @@ async def crawl(
     async def run_crawl():
         lod_stats = {"new": 0}
         cafe_stats = {"new": 0}
+        run = PipelineRun("수동")
 
-        if req.source in ("all", "lod"):
-            crawler = LodCrawler()
-            lod_stats = crawler.crawl_all(start_page=1, end_page=req.pages)
+        async with get_pipeline_lock():
+            if req.source in ("all", "lod"):
+                lod_stats = await run.stage(
+                    "LOD 크롤링", lambda: LodCrawler().crawl_all(start_page=1, end_page=req.pages)
+                )
 
-        if req.source in ("all", "cafe"):
-            try:
-                cafe_crawler = NaverCafeCrawler()
-                cafe_stats = await cafe_crawler.crawl_all_boards(pages_per_board=req.pages)
-            except CookieExpiredException:
-                logger.warning("네이버 쿠키 만료 — 카페 크롤링 스킵")
-            except FileNotFoundError as e:
-                logger.warning(f"쿠키 파일 없음: {e}")
-
-        # 책갈피 + 임베딩
-        creator = BookmarkCreator()
-        bm_stats = creator.create_all()
+            if req.source in ("all", "cafe"):
+                try:
+                    cafe_crawler = NaverCafeCrawler()
+                    cafe_stats = await run.stage_async(
+                        "카페 크롤링", cafe_crawler.crawl_all_boards(pages_per_board=req.pages)
+                    )
+                except CookieExpiredException:
+                    logger.warning("네이버 쿠키 만료 — 카페 크롤링 스킵")
+                except FileNotFoundError as e:
+                    logger.warning(f"쿠키 파일 없음: {e}")
 
-        if embedder:
-            embedder.process_all()
+            # 책갈피 + 임베딩
+            bm_stats = await run.stage("책갈피", lambda: BookmarkCreator().create_all())
+
+            if embedder:
+                await run.stage("임베딩", embedder.process_all)
+        await warm_popular_queries(run)
 
         logger.info(
             f"수동 크롤링 완료: LOD {lod_stats['new']}건, 카페 {cafe_stats['new']}건, "
-            f"책갈피 {bm_stats['created']}건"
+            f"책갈피 {bm_stats['created']}건 — {run.summary()}"
         )
 
     background_tasks.add_task(run_crawl)
     return {"message": "크롤링 작업 시작됨 (백그라운드 실행)"}
 
 
+@app.post("/admin/reindex")
+async def admin_reindex(
+    req: ReindexRequest,
+    background_tasks: BackgroundTasks,
+    x_admin_key: str = Header(None)
+):
+    """
+    무중단 재색인: 새 버전 컬렉션을 백그라운드로 빌드 → 검사 통과 시 별칭 교체.
+    빌드가 길어 파이프라인 락은 잡지 않음 (그동안 바뀐 책갈피는 교체 직전 따라잡기로 반영).
+    진행 상황은 GET /admin/reindex
+    """
+    if x_admin_key != ADMIN_SECRET_KEY:
+        raise HTTPException(status_code=403, detail="인증 실패")
+    if is_running():
+        raise HTTPException(status_code=409, detail="재색인이 이미 실행 중입니다")
+
+    async def run_reindex():
+        try:
+            result = await run_blocking(Reindexer(model=req.model).run, swap=req.swap, force=req.force)
+            logger.info(f"재색인 완료: {result['collection']} (교체: {result['swapped']}, 검사: {result['check']})")
+        except ReindexRunning as e:
+            logger.warning(str(e))
+        except Exception as e:
+            logger.error(f"재색인 실패: {e}")
+
+    background_tasks.add_task(run_reindex)
+    return {"message": "재색인 시작됨 (백그라운드 실행)", "model": req.model}
+
+
+@app.get("/admin/reindex")
+async def admin_reindex_status(x_admin_key: str = Header(None)):
+    """재색인 진행률 (phase/done/total/검사 결과), 현재 별칭 대상, 롤백 가능한 이전 컬렉션"""
+    if x_admin_key != ADMIN_SECRET_KEY:
+        raise HTTPException(status_code=403, detail="인증 실패")
+    return get_progress()
+
+
+@app.post("/admin/reindex/rollback")
+async def admin_reindex_rollback(x_admin_key: str = Header(None)):
+    """별칭을 직전 컬렉션으로 되돌리기"""
+    if x_admin_key != ADMIN_SECRET_KEY:
+        raise HTTPException(status_code=403, detail="인증 실패")
+    try:
+        target = await run_blocking(Reindexer().rollback)
+    except ReindexRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "collection": target["collection"], "model": target["model"]}
+
+
 @app.post("/admin/crawl-url")
 async def crawl_url(
     req: CrawlUrlRequest,
@@ -332,9 +472,9 @@ async def crawl_url(
 
         # 책갈피 미생성 → 생성 진행
         creator = BookmarkCreator()
-        bookmark = creator.create_bookmark(raw_post)
+        bookmark = await run_blocking(creator.create_bookmark, raw_post)
         if bookmark and embedder:
-            embedder.embed_and_save(bookmark)
+            await run_blocking(embedder.embed_and_save, bookmark)
 
         return {
             "success": True,
@@ -350,7 +490,7 @@ async def crawl_url(
 
     if source == "lod_nexon":
         crawler = LodCrawler()
-        raw_post = crawler.crawl_post(post_id, title="", url=url)
+        raw_post = await run_blocking(crawler.crawl_post, post_id, title="", url=url)
 
     elif source == "naver_cafe":
         try:
@@ -373,12 +513,12 @@ async def crawl_url(
 
     # ── 책갈피 생성 + 임베딩 ──
     creator = BookmarkCreator()
-    bookmark = creator.create_bookmark(raw_post)
+    bookmark = await run_blocking(creator.create_bookmark, raw_post)
     bookmark_id = None
     if bookmark:
         bookmark_id = bookmark["bookmark_id"]
         if embedder:
-            embedder.embed_and_save(bookmark)
+            await run_blocking(embedder.embed_and_save, bookmark)
 
     return {
         "success": True,
@@ -570,7 +710,7 @@ async def admin_exclude_post(
     bookmark_id = f"{source}_{post_id}"
     qdrant_deleted = False
     if embedder:
-        qdrant_deleted = embedder.delete_by_bookmark_id(bookmark_id)
+        qdrant_deleted = await run_blocking(embedder.delete_by_bookmark_id, bookmark_id)
 
     # 3. 책갈피 JSON 삭제
     bookmark_path = os.getenv("DATA_BOOKMARK_PATH", "./data/bookmarks")
@@ -579,7 +719,9 @@ async def admin_exclude_post(
     if os.path.exists(bm_filepath):
         os.remove(bm_filepath)
         bookmark_deleted = True
+        record_bookmark(-1)
 
+    bump_corpus_version([bookmark_id], reason="관리자 제외")
     logger.info(f"게시글 제외: {bookmark_id} (Qdrant: {qdrant_deleted}, 책갈피: {bookmark_deleted})")
 
     return {
@@ -623,6 +765,7 @@ async def admin_include_post(
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
+    bump_corpus_version([f"{source}_{post_id}"], reason="관리자 포함 복원")
     logger.info(f"게시글 포함 복원: {source}_{post_id}")
 
     return {
@@ -16,6 +16,7 @@ from loguru import logger
 from dotenv import load_dotenv
 
 from utils.image_handler import ImageHandler
+from utils.stats import record_post
 
 load_dotenv()
 
@@ -237,6 +238,7 @@ class LodCrawler:
         # JSON 파일 저장
         with open(filepath, "w", encoding="utf-8") as f:
             json.dump(post_data, f, ensure_ascii=False, indent=2)
+        record_post("lod_nexon", has_images=bool(images))
 
         logger.info(f"저장 완료: {post_id} - {title}")
         return post_data
@@ -15,6 +15,7 @@ from loguru import logger
 from dotenv import load_dotenv
 
 from utils.image_handler import ImageHandler
+from utils.stats import record_post
 
 load_dotenv()
 
@@ -362,6 +363,7 @@ class NaverCafeCrawler:
 
             with open(filepath, "w", encoding="utf-8") as f:
                 json.dump(post_data, f, ensure_ascii=False, indent=2)
+            record_post("naver_cafe", has_images=bool(images))
 
             logger.info(f"저장 완료: {article_id} - {title}")
             return post_data
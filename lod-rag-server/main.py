@@ -58,8 +58,81 @@ def cmd_embed_all(args):
     from rag.embedder import Embedder
 
     embedder = Embedder()
-    stats = embedder.process_all()
-    print(f"\n[완료] 임베딩: {stats['saved']}건 저장, {stats['skipped']}건 스킵, {stats['failed']}건 실패")
+    stats = embedder.process_all(stamp_legacy=args.stamp_legacy, reembed_max=args.reembed_max)
+    print(f"\n[완료] 임베딩: {stats['saved']}건 저장, {stats['updated']}건 재임베딩, "
+          f"{stats['skipped']}건 스킵, {stats['failed']}건 실패, 고아 {stats['deleted']}건 삭제"
+          + (f", 지문 기록 {stats['stamped']}건" if stats["stamped"] else ""))
+    print(f"  처리량: {stats['per_second']}건/초 (총 {stats['seconds']}초, "
+          f"임베딩 요청 {stats['embed_calls']}회, 저장 요청 {stats['upsert_calls']}회)")
+
+
+def cmd_migrate_collection(args):
+    """기존 컬렉션에 HNSW/양자화/페이로드 인덱스 설정 적용"""
+    from rag.collection import migrate_collection, PASSAGE_PAYLOAD_INDEXES
+    from rag.embedder import Embedder, COLLECTION
+    from rag.passages import PASSAGE_COLLECTION, PASSAGES_ENABLED
+
+    embedder = Embedder()
+    targets = [(COLLECTION, None)]
+    if PASSAGES_ENABLED:
+        targets.append((PASSAGE_COLLECTION, PASSAGE_PAYLOAD_INDEXES))
+
+    for name, indexes in targets:
+        result = migrate_collection(embedder.qdrant, name, indexes)
+        print(f"\n[완료] 컬렉션 마이그레이션: {name}")
+        print(f"  HNSW: {result['hnsw']}")
+        print(f"  양자화: {result['quantization']}, 벡터 on_disk: {result['vectors_on_disk']}")
+        print(f"  새 페이로드 인덱스: {', '.join(result['payload_indexes_created']) or '없음'}")
+        print(f"  date_key 보강: {result['date_key_backfilled']}건")
+
+
+def cmd_reindex(args):
+    """새 버전 컬렉션 빌드 → 검사 → 별칭 교체 (검색 중단 없음)"""
+    from rag.reindex import Reindexer, ReindexRunning, get_progress
+
+    if args.status:
+        progress = get_progress()
+        active = progress["active"]
+        print(f"\n[재색인] 서비스 컬렉션: {active.get('collection') or '(별칭 없음)'} ({active.get('model') or '-'})")
+        if progress.get("phase"):
+            print(f"  마지막 실행: {progress['phase']} {progress.get('collection')} "
+                  f"{progress.get('done', 0)}/{progress.get('total', 0)}"
+                  + (" (실행 중)" if progress["running"] else ""))
+        if progress.get("check"):
+            print(f"  검사: {progress['check']}")
+        for entry in progress["history"]:
+            print(f"  롤백 대상: {entry['collection']} ({entry.get('model') or '-'})")
+        return
+
+    try:
+        if args.rollback:
+            target = Reindexer().rollback()
+            print(f"\n[완료] 롤백: {target['collection']} ({target['model']})")
+            return
+        result = Reindexer(model=args.model).run(swap=not args.no_swap, force=args.force)
+    except (ReindexRunning, ValueError) as e:
+        print(f"[오류] {e}")
+        return
+
+    check, embed = result["check"], result["embed"]
+    print(f"\n[완료] 재색인: {result['collection']} — {'교체됨' if result['swapped'] else '교체 안 함'}")
+    print(f"  임베딩: {embed['saved']}건 저장, {embed['failed']}건 실패, 따라잡기 {embed['catch_up']}건 "
+          f"({embed['seconds']}초, 저장소 재사용 {embed['store_hits']}건)")
+    print(f"  검사: 포인트 {check['points']}/{check['bookmarks']} (비율 {check['count_ratio']}), "
+          f"재현율 {check['recall']} (표본 {check['sample']}건) — {'통과' if check['passed'] else '실패'}")
+
+
+def cmd_seed_vector_store(args):
+    """현재 컬렉션 벡터를 로컬 임베딩 저장소로 복사"""
+    from rag.embedder import Embedder
+
+    embedder = Embedder()
+    if embedder.store is None:
+        print("[오류] VECTOR_STORE_ENABLED=false — 임베딩 저장소가 꺼져 있습니다")
+        return
+    added = embedder.seed_vector_store()
+    stats = embedder.store.stats()
+    print(f"\n[완료] 임베딩 저장소: {added}건 추가, 총 {stats['vectors']}건 ({stats['model']}, {stats['dim']}차원)")
 
 
 def cmd_search(args):
@@ -67,7 +140,7 @@ def cmd_search(args):
     from rag.retriever import Retriever
 
     retriever = Retriever()
-    result = retriever.search(
+    result = retriever.search_sync(
         question=args.query,
         source_filter=args.source
     )
@@ -83,6 +156,51 @@ def cmd_search(args):
             print(f"  -> {s['url']}")
 
 
+def cmd_bench_search(args):
+    """검색 지연 측정 (LLM_PROVIDER/EMBEDDING_PROVIDER=local이면 네트워크 비용 없이 측정)"""
+    import asyncio
+    import time
+    from rag.retriever import Retriever
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    if not questions:
+        print("[오류] 질문 파일이 비어 있습니다")
+        return
+
+    async def run():
+        retriever = Retriever()
+        await retriever.prepare_local_index()
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def one(question):
+            async with semaphore:
+                start = time.perf_counter()
+                await retriever.search(question)
+                latencies.append(time.perf_counter() - start)
+
+        try:
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                await asyncio.gather(*[one(q) for q in questions])
+            elapsed = time.perf_counter() - start
+            return latencies, elapsed, retriever.cache_stats()
+        finally:
+            await retriever.close()
+
+    latencies, elapsed, cache = asyncio.run(run())
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"\n[벤치마크] 질문 {len(questions)}개 x {args.rounds}회, 동시 {args.concurrency}")
+    print(f"  처리량: {len(latencies) / elapsed:.1f} req/s (총 {elapsed:.2f}초)")
+    print(f"  지연: p50 {pct(0.5):.0f}ms / p95 {pct(0.95):.0f}ms / max {latencies[-1] * 1000:.0f}ms")
+    print(f"  답변 캐시 적중률: {cache['answer']['hit_rate']}")
+
+
 def cmd_stats(args):
     """통계 조회"""
     import os
@@ -147,8 +265,29 @@ def main():
 
     # embed-all
     p_embed = subparsers.add_parser("embed-all", help="전체 임베딩 → Qdrant")
+    p_embed.add_argument("--stamp-legacy", action="store_true",
+                         help="지문 없는 예전 포인트를 재임베딩하지 않고 현재 지문만 기록 (벡터가 최신일 때만)")
+    p_embed.add_argument("--reembed-max", type=int, default=None,
+                         help="이번 실행의 재임베딩 상한 (기본: REEMBED_MAX_PER_RUN, 0: 제한 없음)")
     p_embed.set_defaults(func=cmd_embed_all)
 
+    # migrate-collection
+    p_migrate = subparsers.add_parser("migrate-collection", help="컬렉션 인덱스/HNSW/양자화 설정 적용")
+    p_migrate.set_defaults(func=cmd_migrate_collection)
+
+    # reindex
+    p_reindex = subparsers.add_parser("reindex", help="새 컬렉션 빌드 후 별칭 교체 (무중단 재색인)")
+    p_reindex.add_argument("--model", default=None, help="임베딩 모델 (기본: EMBEDDING_MODEL)")
+    p_reindex.add_argument("--no-swap", action="store_true", help="빌드/검사만 하고 별칭은 그대로")
+    p_reindex.add_argument("--force", action="store_true", help="검사에 실패해도 교체")
+    p_reindex.add_argument("--rollback", action="store_true", help="직전 컬렉션으로 별칭 되돌리기")
+    p_reindex.add_argument("--status", action="store_true", help="진행 상황/롤백 대상 출력")
+    p_reindex.set_defaults(func=cmd_reindex)
+
+    # seed-vector-store
+    p_seed = subparsers.add_parser("seed-vector-store", help="컬렉션 벡터 → 로컬 임베딩 저장소 복사")
+    p_seed.set_defaults(func=cmd_seed_vector_store)
+
     # search
     p_search = subparsers.add_parser("search", help="검색 테스트")
     p_search.add_argument("query", help="검색어")
@@ -156,6 +295,13 @@ def main():
                           help="소스 필터")
     p_search.set_defaults(func=cmd_search)
 
+    # bench-search
+    p_bench = subparsers.add_parser("bench-search", help="검색 지연 벤치마크")
+    p_bench.add_argument("questions", help="질문 파일 (한 줄에 하나)")
+    p_bench.add_argument("--concurrency", type=int, default=4, help="동시 요청 수 (기본: 4)")
+    p_bench.add_argument("--rounds", type=int, default=1, help="반복 횟수 (기본: 1)")
+    p_bench.set_defaults(func=cmd_bench_search)
+
     # stats
     p_stats = subparsers.add_parser("stats", help="데이터 통계")
     p_stats.set_defaults(func=cmd_stats)
@@ -8,18 +8,19 @@ import os
 import glob
 from datetime import datetime
 
-from openai import OpenAI
 from loguru import logger
 from dotenv import load_dotenv
 
+from rag.providers import get_chat_provider
+from rag.rate_limit import map_concurrent
 from utils.image_handler import ImageHandler
+from utils.stats import record_bookmark
 
 load_dotenv()
 
 DATA_LOD_PATH = os.getenv("DATA_LOD_PATH", "./data/lod_nexon")
 DATA_CAFE_PATH = os.getenv("DATA_CAFE_PATH", "./data/naver_cafe")
 DATA_BOOKMARK_PATH = os.getenv("DATA_BOOKMARK_PATH", "./data/bookmarks")
-LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
 
 BOOKMARK_PROMPT = """다음은 어둠의전설 게임 관련 게시글입니다.
@@ -59,7 +60,7 @@ BOOKMARK_PROMPT_WITH_IMAGES = """다음은 어둠의전설 게임 관련 게시
 
 class BookmarkCreator:
     def __init__(self):
-        self.client = OpenAI()
+        self.llm = get_chat_provider()
         os.makedirs(DATA_BOOKMARK_PATH, exist_ok=True)
 
     def _call_gpt(self, title: str, board_name: str, content: str,
@@ -72,7 +73,8 @@ class BookmarkCreator:
         images_b64 = []
         if images and ImageHandler.is_enabled():
             images_b64 = ImageHandler.load_images_as_base64(
-                images, max_count=ImageHandler.IMAGE_MAX_FOR_BOOKMARK
+                images, max_count=ImageHandler.IMAGE_MAX_FOR_BOOKMARK,
+                detail=ImageHandler.IMAGE_VISION_DETAIL_BOOKMARK
             )
 
         # 이미지 유무에 따라 프롬프트/메시지 분기
@@ -93,14 +95,12 @@ class BookmarkCreator:
             max_tokens = 500
 
         try:
-            response = self.client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[{"role": "user", "content": user_content}],
+            result_text = self.llm.complete(
+                [{"role": "user", "content": user_content}],
                 temperature=0.3,
                 max_tokens=max_tokens,
-                response_format={"type": "json_object"}
+                json_mode=True
             )
-            result_text = response.choices[0].message.content.strip()
             return json.loads(result_text)
         except json.JSONDecodeError as e:
             logger.error(f"GPT 응답 JSON 파싱 실패: {e}")
@@ -167,13 +167,26 @@ class BookmarkCreator:
         # 책갈피 JSON 저장
         with open(bookmark_path, "w", encoding="utf-8") as f:
             json.dump(bookmark, f, ensure_ascii=False, indent=2)
+        record_bookmark()
 
         # 원본 JSON의 bookmark_created 플래그 업데이트
         self._update_original(raw_post, source, post_id)
 
+        # 답변용 이미지 축소본 미리 생성 (답변 경로에서 디코딩/인코딩 없도록)
+        if images and ImageHandler.is_enabled():
+            ImageHandler.prepare_derivatives(images[:ImageHandler.IMAGE_MAX_FOR_ANSWER])
+
         logger.info(f"책갈피 생성: {bookmark_id} - {title}")
         return bookmark
 
+    def _create_safely(self, raw_post: dict) -> dict | None:
+        """create_all 워커용: 예외가 나도 다른 게시글 처리는 계속"""
+        try:
+            return self.create_bookmark(raw_post)
+        except Exception as e:
+            logger.error(f"책갈피 생성 실패 {raw_post.get('source')}_{raw_post.get('id')}: {e}")
+            return None
+
     def _update_original(self, raw_post: dict, source: str, post_id: str):
         """원본 JSON의 bookmark_created → True 업데이트"""
         if source == "lod_nexon":
@@ -212,14 +225,10 @@ class BookmarkCreator:
         posts.extend(self._load_raw_posts(DATA_LOD_PATH))
         posts.extend(self._load_raw_posts(DATA_CAFE_PATH))
 
-        created = 0
-        failed = 0
-        for post in posts:
-            result = self.create_bookmark(post)
-            if result:
-                created += 1
-            else:
-                failed += 1
+        # 게시글마다 GPT 호출 1회 → 레이트 리밋 안에서 동시에 처리
+        results = map_concurrent(self._create_safely, posts)
+        created = sum(1 for result in results if result)
+        failed = len(results) - created
 
         stats = {"created": created, "failed": failed, "total": len(posts)}
         logger.info(f"책갈피 생성 완료: {created}건 생성, {failed}건 실패/스킵 (총 {len(posts)}건)")
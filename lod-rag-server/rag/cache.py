@@ -0,0 +1,495 @@
+"""
+검색 경로 캐시 모음
+- TTLCache: 크기 제한 LRU + TTL (hit/miss 카운터 포함)
+- EmbeddingCache: 질문 임베딩 캐시 (메모리 LRU + 선택적 SQLite 영속 계층)
+- SemanticCache: 질문 벡터가 충분히 가까우면 기존 답변 재사용 (의미 캐시)
+- JsonFileCache: 파싱된 원본 JSON 캐시 (mtime/크기로 무효화, 바이트 상한 LRU)
+"""
+
+import asyncio
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+
+from rag.corpus import get_bookmark_versions
+
+load_dotenv()
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/query_embeddings.db")
+# 만료된 행 정리 주기 (서버 시작 시 1회 + 이후 이 간격마다 쓰기 스레드에서)
+EMBEDDING_CACHE_PRUNE_SECONDS = 3600
+EMBEDDING_CACHE_QUEUE_SIZE = 1024
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+
+ORIGINAL_CACHE_MAX_BYTES = int(os.getenv("ORIGINAL_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# 임계값 튜닝용 유사도 분포 구간 (하한 기준)
+SIMILARITY_BUCKETS = (0.80, 0.85, 0.90, 0.93, 0.95, 0.97, 0.99)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """캐시 키용 질문 정규화 (유니코드 NFC, 소문자, 공백 정리)"""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class TTLCache:
+    """크기 제한 LRU + TTL 캐시. 만료/축출은 접근 시점에 처리"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class EmbeddingCache:
+    """
+    질문 임베딩 캐시.
+    키: (임베딩 모델 이름, 정규화된 질문). 메모리 LRU에 없으면 SQLite 계층 조회 →
+    서버 재시작 후에도 자주 묻는 질문은 OpenAI 임베딩 호출 없이 처리.
+    SQLite 쓰기(INSERT + commit)는 큐에 넣고 전용 스레드가 묶어서 처리해 이벤트 루프를 막지 않는다.
+    TTL이 지난 행은 열 때와 EMBEDDING_CACHE_PRUNE_SECONDS마다 삭제.
+    """
+
+    def __init__(self, model: str, max_size: int = EMBEDDING_CACHE_SIZE,
+                 ttl: float = EMBEDDING_CACHE_TTL, path: str = EMBEDDING_CACHE_PATH):
+        self.model = model
+        self.ttl = ttl
+        self.memory = TTLCache(max_size, ttl)
+        self.disk_hits = 0
+        self.disk_dropped = 0  # 쓰기 큐가 가득 차 디스크에 못 남긴 항목
+        self.pruned = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=EMBEDDING_CACHE_QUEUE_SIZE)
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+        self._pruned_at = 0.0
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        """SQLite 영속 계층 열기 + 만료 행 정리 (실패하면 메모리 캐시만 사용)"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL,"
+                " query TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (model, query))"
+            )
+            self._db.commit()
+        except Exception as e:
+            logger.warning(f"임베딩 캐시 DB 열기 실패, 메모리 캐시만 사용: {path} - {e}")
+            self._db = None
+            return
+        self._prune()
+
+    def get(self, text: str) -> list[float] | None:
+        query = normalize_query(text)
+        vector = self.memory.get(query)
+        if vector is not None:
+            return vector
+
+        vector = self._db_get(query)
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.set(query, vector)
+        return vector
+
+    async def aget(self, text: str) -> list[float] | None:
+        """get()의 async 버전: SQLite 조회는 스레드에서 (쓰기 스레드의 commit을 이벤트 루프가 기다리지 않도록)"""
+        query = normalize_query(text)
+        vector = self.memory.get(query)
+        if vector is not None or self._db is None:
+            return vector
+
+        vector = await asyncio.to_thread(self._db_get, query)
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.set(query, vector)
+        return vector
+
+    def set(self, text: str, vector: list[float]):
+        """메모리에 저장하고 디스크 쓰기는 백그라운드 스레드로 넘김 (바로 반환)"""
+        query = normalize_query(text)
+        self.memory.set(query, vector)
+        if self._db is None:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((query, array("f", vector).tobytes(), time.time()))
+        except queue.Full:
+            self.disk_dropped += 1
+
+    def _db_get(self, query: str) -> list[float] | None:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector, created_at FROM query_embeddings WHERE model = ? AND query = ?",
+                    (self.model, query)
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"임베딩 캐시 조회 실패: {e}")
+            return None
+        if not row or row[1] + self.ttl < time.time():
+            return None
+        return array("f", row[0]).tolist()
+
+    def _ensure_writer(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-cache", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # 밀려 있는 항목은 commit 1회로 쓰기
+            batch = [item]
+            stop = False
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._db_write(batch)
+            if time.monotonic() - self._pruned_at >= EMBEDDING_CACHE_PRUNE_SECONDS:
+                self._prune()
+            if stop:
+                return
+
+    def _db_write(self, batch: list[tuple]):
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO query_embeddings (model, query, vector, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(self.model, query, blob, created_at) for query, blob, created_at in batch]
+                )
+                self._db.commit()
+        except Exception as e:
+            logger.warning(f"임베딩 캐시 저장 실패 ({len(batch)}건): {e}")
+
+    def _prune(self):
+        """TTL이 지난 행 삭제 (모든 모델 공통)"""
+        self._pruned_at = time.monotonic()
+        try:
+            with self._db_lock:
+                deleted = self._db.execute(
+                    "DELETE FROM query_embeddings WHERE created_at < ?",
+                    (time.time() - self.ttl,)
+                ).rowcount
+                self._db.commit()
+        except Exception as e:
+            logger.warning(f"임베딩 캐시 정리 실패: {e}")
+            return
+        if deleted:
+            self.pruned += deleted
+            logger.info(f"임베딩 캐시 만료 항목 {deleted}건 삭제")
+
+    def close(self, timeout: float = 2.0):
+        """남은 쓰기를 마치고 스레드 종료 (timeout=0이면 기다리지 않음)"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            if timeout:
+                self._queue.put(None, timeout=timeout)
+            else:
+                self._queue.put_nowait(None)
+        except queue.Full:
+            return
+        if timeout:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        # 메모리 miss 중 디스크에서 찾은 것은 전체 기준으로는 hit
+        hits = memory["hits"] + self.disk_hits
+        total = memory["hits"] + memory["misses"]
+        return {
+            **memory,
+            "hits": hits,
+            "misses": total - hits,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "disk_pending": self._queue.qsize(),
+            "disk_dropped": self.disk_dropped,
+            "pruned": self.pruned,
+            "persistent": self._db is not None
+        }
+
+
+class SemanticCache:
+    """
+    의미 캐시: (질문 벡터, 답변, 인용 책갈피 버전) 저장.
+    새 질문 벡터와 코사인 유사도가 임계값 이상이고, 인용한 책갈피가 그 뒤로 바뀌지 않았으면
+    저장된 답변을 그대로 반환 → 임베딩 1회만으로 응답 (LLM 호출 없음).
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_size: int = SEMANTIC_CACHE_SIZE, ttl: float = SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # 유사도는 충분했지만 인용 책갈피가 바뀌어 버린 경우
+        self.hit_similarity = {b: 0 for b in SIMILARITY_BUCKETS}
+        self.miss_similarity = {b: 0 for b in SIMILARITY_BUCKETS}
+        self._entries: OrderedDict = OrderedDict()
+        # 정규화된 벡터 행렬 (max_size행을 첫 저장 때 한 번 할당, 항목마다 슬롯 1개)
+        self._matrix = None
+        self._valid = None  # 슬롯 사용 여부
+        self._slot_keys: list = []  # 슬롯 → entries 키
+        self._free: list[int] = []  # 비워진 슬롯
+        self._used = 0  # 한 번이라도 쓴 슬롯 수 (행렬 앞부분만 계산)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    @staticmethod
+    def _bucket(similarity: float):
+        found = None
+        for b in SIMILARITY_BUCKETS:
+            if similarity >= b:
+                found = b
+        return found
+
+    def _alloc_slot(self, key, vector: np.ndarray) -> int:
+        """벡터를 빈 슬롯에 기록하고 슬롯 번호 반환 (차원이 바뀌면 행렬을 새로 할당)"""
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            self._entries.clear()
+            self._matrix = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+            self._valid = np.zeros(self.max_size, dtype=bool)
+            self._slot_keys = [None] * self.max_size
+            self._free = []
+            self._used = 0
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._used
+            self._used += 1
+        self._matrix[slot] = vector
+        self._valid[slot] = True
+        self._slot_keys[slot] = key
+        return slot
+
+    def _remove(self, key):
+        """항목 삭제 + 슬롯 반환 (행렬 재구성 없음)"""
+        slot = self._entries.pop(key)["slot"]
+        self._valid[slot] = False
+        self._slot_keys[slot] = None
+        self._free.append(slot)
+
+    def lookup(self, vector: list[float], source_filter: str = None) -> dict | None:
+        """가장 가까운 유효 항목의 답변 반환 (없으면 None)"""
+        with self._lock:
+            if not self._entries or self._matrix.shape[1] != len(vector):
+                self.misses += 1
+                return None
+
+            query = self._normalize(vector)
+            used = self._used
+            similarities = np.where(self._valid[:used], self._matrix[:used] @ query, -np.inf)
+            now = time.monotonic()
+            best_seen = float(similarities.max())
+
+            # 유사도 높은 순으로 필터/만료/책갈피 변경 여부 확인
+            for idx in np.argsort(-similarities):
+                similarity = float(similarities[idx])
+                if similarity < self.threshold:
+                    break
+                key = self._slot_keys[idx]
+                entry = self._entries.get(key)
+                if entry is None or entry["source_filter"] != (source_filter or ""):
+                    continue
+                if entry["expires_at"] < now:
+                    continue
+                versions = entry["bookmark_versions"]
+                if get_bookmark_versions(list(versions)) != versions:
+                    self.stale += 1
+                    self._remove(key)
+                    continue
+
+                self._entries.move_to_end(key)
+                self.hits += 1
+                bucket = self._bucket(similarity)
+                if bucket is not None:
+                    self.hit_similarity[bucket] += 1
+                return entry["result"]
+
+            self.misses += 1
+            bucket = self._bucket(best_seen)
+            if bucket is not None:
+                self.miss_similarity[bucket] += 1
+            return None
+
+    def add(self, vector: list[float], source_filter: str, result: dict, bookmark_ids: list[str]):
+        """답변 저장 (인용 책갈피의 현재 버전을 함께 기록)"""
+        if self.max_size <= 0 or not bookmark_ids:
+            return
+        with self._lock:
+            while len(self._entries) >= self.max_size:
+                self._remove(next(iter(self._entries)))
+            key = self._next_id
+            self._next_id += 1
+            self._entries[key] = {
+                "slot": self._alloc_slot(key, self._normalize(vector)),
+                "source_filter": source_filter or "",
+                "result": result,
+                "bookmark_versions": get_bookmark_versions(bookmark_ids),
+                "expires_at": time.monotonic() + self.ttl
+            }
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            # 구간별 최고 유사도 분포: miss 쪽이 임계값 바로 아래에 몰려 있으면 임계값 완화 검토
+            "hit_similarity": {str(b): n for b, n in self.hit_similarity.items()},
+            "miss_similarity": {str(b): n for b, n in self.miss_similarity.items()}
+        }
+
+
+class JsonFileCache:
+    """
+    파싱된 JSON 파일 캐시 (책갈피 2단계의 원본 게시글 로드용).
+    접근마다 stat 1회로 (mtime, 크기)를 비교해 파일이 바뀌었으면 다시 파싱.
+    캐시 크기는 원본 파일 바이트 합계 기준으로 제한, 넘으면 오래 안 쓴 것부터 축출.
+    """
+
+    def __init__(self, max_bytes: int = ORIGINAL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # path → (mtime_ns, size, data)
+        self._lock = threading.Lock()
+
+    def load(self, filepath: str) -> dict:
+        """JSON 로드 (캐시 우선). 파일이 없으면 FileNotFoundError"""
+        st = os.stat(filepath)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is not None and entry[:2] == stamp:
+                self._entries.move_to_end(filepath)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        with open(filepath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if st.st_size <= self.max_bytes:
+            with self._lock:
+                old = self._entries.pop(filepath, None)
+                if old is not None:
+                    self.total_bytes -= old[1]
+                self._entries[filepath] = (stamp[0], stamp[1], data)
+                self.total_bytes += st.st_size
+                while self.total_bytes > self.max_bytes and self._entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.total_bytes -= evicted[1]
+        return data
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,204 @@
+"""
+Qdrant 컬렉션 설정 관리
+- 페이로드 인덱스: source / board_name / bookmark_id (keyword), date_key (정수 범위)
+- HNSW / on_disk 설정 (환경변수)
+- 선택적 int8 스칼라 양자화 + 검색 시 원본 벡터로 재채점(rescore)
+새 컬렉션은 create_collection()으로 만들고,
+기존 컬렉션은 migrate_collection()으로 같은 설정을 적용 (python main.py migrate-collection).
+"""
+
+import os
+import re
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    CollectionParamsDiff, Disabled, Distance, HnswConfigDiff, Modifier,
+    PayloadSchemaType, QuantizationSearchParams, ScalarQuantization,
+    ScalarQuantizationConfig, ScalarType, SearchParams, SetPayload, SetPayloadOperation,
+    SparseVectorParams, VectorParams, VectorParamsDiff
+)
+from loguru import logger
+from dotenv import load_dotenv
+
+from rag.sparse import SPARSE_VECTOR_NAME
+
+load_dotenv()
+
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() == "true"
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "false").lower() == "true"
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()  # none | int8
+QDRANT_QUANTIZATION_QUANTILE = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", "0.99"))
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+QDRANT_RESCORE_OVERSAMPLING = float(os.getenv("QDRANT_RESCORE_OVERSAMPLING", "2.0"))
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0"))  # 0이면 서버 기본값
+
+# 필터/집계에 쓰는 페이로드 필드 → 인덱스 타입
+PAYLOAD_INDEXES = {
+    "source": PayloadSchemaType.KEYWORD,
+    "board_name": PayloadSchemaType.KEYWORD,
+    "bookmark_id": PayloadSchemaType.KEYWORD,
+    "date_key": PayloadSchemaType.INTEGER,
+}
+# 문단 컬렉션은 부모 책갈피로 묶어 조회
+PASSAGE_PAYLOAD_INDEXES = {
+    "bookmark_id": PayloadSchemaType.KEYWORD,
+}
+
+_DATE = re.compile(r"(\d{4})[.\-/]\s*(\d{1,2})[.\-/]\s*(\d{1,2})")
+
+
+def date_key(date: str) -> int | None:
+    """게시글 날짜 문자열("2024.01.15 10:22", "2024-01-15" 등) → 20240115 (범위 필터용)"""
+    match = _DATE.search(date or "")
+    if not match:
+        return None
+    year, month, day = (int(x) for x in match.groups())
+    return year * 10000 + month * 100 + day
+
+
+def quantization_enabled() -> bool:
+    return QDRANT_QUANTIZATION == "int8"
+
+
+def _hnsw_config() -> HnswConfigDiff:
+    return HnswConfigDiff(
+        m=QDRANT_HNSW_M,
+        ef_construct=QDRANT_HNSW_EF_CONSTRUCT,
+        on_disk=QDRANT_HNSW_ON_DISK
+    )
+
+
+def _quantization_config():
+    if not quantization_enabled():
+        return None
+    return ScalarQuantization(
+        scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8,
+            quantile=QDRANT_QUANTIZATION_QUANTILE,
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM
+        )
+    )
+
+
+def search_params() -> SearchParams | None:
+    """dense 검색 파라미터 (양자화 사용 시 oversampling 후 원본 벡터로 재채점)"""
+    quantization = None
+    if quantization_enabled():
+        quantization = QuantizationSearchParams(
+            rescore=True,
+            oversampling=QDRANT_RESCORE_OVERSAMPLING
+        )
+    if quantization is None and not QDRANT_SEARCH_HNSW_EF:
+        return None
+    return SearchParams(hnsw_ef=QDRANT_SEARCH_HNSW_EF or None, quantization=quantization)
+
+
+def create_collection(client: QdrantClient, name: str, vector_size: int,
+                      sparse: bool = True, indexes: dict = None):
+    """새 컬렉션 생성 (dense + 어휘 sparse 벡터, HNSW/양자화 설정, 페이로드 인덱스)"""
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(
+            size=vector_size,
+            distance=Distance.COSINE,
+            on_disk=QDRANT_VECTORS_ON_DISK
+        ),
+        sparse_vectors_config={
+            SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+        } if sparse else None,
+        hnsw_config=_hnsw_config(),
+        quantization_config=_quantization_config(),
+        on_disk_payload=QDRANT_ON_DISK_PAYLOAD
+    )
+    ensure_payload_indexes(client, name, indexes)
+
+
+def ensure_payload_indexes(client: QdrantClient, name: str, indexes: dict = None) -> list[str]:
+    """없는 페이로드 인덱스만 생성 → 새로 만든 필드 목록"""
+    existing = client.get_collection(name).payload_schema or {}
+    created = []
+    for field, schema in (indexes or PAYLOAD_INDEXES).items():
+        if field in existing:
+            continue
+        client.create_payload_index(collection_name=name, field_name=field, field_schema=schema)
+        created.append(field)
+    if created:
+        logger.info(f"페이로드 인덱스 생성 ({name}): {', '.join(created)}")
+    return created
+
+
+def resolve_collection(client: QdrantClient, name: str) -> str:
+    """별칭이면 가리키는 실제 컬렉션 이름 (재색인 후 QDRANT_COLLECTION은 별칭)"""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+def _backfill_date_keys(client: QdrantClient, name: str) -> int:
+    """
+    date_key가 없는 기존 포인트에 date에서 계산한 값 채우기.
+    스크롤 페이지마다 같은 date_key끼리 묶어 batch_update_points 1회로 기록
+    """
+    updated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=name,
+            limit=256,
+            offset=offset,
+            with_payload=["date", "date_key"],
+            with_vectors=False
+        )
+        groups: dict[int, list] = {}
+        for point in points:
+            payload = point.payload or {}
+            if "date_key" in payload:
+                continue
+            key = date_key(payload.get("date", ""))
+            if key is not None:
+                groups.setdefault(key, []).append(point.id)
+        if groups:
+            client.batch_update_points(
+                collection_name=name,
+                update_operations=[
+                    SetPayloadOperation(set_payload=SetPayload(payload={"date_key": key}, points=ids))
+                    for key, ids in groups.items()
+                ]
+            )
+            updated += sum(len(ids) for ids in groups.values())
+        if offset is None:
+            break
+    return updated
+
+
+def migrate_collection(client: QdrantClient, name: str, indexes: dict = None) -> dict:
+    """
+    기존 컬렉션에 현재 환경변수 설정 적용.
+    HNSW/양자화/on_disk 변경은 Qdrant가 백그라운드 최적화로 반영한다.
+    name이 별칭이면 현재 가리키는 컬렉션에 적용.
+    """
+    name = resolve_collection(client, name)
+    client.update_collection(
+        collection_name=name,
+        vectors_config={"": VectorParamsDiff(on_disk=QDRANT_VECTORS_ON_DISK)},
+        hnsw_config=_hnsw_config(),
+        quantization_config=_quantization_config() or Disabled.DISABLED,
+        collection_params=CollectionParamsDiff(on_disk_payload=QDRANT_ON_DISK_PAYLOAD)
+    )
+    created = ensure_payload_indexes(client, name, indexes)
+    backfilled = _backfill_date_keys(client, name) if "date_key" in (indexes or PAYLOAD_INDEXES) else 0
+
+    result = {
+        "collection": name,
+        "hnsw": {"m": QDRANT_HNSW_M, "ef_construct": QDRANT_HNSW_EF_CONSTRUCT, "on_disk": QDRANT_HNSW_ON_DISK},
+        "quantization": QDRANT_QUANTIZATION,
+        "vectors_on_disk": QDRANT_VECTORS_ON_DISK,
+        "payload_indexes_created": created,
+        "date_key_backfilled": backfilled
+    }
+    logger.info(f"컬렉션 마이그레이션 완료: {result}")
+    return result
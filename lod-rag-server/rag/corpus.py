@@ -0,0 +1,100 @@
+"""
+코퍼스 버전 관리
+Qdrant 컬렉션 내용이 바뀔 때마다 버전을 올려 답변 캐시가 낡은 답변을 내보내지 않게 한다.
+책갈피별로 마지막 변경 버전도 기록 → 의미 캐시는 인용한 책갈피가 그대로인지만 확인.
+CLI(main.py embed-all)처럼 다른 프로세스에서 바뀐 것도 감지하도록 버전은 파일에 저장.
+"""
+
+import json
+import os
+import threading
+
+from loguru import logger
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows 로컬 실행 (쿠키 스크립트 등)
+    fcntl = None
+
+load_dotenv()
+
+CORPUS_VERSION_PATH = os.getenv("CORPUS_VERSION_PATH", "./data/corpus_version.json")
+
+_lock = threading.Lock()
+_cached_stamp: tuple | None = None
+_cached_state = {"version": 0, "bookmarks": {}}
+
+
+def _read_state() -> dict:
+    try:
+        with open(CORPUS_VERSION_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {
+            "version": int(data.get("version", 0)),
+            "bookmarks": data.get("bookmarks", {})
+        }
+    except (FileNotFoundError, ValueError):
+        return {"version": 0, "bookmarks": {}}
+
+
+def _file_stamp() -> tuple:
+    # os.replace로 교체할 때마다 inode가 바뀌므로 mtime 해상도보다 빠른 연속 변경도 구분된다
+    st = os.stat(CORPUS_VERSION_PATH)
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def _current_state() -> dict:
+    """파일이 그대로면 메모리 값 재사용"""
+    global _cached_stamp, _cached_state
+    try:
+        stamp = _file_stamp()
+    except FileNotFoundError:
+        return {"version": 0, "bookmarks": {}}
+
+    with _lock:
+        if stamp != _cached_stamp:
+            _cached_state = _read_state()
+            _cached_stamp = stamp
+        return _cached_state
+
+
+def get_corpus_version() -> int:
+    """현재 코퍼스 버전"""
+    return _current_state()["version"]
+
+
+def get_bookmark_versions(bookmark_ids: list[str]) -> dict:
+    """책갈피별 마지막 변경 버전 (한 번도 바뀐 적 없으면 0)"""
+    changed = _current_state()["bookmarks"]
+    return {bid: changed.get(bid, 0) for bid in bookmark_ids}
+
+
+def bump_corpus_version(bookmark_ids: list[str] = None, reason: str = "") -> int:
+    """코퍼스 변경 기록 → 버전 +1 (프로세스 간 flock으로 증가분 유실 방지)"""
+    global _cached_stamp, _cached_state
+    os.makedirs(os.path.dirname(os.path.abspath(CORPUS_VERSION_PATH)), exist_ok=True)
+
+    with _lock, open(CORPUS_VERSION_PATH + ".lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            state = _read_state()
+            version = state["version"] + 1
+            state["version"] = version
+            for bid in bookmark_ids or []:
+                state["bookmarks"][bid] = version
+
+            tmp_path = CORPUS_VERSION_PATH + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, CORPUS_VERSION_PATH)
+
+            _cached_state = state
+            _cached_stamp = _file_stamp()
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    logger.debug(f"코퍼스 버전 {version}" + (f" ({reason})" if reason else ""))
+    return version
@@ -0,0 +1,49 @@
+"""
+요청 단위 지연 예산 (deadline)
+검색 시작 시점부터 전체 파이프라인이 쓸 수 있는 시간을 정하고,
+각 단계는 남은 시간을 보고 GPT 호출 생략 / Vision 생략 / 타임아웃을 결정한다.
+"""
+
+import math
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 0 이하면 지연 예산 없이 동작
+SEARCH_DEADLINE_SECONDS = float(os.getenv("SEARCH_DEADLINE_SECONDS", "12"))
+# 요청 본문의 deadline_seconds 상한
+SEARCH_DEADLINE_MAX_SECONDS = float(os.getenv("SEARCH_DEADLINE_MAX_SECONDS", "60"))
+# 남은 시간이 이보다 적으면 GPT 호출 없이 요약 응답
+GENERATION_MIN_BUDGET_SECONDS = float(os.getenv("GENERATION_MIN_BUDGET_SECONDS", "2"))
+# 남은 시간이 이보다 적으면 이미지 없이 텍스트로만 답변
+VISION_MIN_BUDGET_SECONDS = float(os.getenv("VISION_MIN_BUDGET_SECONDS", "8"))
+
+
+class Deadline:
+    def __init__(self, seconds: float = SEARCH_DEADLINE_SECONDS):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def can_generate(self) -> bool:
+        return self.remaining() >= GENERATION_MIN_BUDGET_SECONDS
+
+    def can_use_vision(self) -> bool:
+        return self.remaining() >= VISION_MIN_BUDGET_SECONDS
+
+
+def make_deadline(seconds: float = None) -> Deadline | None:
+    """
+    요청 값(없으면 SEARCH_DEADLINE_SECONDS) → Deadline. 0 이하면 None (예산 없음).
+    동일 요청 합치기 키에 들어가므로 1초 단위로 올림하고 SEARCH_DEADLINE_MAX_SECONDS로 제한
+    """
+    if seconds is None:
+        seconds = SEARCH_DEADLINE_SECONDS
+    if seconds <= 0:
+        return None
+    return Deadline(min(math.ceil(seconds), SEARCH_DEADLINE_MAX_SECONDS))
@@ -1,51 +1,121 @@
 """
 책갈피 임베딩 → Qdrant 벡터 DB 저장
+단건 저장(embed_and_save, /add 등)과 일괄 저장(process_all)을 제공.
+일괄 저장은 임베딩을 입력 수/토큰 수 상한으로 묶어 RPM/TPM 한도 안에서 동시에 요청하고
+(rag/rate_limit.py) 포인트를 UPSERT_BATCH_SIZE개씩 저장,
+배치 요청이 실패하면 반씩 나눠 다시 시도해 실패한 항목만 골라낸다.
+포인트 페이로드에는 임베딩 텍스트 해시(embed_hash)와 모델(embed_model)을 남겨
+책갈피 재생성/임베딩 텍스트 형식/모델이 바뀐 책갈피만 다시 임베딩한다.
+벡터를 실제로 임베딩한 텍스트 지문은 vector_hash로 따로 남겨 임베딩 저장소 채우기(seed_vector_store)에 쓴다.
+임베딩은 먼저 로컬 임베딩 저장소(rag/vector_store.py)에서 찾고, 없는 것만 API로 요청해 저장소에 추가.
 """
 
 import json
 import os
 import glob
+import time
 import uuid
 
-from openai import OpenAI
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
-    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+    PointStruct, Filter, FieldCondition, FilterSelector, MatchAny, MatchValue,
+    SetPayload, SetPayloadOperation
 )
 from loguru import logger
 from dotenv import load_dotenv
 
+from rag.collection import (
+    create_collection, date_key, ensure_payload_indexes, PASSAGE_PAYLOAD_INDEXES
+)
+from rag.corpus import bump_corpus_version
+from rag.reindex import active_collection
+from rag.passages import (
+    PASSAGE_COLLECTION, PASSAGES_ENABLED, build_passage_text, passage_point_id, split_passages
+)
+from rag.providers import default_embedding_model, get_embedding_provider, token_batches
+from rag.rate_limit import map_concurrent
+from rag.sparse import SPARSE_VECTOR_NAME, encode_document
+from rag.vector_store import open_vector_store, text_hash
+
 load_dotenv()
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 COLLECTION = os.getenv("QDRANT_COLLECTION", "lod_bookmarks")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 DATA_BOOKMARK_PATH = os.getenv("DATA_BOOKMARK_PATH", "./data/bookmarks")
-
-VECTOR_SIZE = 1536  # text-embedding-3-small 차원
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+# process_all이 한 번에 읽어 임베딩할 책갈피 수 — 임베딩 배치 여러 개가 동시에 요청되도록 넉넉히
+EMBED_CHUNK_SIZE = int(os.getenv("EMBED_CHUNK_SIZE", "1024"))
+SCROLL_BATCH_SIZE = 1024
+# 고아 포인트가 컬렉션의 이 비율을 넘으면 삭제하지 않음 (책갈피 디렉토리 유실 방지)
+ORPHAN_DELETE_MAX_RATIO = float(os.getenv("ORPHAN_DELETE_MAX_RATIO", "0.5"))
+# 지문이 바뀐 책갈피를 1회 실행에 최대 몇 건 재임베딩할지 (0: 제한 없음). 모델 교체를 여러 회차로 나눌 때 사용
+# 지문 없는 예전 포인트/지문이 바뀐 포인트를 1회 실행에 최대 몇 건 재임베딩할지 (0: 제한 없음)
+# 스케줄러는 파이프라인 잠금을 잡고 실행되므로 한 번에 전체 코퍼스를 다시 임베딩하지 않도록 기본값을 둔다
+REEMBED_MAX_PER_RUN = int(os.getenv("REEMBED_MAX_PER_RUN", "300"))
 
 
 class Embedder:
-    def __init__(self):
-        self.openai = OpenAI()
+    """
+    collection을 주지 않으면 서비스 컬렉션(QDRANT_COLLECTION, 재색인 후에는 별칭)에 저장하고
+    임베딩 모델은 마지막 재색인 모델(없으면 EMBEDDING_MODEL)을 따라간다.
+    collection을 주면 그 컬렉션({collection}_passages 포함)에 model로 저장 (재색인 빌드용).
+    """
+
+    def __init__(self, collection: str = None, model: str = None):
+        self.collection = collection or COLLECTION
+        self.passage_collection = f"{collection}_passages" if collection else PASSAGE_COLLECTION
+        self._follow_active = collection is None and model is None
+        # 서비스 컬렉션일 때만 코퍼스 버전을 올림 (재색인 빌드 중에는 캐시를 건드리지 않음)
+        self._serving = collection is None
+        self._use_provider(get_embedding_provider(model or self._active_model()))
         self.qdrant = QdrantClient(url=f"http://{QDRANT_HOST}:{QDRANT_PORT}")
+        self.sparse_enabled = False
         self._ensure_collection()
 
+    def _active_model(self) -> str | None:
+        """별칭을 따르는 Embedder면 서비스 컬렉션의 모델 (기록이 없으면 기본 모델), 아니면 None"""
+        if not self._follow_active:
+            return None
+        return active_collection().get("model") or default_embedding_model()
+
+    def _use_provider(self, provider):
+        self.provider = provider
+        # 같은 텍스트+모델 벡터는 API 대신 로컬 저장소에서 (컬렉션 재구축 시 디스크 속도로 적재)
+        self.store = open_vector_store(provider.model)
+
+    def _sync_active_model(self):
+        """다른 프로세스가 재색인으로 모델을 바꿨으면 같은 모델로 전환 (서버의 장수 Embedder용)"""
+        model = self._active_model()
+        if model and model != self.provider.model:
+            logger.info(f"임베딩 모델 전환: {self.provider.model} → {model}")
+            self._use_provider(get_embedding_provider(model))
+            self._ensure_collection()
+
     def _ensure_collection(self):
-        """Qdrant 컬렉션 없으면 생성"""
-        collections = [c.name for c in self.qdrant.get_collections().collections]
-        if COLLECTION not in collections:
-            self.qdrant.create_collection(
-                collection_name=COLLECTION,
-                vectors_config=VectorParams(
-                    size=VECTOR_SIZE,
-                    distance=Distance.COSINE
+        """Qdrant 컬렉션 없으면 생성 (dense + 어휘 sparse 벡터), 있으면 페이로드 인덱스만 보강"""
+        if not self.qdrant.collection_exists(self.collection):
+            create_collection(self.qdrant, self.collection, self.provider.dim)
+            logger.info(f"Qdrant 컬렉션 생성: {self.collection}")
+            self.sparse_enabled = True
+        else:
+            logger.debug(f"Qdrant 컬렉션 존재: {self.collection}")
+            ensure_payload_indexes(self.qdrant, self.collection)
+            info = self.qdrant.get_collection(self.collection)
+            sparse = info.config.params.sparse_vectors or {}
+            self.sparse_enabled = SPARSE_VECTOR_NAME in sparse
+            if not self.sparse_enabled:
+                logger.warning(
+                    f"컬렉션 {self.collection}에 어휘 인덱스(sparse '{SPARSE_VECTOR_NAME}') 없음 — "
+                    "dense 검색만 사용. 컬렉션을 새로 만들면 하이브리드 검색 활성화"
                 )
+
+        if PASSAGES_ENABLED and not self.qdrant.collection_exists(self.passage_collection):
+            create_collection(
+                self.qdrant, self.passage_collection, self.provider.dim,
+                sparse=False, indexes=PASSAGE_PAYLOAD_INDEXES
             )
-            logger.info(f"Qdrant 컬렉션 생성: {COLLECTION}")
-        else:
-            logger.debug(f"Qdrant 컬렉션 존재: {COLLECTION}")
+            logger.info(f"Qdrant 문단 컬렉션 생성: {self.passage_collection}")
 
     @staticmethod
     def _bookmark_id_to_uuid(bookmark_id: str) -> str:
@@ -71,13 +141,154 @@ class Embedder:
 
         return text
 
+    @staticmethod
+    def build_payload(bookmark: dict) -> dict:
+        """Qdrant 페이로드 구성 (검색 후 원본 로드에 사용)"""
+        payload = {
+            "bookmark_id": bookmark.get("bookmark_id", ""),
+            "title": bookmark.get("title", ""),
+            "summary": bookmark.get("summary", ""),
+            "keywords": bookmark.get("keywords", []),
+            "image_descriptions": bookmark.get("image_descriptions", []),
+            "source": bookmark.get("source", ""),
+            "board_name": bookmark.get("board_name", ""),
+            "date": bookmark.get("date", ""),
+            "url": bookmark.get("url", ""),
+            "content_path": bookmark.get("content_path", "")
+        }
+        key = date_key(payload["date"])
+        if key is not None:
+            payload["date_key"] = key  # 날짜 범위 필터용 (20240115)
+        return payload
+
     def _get_embedding(self, text: str) -> list[float]:
-        """OpenAI 임베딩 API 호출"""
-        response = self.openai.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
+        """임베딩 제공자 호출 (기본 OpenAI)"""
+        return self._embed([text])[0]
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        """임베딩 저장소에 없는 텍스트만 제공자에 요청 (실패하면 예외)"""
+        hashes = [text_hash(t) for t in texts]
+        vectors = self.store.get_many(hashes) if self.store is not None else [None] * len(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fetched = self.provider.embed([texts[i] for i in missing])
+            for i, vector in zip(missing, fetched):
+                vectors[i] = vector
+            self._store_vectors([hashes[i] for i in missing], fetched)
+        return vectors
+
+    def _store_vectors(self, hashes: list[str], vectors: list[list[float]]):
+        """임베딩 저장소에 추가 (실패해도 임베딩 결과는 그대로 사용)"""
+        if self.store is None or not hashes:
+            return
+        try:
+            self.store.put_many(hashes, vectors)
+        except Exception as e:
+            logger.warning(f"임베딩 저장소 기록 실패 ({len(hashes)}건): {e}")
+
+    def _point_vectors(self, bookmark: dict, dense: list[float]):
+        """포인트 벡터 구성 (어휘 인덱스가 있는 컬렉션이면 sparse 벡터 함께 저장)"""
+        if not self.sparse_enabled:
+            return dense
+        return {"": dense, SPARSE_VECTOR_NAME: encode_document(bookmark)}
+
+    @staticmethod
+    def _load_content(bookmark: dict) -> str:
+        """책갈피의 원본 게시글 본문"""
+        content_path = bookmark.get("content_path", "")
+        if not content_path:
+            return ""
+        try:
+            with open(content_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("content", "")
+        except Exception as e:
+            logger.warning(f"원본 로드 실패 {content_path}: {e}")
+            return ""
+
+    def embed_passages(self, bookmark: dict) -> int:
+        """원본 본문 → 문단 분할 → 문단 컬렉션 저장 (기존 문단은 교체). 반환: 문단 수"""
+        bookmark_id = bookmark.get("bookmark_id", "")
+        passages = split_passages(self._load_content(bookmark))
+        if not passages:
+            return 0
+
+        title = bookmark.get("title", "")
+        vectors = self._embed([build_passage_text(title, p) for p in passages])
+
+        self._delete_passages(bookmark_id)
+        self.qdrant.upsert(
+            collection_name=self.passage_collection,
+            points=[
+                self._passage_point(bookmark, i, passage, vector)
+                for i, (passage, vector) in enumerate(zip(passages, vectors))
+            ]
+        )
+        logger.debug(f"문단 저장: {bookmark_id} ({len(passages)}개)")
+        return len(passages)
+
+    @staticmethod
+    def _passage_point(bookmark: dict, index: int, passage: str, vector: list[float]) -> PointStruct:
+        bookmark_id = bookmark.get("bookmark_id", "")
+        return PointStruct(
+            id=passage_point_id(bookmark_id, index),
+            vector=vector,
+            payload={
+                "bookmark_id": bookmark_id,
+                "index": index,
+                "text": passage,
+                "source": bookmark.get("source", "")
+            }
+        )
+
+    def _delete_passages(self, bookmark_id: str):
+        self._delete_passages_many([bookmark_id])
+
+    def _delete_passages_many(self, bookmark_ids: list[str]):
+        """여러 책갈피의 문단을 삭제 요청 1회로 삭제"""
+        self.qdrant.delete(
+            collection_name=self.passage_collection,
+            points_selector=FilterSelector(
+                filter=Filter(
+                    must=[FieldCondition(key="bookmark_id", match=MatchAny(any=bookmark_ids))]
+                )
+            )
+        )
+
+    def _passage_bookmark_ids(self) -> set[str]:
+        """문단이 저장된 책갈피 ID 전체 (스크롤 1회)"""
+        ids = set()
+        offset = None
+        while True:
+            points, offset = self.qdrant.scroll(
+                collection_name=self.passage_collection,
+                limit=SCROLL_BATCH_SIZE,
+                offset=offset,
+                with_payload=["bookmark_id"],
+                with_vectors=False
+            )
+            ids.update(p.payload.get("bookmark_id", "") for p in points)
+            if offset is None:
+                return ids
+
+    @staticmethod
+    def embed_hash(embed_text: str) -> str:
+        """임베딩 텍스트 지문 (sha256, 임베딩 저장소 키와 같은 기준)"""
+        return text_hash(embed_text)
+
+    def _fingerprint(self, bookmark: dict) -> dict:
+        return {
+            "embed_hash": self.embed_hash(self.build_embed_text(bookmark)),
+            "embed_model": self.provider.model
+        }
+
+    def _bookmark_point(self, bookmark: dict, vector: list[float]) -> PointStruct:
+        fingerprint = self._fingerprint(bookmark)
+        return PointStruct(
+            id=self._bookmark_id_to_uuid(bookmark.get("bookmark_id", "")),
+            vector=self._point_vectors(bookmark, vector),
+            # vector_hash: 벡터를 실제로 만든 텍스트 지문 (지문만 기록한 포인트에는 없음 → 저장소 채우기에서 제외)
+            payload={**self.build_payload(bookmark), **fingerprint, "vector_hash": fingerprint["embed_hash"]}
         )
-        return response.data[0].embedding
 
     def embed_and_save(self, bookmark: dict) -> bool:
         """단일 책갈피 임베딩 → Qdrant 저장"""
@@ -85,8 +296,8 @@ class Embedder:
         if not bookmark_id:
             logger.error("bookmark_id 없음")
             return False
+        self._sync_active_model()
 
-        point_id = self._bookmark_id_to_uuid(bookmark_id)
         embed_text = self.build_embed_text(bookmark)
 
         try:
@@ -95,70 +306,202 @@ class Embedder:
             logger.error(f"임베딩 실패 {bookmark_id}: {e}")
             return False
 
-        # 페이로드 (검색 후 원본 로드에 사용)
-        payload = {
-            "bookmark_id": bookmark_id,
-            "title": bookmark.get("title", ""),
-            "summary": bookmark.get("summary", ""),
-            "keywords": bookmark.get("keywords", []),
-            "image_descriptions": bookmark.get("image_descriptions", []),
-            "source": bookmark.get("source", ""),
-            "board_name": bookmark.get("board_name", ""),
-            "date": bookmark.get("date", ""),
-            "url": bookmark.get("url", ""),
-            "content_path": bookmark.get("content_path", "")
-        }
-
         try:
             self.qdrant.upsert(
-                collection_name=COLLECTION,
-                points=[
-                    PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload=payload
-                    )
-                ]
+                collection_name=self.collection,
+                points=[self._bookmark_point(bookmark, vector)]
             )
             logger.debug(f"Qdrant 저장: {bookmark_id}")
-            return True
         except Exception as e:
             logger.error(f"Qdrant 저장 실패 {bookmark_id}: {e}")
             return False
 
+        # 문단 인덱스 실패는 책갈피 저장 실패로 보지 않음 (검색 시 원본 앞부분으로 대체)
+        if PASSAGES_ENABLED:
+            try:
+                self.embed_passages(bookmark)
+            except Exception as e:
+                logger.warning(f"문단 저장 실패 {bookmark_id}: {e}")
+
+        bump_corpus_version([bookmark_id], reason="저장")
+        return True
+
     def delete_by_bookmark_id(self, bookmark_id: str) -> bool:
         """Qdrant에서 bookmark_id로 벡터 삭제"""
         point_id = self._bookmark_id_to_uuid(bookmark_id)
         try:
             self.qdrant.delete(
-                collection_name=COLLECTION,
+                collection_name=self.collection,
                 points_selector=[point_id]
             )
+            if PASSAGES_ENABLED:
+                self._delete_passages(bookmark_id)
             logger.info(f"Qdrant 삭제: {bookmark_id}")
+            bump_corpus_version([bookmark_id], reason="삭제")
             return True
         except Exception as e:
             logger.error(f"Qdrant 삭제 실패 {bookmark_id}: {e}")
             return False
 
-    def _is_in_qdrant(self, bookmark_id: str) -> bool:
-        """Qdrant에 이미 존재하는지 확인"""
-        point_id = self._bookmark_id_to_uuid(bookmark_id)
+    # ─── 일괄 저장 ───
+
+    def _embed_texts(self, texts: list[str], report: dict) -> list[list[float] | None]:
+        """
+        텍스트 목록 임베딩. 임베딩 저장소에 있는 것은 그대로 쓰고,
+        나머지만 입력 수/토큰 수 상한 단위로 묶어 레이트 리밋 안에서 동시에 요청하고 저장소에 추가.
+        실패한 배치는 반씩 나눠 재시도하고, 끝내 실패한 항목은 None.
+        """
+        hashes = [text_hash(t) for t in texts]
+        vectors = self.store.get_many(hashes) if self.store is not None else [None] * len(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        report["store_hits"] += len(texts) - len(missing)
+
+        fetched: list[list[float] | None] = [None] * len(missing)
+        missing_texts = [texts[i] for i in missing]
+        calls = map_concurrent(
+            lambda batch: self._embed_split(missing_texts, batch, fetched),
+            token_batches(missing_texts)
+        )
+        report["embed_calls"] += sum(calls)
+
+        stored = [(hashes[i], v) for i, v in zip(missing, fetched) if v is not None]
+        self._store_vectors([h for h, _ in stored], [v for _, v in stored])
+        for i, vector in zip(missing, fetched):
+            vectors[i] = vector
+        return vectors
+
+    def _embed_split(self, texts: list[str], batch: list[int], vectors: list) -> int:
+        """배치 1개 임베딩 → vectors[i]에 기록 (워커 스레드에서 실행). 반환: 요청 횟수"""
+        try:
+            result = self.provider.embed([texts[i] for i in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"임베딩 실패: {e}")
+                return 1
+            logger.warning(f"임베딩 배치 실패 ({len(batch)}건) — 나눠서 재시도: {e}")
+            mid = len(batch) // 2
+            return (1 + self._embed_split(texts, batch[:mid], vectors)
+                    + self._embed_split(texts, batch[mid:], vectors))
+        for i, vector in zip(batch, result):
+            vectors[i] = vector
+        return 1
+
+    def _upsert_points(self, collection: str, points: list[PointStruct],
+                       report: dict) -> list[PointStruct]:
+        """포인트 일괄 저장 (실패하면 반씩 나눠 재시도) → 저장된 포인트"""
+        if not points:
+            return []
+        report["upsert_calls"] += 1
         try:
-            result = self.qdrant.retrieve(
-                collection_name=COLLECTION,
-                ids=[point_id]
+            self.qdrant.upsert(collection_name=collection, points=points, wait=True)
+            return points
+        except Exception as e:
+            if len(points) == 1:
+                logger.error(f"Qdrant 저장 실패 {points[0].payload.get('bookmark_id', '')}: {e}")
+                return []
+            logger.warning(f"Qdrant 일괄 저장 실패 ({len(points)}건) — 나눠서 재시도: {e}")
+            mid = len(points) // 2
+            return (self._upsert_points(collection, points[:mid], report)
+                    + self._upsert_points(collection, points[mid:], report))
+
+    def _save_bookmarks(self, bookmarks: list[dict], report: dict) -> list[dict]:
+        """책갈피 일괄 임베딩 → 저장 → 저장에 성공한 책갈피"""
+        vectors = self._embed_texts([self.build_embed_text(bm) for bm in bookmarks], report)
+        points, by_point = [], {}
+        for bookmark, vector in zip(bookmarks, vectors):
+            if vector is None:
+                continue
+            point = self._bookmark_point(bookmark, vector)
+            points.append(point)
+            by_point[point.id] = bookmark
+
+        saved = []
+        for i in range(0, len(points), UPSERT_BATCH_SIZE):
+            stored = self._upsert_points(self.collection, points[i:i + UPSERT_BATCH_SIZE], report)
+            saved.extend(by_point[p.id] for p in stored)
+        return saved
+
+    def _save_passages(self, bookmarks: list[dict], report: dict) -> list[str]:
+        """
+        여러 책갈피의 문단 일괄 임베딩 → 기존 문단 교체 → 문단이 저장된 책갈피 ID.
+        문단 하나라도 임베딩에 실패한 책갈피는 건너뜀 (다음 실행에서 보강).
+        """
+        items = []  # (책갈피, 문단 번호, 문단)
+        for bookmark in bookmarks:
+            for i, passage in enumerate(split_passages(self._load_content(bookmark))):
+                items.append((bookmark, i, passage))
+        if not items:
+            return []
+
+        vectors = self._embed_texts(
+            [build_passage_text(bm.get("title", ""), passage) for bm, _, passage in items], report
+        )
+        incomplete = {bm["bookmark_id"] for (bm, _, _), v in zip(items, vectors) if v is None}
+        points = [
+            self._passage_point(bm, i, passage, vector)
+            for (bm, i, passage), vector in zip(items, vectors)
+            if bm["bookmark_id"] not in incomplete
+        ]
+        complete = list(dict.fromkeys(p.payload["bookmark_id"] for p in points))
+        if not complete:
+            return []
+
+        self._delete_passages_many(complete)
+        stored = set()
+        for i in range(0, len(points), UPSERT_BATCH_SIZE):
+            for point in self._upsert_points(self.passage_collection, points[i:i + UPSERT_BATCH_SIZE], report):
+                stored.add(point.payload["bookmark_id"])
+        report["passage_points"] += len(points)
+        return [bookmark_id for bookmark_id in complete if bookmark_id in stored]
+
+    # ─── 디스크 ↔ Qdrant 비교 ───
+
+    def _indexed_fingerprints(self) -> dict[str, dict]:
+        """컬렉션의 포인트 ID → 지문 {"embed_hash", "embed_model"} (벡터 없이 지문 필드만 스크롤)"""
+        fingerprints = {}
+        offset = None
+        while True:
+            points, offset = self.qdrant.scroll(
+                collection_name=self.collection,
+                limit=SCROLL_BATCH_SIZE,
+                offset=offset,
+                with_payload=["embed_hash", "embed_model"],
+                with_vectors=False
             )
-            return len(result) > 0
-        except Exception:
-            return False
+            fingerprints.update((str(p.id), p.payload or {}) for p in points)
+            if offset is None:
+                return fingerprints
 
-    def process_all(self) -> dict:
-        """data/bookmarks/*.json 중 Qdrant에 없는 것 전체 처리"""
-        saved = 0
-        skipped = 0
-        failed = 0
+    def _stamp_fingerprints(self, bookmarks: list[dict]):
+        """
+        지문 없는 기존 포인트에 현재 지문만 기록 (벡터는 그대로).
+        벡터가 지금 텍스트/모델과 맞는지 알 수 없으므로 embed-all --stamp-legacy로 명시했을 때만 사용
+        """
+        self.qdrant.batch_update_points(
+            collection_name=self.collection,
+            update_operations=[
+                SetPayloadOperation(set_payload=SetPayload(
+                    payload=self._fingerprint(bookmark),
+                    points=[self._bookmark_id_to_uuid(bookmark["bookmark_id"])]
+                ))
+                for bookmark in bookmarks
+            ]
+        )
 
+    def _disk_bookmark_ids(self) -> dict[str, str]:
+        """디스크 책갈피 → {포인트 ID: bookmark_id} (파일명이 {bookmark_id}.json이라 파일을 열지 않음)"""
+        ids = {}
         for filepath in glob.glob(os.path.join(DATA_BOOKMARK_PATH, "*.json")):
+            bookmark_id = os.path.splitext(os.path.basename(filepath))[0]
+            ids[self._bookmark_id_to_uuid(bookmark_id)] = bookmark_id
+        return ids
+
+    @staticmethod
+    def _load_bookmarks(bookmark_ids: list[str]) -> tuple[list[dict], int]:
+        """책갈피 JSON 로드 → (bookmark_id가 파일명과 일치하는 책갈피, 실패 수)"""
+        bookmarks, failed = [], 0
+        for bookmark_id in bookmark_ids:
+            filepath = os.path.join(DATA_BOOKMARK_PATH, f"{bookmark_id}.json")
             try:
                 with open(filepath, "r", encoding="utf-8") as f:
                     bookmark = json.load(f)
@@ -166,51 +509,247 @@ class Embedder:
                 logger.error(f"파일 로드 실패 {filepath}: {e}")
                 failed += 1
                 continue
-
-            bookmark_id = bookmark.get("bookmark_id", "")
-            if self._is_in_qdrant(bookmark_id):
-                skipped += 1
+            if bookmark.get("bookmark_id") != bookmark_id:
+                logger.error(f"bookmark_id가 파일명과 다름: {filepath}")
+                failed += 1
                 continue
+            bookmarks.append(bookmark)
+        return bookmarks, failed
 
-            if self.embed_and_save(bookmark):
-                saved += 1
-            else:
-                failed += 1
+    def _delete_orphans(self, orphans: list[str], indexed_count: int) -> list[str]:
+        """
+        책갈피 JSON이 없어진 포인트(+문단) 삭제 → 삭제한 bookmark_id.
+        책갈피 디렉토리가 비었거나 마운트가 빠진 경우를 막기 위해
+        고아 비율이 ORPHAN_DELETE_MAX_RATIO를 넘으면 삭제하지 않는다.
+        """
+        if not orphans:
+            return []
+        if len(orphans) > indexed_count * ORPHAN_DELETE_MAX_RATIO:
+            logger.warning(
+                f"고아 포인트 {len(orphans)}/{indexed_count}건 — 비율이 너무 높아 삭제 생략 "
+                f"(DATA_BOOKMARK_PATH={DATA_BOOKMARK_PATH} 확인)"
+            )
+            return []
 
-        stats = {"saved": saved, "skipped": skipped, "failed": failed}
-        logger.info(f"임베딩 완료: {saved}건 저장, {skipped}건 스킵, {failed}건 실패")
-        return stats
+        deleted = []
+        for i in range(0, len(orphans), SCROLL_BATCH_SIZE):
+            chunk = orphans[i:i + SCROLL_BATCH_SIZE]
+            points = self.qdrant.retrieve(
+                collection_name=self.collection, ids=chunk,
+                with_payload=["bookmark_id"], with_vectors=False
+            )
+            bookmark_ids = [p.payload.get("bookmark_id", "") for p in points if p.payload]
+            self.qdrant.delete(collection_name=self.collection, points_selector=chunk)
+            if PASSAGES_ENABLED and bookmark_ids:
+                self._delete_passages_many(bookmark_ids)
+            deleted.extend(bookmark_ids)
+        logger.info(f"고아 포인트 삭제: {len(orphans)}건")
+        return deleted
+
+    def process_all(self, progress=None, stamp_legacy: bool = False, reembed_max: int = None) -> dict:
+        """
+        디스크 책갈피와 Qdrant를 비교해 맞추기.
+        - 포인트 ID와 지문을 한 번에 스크롤(벡터 없이)해 메모리에서 비교
+        - Qdrant에 없는 책갈피는 새로 임베딩, 임베딩 텍스트 해시나 모델이 바뀐 책갈피는 다시 임베딩
+          (1회 재임베딩 수는 reembed_max, 없으면 REEMBED_MAX_PER_RUN으로 제한. 0이면 제한 없음)
+        - 지문이 없는 예전 포인트는 책갈피 재생성 전 텍스트나 이전 모델 벡터일 수 있으므로 재임베딩 대상
+          (stamp_legacy=True면 재임베딩 없이 현재 지문만 기록 — 벡터가 최신이라고 확신할 때만)
+        - 책갈피 JSON이 없어진 포인트(고아)는 문단과 함께 삭제
+        - 문단이 없는 기존 책갈피는 문단만 보강
+        EMBED_CHUNK_SIZE개 단위로 임베딩(동시 요청) → UPSERT_BATCH_SIZE개씩 저장하고 처리량을 함께 보고.
+        progress(처리한 책갈피 수, 전체 수)를 주면 배치마다 호출 (재색인 진행률).
+        """
+        started = time.perf_counter()
+        self._sync_active_model()
+        report = {
+            "saved": 0, "updated": 0, "skipped": 0, "failed": 0, "deleted": 0, "passages": 0,
+            "stamped": 0, "embed_calls": 0, "store_hits": 0, "upsert_calls": 0, "passage_points": 0
+        }
+
+        passage_ids = None
+        if PASSAGES_ENABLED:
+            try:
+                passage_ids = self._passage_bookmark_ids()
+            except Exception as e:
+                logger.warning(f"문단 컬렉션 조회 실패 — 문단 보강 생략: {e}")
+
+        # 포인트 ID를 먼저 읽어야 그 사이 /add로 생긴 책갈피를 고아로 오인하지 않음
+        indexed = self._indexed_fingerprints()
+        disk = self._disk_bookmark_ids()
+        orphans = [point_id for point_id in indexed if point_id not in disk]
+
+        deleted = []
+        try:
+            deleted = self._delete_orphans(orphans, len(indexed))
+        except Exception as e:
+            logger.error(f"고아 포인트 삭제 실패: {e}")
+        report["deleted"] = len(deleted)
+
+        if passage_ids is not None:
+            # 책갈피 포인트 없이 남은 문단 (삭제 도중 실패 등)
+            stale = list(passage_ids - set(disk.values()) - set(deleted))
+            if stale and len(stale) <= len(passage_ids) * ORPHAN_DELETE_MAX_RATIO:
+                try:
+                    self._delete_passages_many(stale)
+                except Exception as e:
+                    logger.warning(f"고아 문단 삭제 실패: {e}")
+
+        saved_ids, updated_ids, backfilled = [], [], []
+        reembed_max = REEMBED_MAX_PER_RUN if reembed_max is None else reembed_max
+        reembed_budget = reembed_max or None
+        deferred = 0
+        disk_ids = list(disk.items())
+        for i in range(0, len(disk_ids), EMBED_CHUNK_SIZE):
+            chunk = disk_ids[i:i + EMBED_CHUNK_SIZE]
+            bookmarks, failed = self._load_bookmarks([bookmark_id for _, bookmark_id in chunk])
+            report["failed"] += failed
+
+            new, changed, legacy, backfill = [], [], [], []
+            for bookmark in bookmarks:
+                stored = indexed.get(self._bookmark_id_to_uuid(bookmark["bookmark_id"]))
+                if stored is None:
+                    new.append(bookmark)
+                elif "embed_hash" not in stored and stamp_legacy:
+                    legacy.append(bookmark)
+                elif stored != self._fingerprint(bookmark):
+                    if reembed_budget is not None and len(updated_ids) + len(changed) >= reembed_budget:
+                        deferred += 1
+                        continue
+                    changed.append(bookmark)
+                elif passage_ids is not None and bookmark["bookmark_id"] not in passage_ids:
+                    backfill.append(bookmark)
+            report["skipped"] += len(bookmarks) - len(new) - len(changed) - len(legacy)
+
+            if legacy:
+                try:
+                    self._stamp_fingerprints(legacy)
+                    report["stamped"] += len(legacy)
+                except Exception as e:
+                    logger.warning(f"지문 기록 실패 ({len(legacy)}건): {e}")
+
+            targets = new + changed
+            saved = self._save_bookmarks(targets, report) if targets else []
+            report["failed"] += len(targets) - len(saved)
+            new_ids = {bm["bookmark_id"] for bm in new}
+            for bookmark in saved:
+                (saved_ids if bookmark["bookmark_id"] in new_ids else updated_ids).append(bookmark["bookmark_id"])
+
+            # 문단 인덱스 실패는 책갈피 저장 실패로 보지 않음 (검색 시 원본 앞부분으로 대체)
+            if passage_ids is not None:
+                try:
+                    if saved:
+                        self._save_passages(saved, report)
+                    if backfill:
+                        backfilled.extend(self._save_passages(backfill, report))
+                except Exception as e:
+                    logger.warning(f"문단 일괄 저장 실패: {e}")
+            if progress:
+                progress(min(i + EMBED_CHUNK_SIZE, len(disk_ids)), len(disk_ids))
+
+        if deferred:
+            logger.info(f"지문 변경 {deferred}건은 다음 실행에서 재임베딩 (1회 상한 {reembed_max}건)")
+        if self._serving:
+            if saved_ids:
+                bump_corpus_version(saved_ids, reason="저장")
+            if updated_ids:
+                bump_corpus_version(updated_ids, reason="재임베딩")
+            if deleted:
+                bump_corpus_version(deleted, reason="고아 정리")
+            if backfilled:
+                bump_corpus_version(backfilled, reason="문단 보강")
+
+        elapsed = time.perf_counter() - started
+        report["saved"] = len(saved_ids)
+        report["updated"] = len(updated_ids)
+        report["passages"] = len(backfilled)
+        report["deferred"] = deferred
+        report["seconds"] = round(elapsed, 2)
+        embedded = len(saved_ids) + len(updated_ids)
+        report["per_second"] = round(embedded / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"임베딩 완료: {report['saved']}건 저장, {report['updated']}건 재임베딩, "
+            f"{report['skipped']}건 스킵, {report['failed']}건 실패"
+            + (f", 고아 {len(deleted)}건 삭제" if deleted else "")
+            + (f", 문단 보강 {len(backfilled)}건" if backfilled else "")
+            + (f", 지문 기록 {report['stamped']}건" if report["stamped"] else "")
+            + f" — {elapsed:.1f}초 ({report['per_second']}건/초, 임베딩 요청 {report['embed_calls']}회,"
+            f" 저장소 재사용 {report['store_hits']}건, 저장 요청 {report['upsert_calls']}회)"
+        )
+        return report
+
+    def seed_vector_store(self) -> int:
+        """
+        현재 컬렉션의 책갈피 벡터를 임베딩 저장소로 복사.
+        벡터가 지문과 맞는다고 확인된 포인트(임베딩해서 저장할 때 vector_hash를 남긴 포인트, 현재 모델)만 복사한다.
+        --stamp-legacy로 지문만 기록한 포인트나 그 이전 포인트를 넣으면 낡은 벡터가 현재 텍스트 해시로 저장돼
+        재색인/재구축 때 API 대신 그 벡터가 다시 쓰이기 때문.
+        저장소를 처음 켰을 때 한 번 실행해 두면 Qdrant를 잃어도 API 호출 없이 다시 적재된다.
+        """
+        if self.store is None:
+            return 0
+        added = skipped = 0
+        offset = None
+        while True:
+            points, offset = self.qdrant.scroll(
+                collection_name=self.collection,
+                limit=SCROLL_BATCH_SIZE,
+                offset=offset,
+                with_payload=["vector_hash", "embed_model"],
+                with_vectors=[""] if self.sparse_enabled else True
+            )
+            hashes, vectors = [], []
+            for point in points:
+                payload = point.payload or {}
+                if payload.get("embed_model") != self.provider.model or "vector_hash" not in payload:
+                    skipped += 1
+                    continue
+                vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+                if vector:
+                    hashes.append(payload["vector_hash"])
+                    vectors.append(vector)
+            added += self.store.put_many(hashes, vectors)
+            if offset is None:
+                break
+        logger.info(
+            f"임베딩 저장소 채우기: {added}건 추가 (총 {len(self.store)}건)"
+            + (f", 벡터 지문 미확인/다른 모델 {skipped}건 제외" if skipped else "")
+        )
+        return added
 
     def process_new(self) -> dict:
-        """신규 책갈피 파일만 처리 (process_all과 동일 로직)"""
+        """신규/변경 책갈피만 처리 (process_all과 동일 로직)"""
         return self.process_all()
 
-    def get_stats(self) -> dict:
-        """Qdrant 컬렉션 통계"""
-        try:
-            info = self.qdrant.get_collection(COLLECTION)
-            total = info.points_count
-
-            # source별 카운트
-            lod_count = self.qdrant.count(
-                collection_name=COLLECTION,
-                count_filter=Filter(
-                    must=[FieldCondition(key="source", match=MatchValue(value="lod_nexon"))]
-                )
-            ).count
+    def count_stats(self) -> dict:
+        """Qdrant 컬렉션 통계 (Qdrant 요청 3회, 실패하면 예외 — 서버는 utils/stats.py가 백그라운드로 호출)"""
+        info = self.qdrant.get_collection(self.collection)
+        total = info.points_count
 
-            cafe_count = self.qdrant.count(
-                collection_name=COLLECTION,
-                count_filter=Filter(
-                    must=[FieldCondition(key="source", match=MatchValue(value="naver_cafe"))]
-                )
-            ).count
+        # source별 카운트
+        lod_count = self.qdrant.count(
+            collection_name=self.collection,
+            count_filter=Filter(
+                must=[FieldCondition(key="source", match=MatchValue(value="lod_nexon"))]
+            )
+        ).count
 
-            return {
-                "total_bookmarks": total,
-                "lod_nexon": lod_count,
-                "naver_cafe": cafe_count
-            }
+        cafe_count = self.qdrant.count(
+            collection_name=self.collection,
+            count_filter=Filter(
+                must=[FieldCondition(key="source", match=MatchValue(value="naver_cafe"))]
+            )
+        ).count
+
+        return {
+            "total_bookmarks": total,
+            "lod_nexon": lod_count,
+            "naver_cafe": cafe_count
+        }
+
+    def get_stats(self) -> dict:
+        """Qdrant 컬렉션 통계 (실패하면 0)"""
+        try:
+            return self.count_stats()
         except Exception as e:
             logger.error(f"Qdrant 통계 조회 실패: {e}")
             return {"total_bookmarks": 0, "lod_nexon": 0, "naver_cafe": 0}
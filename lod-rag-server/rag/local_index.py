@@ -0,0 +1,248 @@
+"""
+프로세스 내 책갈피 벡터 인덱스 (읽기 전용)
+- Qdrant 장애 시 검색 대체 경로: Qdrant가 살아있을 때 벡터를 스냅샷 파일로 떠 두고,
+  페이로드는 data/bookmarks/*.json에서 다시 구성 → Qdrant 없이 재시작해도 검색 가능
+- 소규모 코퍼스 빠른 경로 (LOCAL_INDEX_FAST_PATH_MAX > 0일 때만): 스냅샷이 최신이면 네트워크 없이 바로 검색
+검색은 Qdrant 하이브리드 쿼리와 같은 구성: 정규화된 float32 행렬 × 질문 벡터 (brute-force 코사인) 후보 +
+어휘 n-gram(BM25 TF × IDF) 후보를 합쳐 dense 코사인으로 점수화. 책갈피 수천 건이면 ms 단위.
+스냅샷에는 임베딩 모델/차원을 함께 저장하고, 현재 질문 임베딩 모델과 다르면 쓰지 않는다 (재색인 후 모델 교체 대비).
+"""
+
+import asyncio
+import json
+import os
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+
+from rag.corpus import get_corpus_version
+from rag.embedder import Embedder
+from rag.sparse import BM25_K1, build_sparse_segments, char_ngrams
+
+load_dotenv()
+
+COLLECTION = os.getenv("QDRANT_COLLECTION", "lod_bookmarks")
+DATA_BOOKMARK_PATH = os.getenv("DATA_BOOKMARK_PATH", "./data/bookmarks")
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "true").lower() == "true"
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./data/local_index.npz")
+# 이 건수 이하이고 스냅샷이 최신이면 Qdrant 대신 로컬 인덱스로 검색 (기본 0 = 장애 대체만)
+# 로컬 검색에는 Qdrant 양자화/재채점 설정이 적용되지 않는다
+LOCAL_INDEX_FAST_PATH_MAX = int(os.getenv("LOCAL_INDEX_FAST_PATH_MAX", "0"))
+
+SCROLL_BATCH = 256
+
+
+class LocalIndex:
+    def __init__(self, path: str = LOCAL_INDEX_PATH):
+        self.path = path
+        self.version = -1  # 스냅샷을 뜬 시점의 코퍼스 버전
+        self.model: str | None = None  # 스냅샷 벡터의 임베딩 모델 (이전 형식 스냅샷이면 None)
+        self.dim = 0
+        self.searches = 0
+        self.mismatches = 0  # 모델/차원이 달라 쓰지 못한 검색
+        self._payloads: list[dict] = []
+        self._sources = np.empty(0, dtype=object)
+        self._matrix: np.ndarray | None = None
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}  # n-gram → (행 번호, BM25 TF 가중치)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self._payloads)
+
+    def matches(self, model: str) -> bool:
+        """스냅샷 벡터가 현재 질문 임베딩 모델과 같은 공간인지"""
+        return self._matrix is not None and self.model is not None and self.model == model
+
+    def is_fresh(self, model: str) -> bool:
+        """모델이 같고 스냅샷 이후 코퍼스 변경이 없었는지"""
+        return self.matches(model) and self.version == get_corpus_version()
+
+    @staticmethod
+    def _load_payload(bookmark_id: str) -> dict | None:
+        filepath = os.path.join(DATA_BOOKMARK_PATH, f"{bookmark_id}.json")
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                return Embedder.build_payload(json.load(f))
+        except FileNotFoundError:
+            return None  # 제외/삭제된 책갈피
+        except Exception as e:
+            logger.warning(f"책갈피 로드 실패 {filepath}: {e}")
+            return None
+
+    @staticmethod
+    def _build_postings(payloads: list[dict]) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """어휘 역색인 (문서 sparse 벡터와 같은 필드/TF 가중치)"""
+        rows: dict[str, list[int]] = {}
+        weights: dict[str, list[float]] = {}
+        for row, payload in enumerate(payloads):
+            counts = Counter()
+            for segment in build_sparse_segments(payload):
+                counts.update(char_ngrams(segment))
+            for gram, tf in counts.items():
+                rows.setdefault(gram, []).append(row)
+                weights.setdefault(gram, []).append(tf * (BM25_K1 + 1) / (tf + BM25_K1))
+        return {
+            gram: (np.array(rows[gram], dtype=np.int32), np.array(weights[gram], dtype=np.float32))
+            for gram in rows
+        }
+
+    def _build(self, ids: list[str], vectors: np.ndarray, version: int, model: str | None):
+        """벡터 + 책갈피 파일 → 검색용 행렬/어휘 역색인 구성 (책갈피 파일이 없는 항목은 제외)"""
+        payloads, rows = [], []
+        for i, bookmark_id in enumerate(ids):
+            payload = self._load_payload(bookmark_id)
+            if payload is not None:
+                payloads.append(payload)
+                rows.append(i)
+
+        matrix = np.ascontiguousarray(vectors[rows], dtype=np.float32)
+        if len(matrix):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.maximum(norms, 1e-12)
+        postings = self._build_postings(payloads)
+
+        with self._lock:
+            self._payloads = payloads
+            self._sources = np.array([p.get("source", "") for p in payloads], dtype=object)
+            self._matrix = matrix
+            self._postings = postings
+            self.version = version
+            self.model = model
+            self.dim = matrix.shape[1] if matrix.ndim == 2 else 0
+
+    def load(self) -> bool:
+        """스냅샷 파일에서 인덱스 로드 (블로킹 → 스레드에서 호출)"""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                ids = [str(x) for x in data["ids"]]
+                vectors = data["vectors"]
+                version = int(data["version"])
+                model = str(data["model"]) if "model" in data.files else None
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"로컬 인덱스 스냅샷 로드 실패 {self.path}: {e}")
+            return False
+
+        self._build(ids, vectors, version, model)
+        logger.info(f"로컬 인덱스 로드: {self.size}건 (코퍼스 버전 {version}, 모델 {model})")
+        return True
+
+    def _save(self, ids: list[str], vectors: np.ndarray, version: int, model: str):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, ids=np.array(ids, dtype=str), vectors=vectors,
+                     version=np.array(version), model=np.array(model))
+        os.replace(tmp_path, self.path)
+
+    def _store_snapshot(self, ids: list[str], vectors: list, version: int, model: str):
+        array = np.asarray(vectors, dtype=np.float32)
+        if not ids:
+            array = array.reshape(0, 0)
+        self._save(ids, array, version, model)
+        self._build(ids, array, version, model)
+
+    async def sync(self, qdrant, model: str) -> int:
+        """
+        Qdrant 컬렉션 벡터 전체를 스냅샷으로 저장 → 인덱스 교체. 반환: 건수
+        model: 컬렉션 벡터를 만든 임베딩 모델 (= 현재 질문 임베딩 모델)
+        """
+        # 스크롤 도중 바뀐 변경분은 다음 동기화에서 반영되도록 시작 시점 버전으로 기록
+        version = get_corpus_version()
+        ids, vectors = [], []
+        offset = None
+        while True:
+            points, offset = await qdrant.scroll(
+                collection_name=COLLECTION,
+                limit=SCROLL_BATCH,
+                offset=offset,
+                with_payload=["bookmark_id"],
+                with_vectors=True
+            )
+            for point in points:
+                vector = point.vector
+                if isinstance(vector, dict):  # dense("") + 어휘 sparse 벡터
+                    vector = vector.get("")
+                bookmark_id = (point.payload or {}).get("bookmark_id")
+                if bookmark_id and vector:
+                    ids.append(bookmark_id)
+                    vectors.append(vector)
+            if offset is None:
+                break
+
+        await asyncio.to_thread(self._store_snapshot, ids, vectors, version, model)
+        logger.info(f"로컬 인덱스 동기화: {self.size}건 (코퍼스 버전 {version}, 모델 {model})")
+        return self.size
+
+    @staticmethod
+    def _top(scores: np.ndarray, limit: int) -> np.ndarray:
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        return top[np.isfinite(scores[top])]
+
+    def _lexical_scores(self, postings: dict, question: str, size: int) -> np.ndarray:
+        """질문 n-gram별 IDF × 문서 TF 가중치 합 (Qdrant sparse 쿼리 + Modifier.IDF와 같은 방식)"""
+        scores = np.zeros(size, dtype=np.float32)
+        for gram in set(char_ngrams(question)):
+            posting = postings.get(gram)
+            if posting is None:
+                continue
+            rows, weights = posting
+            df = len(rows)
+            idf = math.log(1 + (size - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * weights
+        return scores
+
+    def search(self, vector: list[float], source_filter: str = None, limit: int = 15,
+               question: str = None, lexical_limit: int = 0) -> list[tuple[dict, float]]:
+        """
+        dense 코사인 상위 limit개 + (question이 있으면) 어휘 점수 상위 lexical_limit개
+        → dense 코사인 높은 순 [(페이로드 사본, 점수)]
+        스냅샷과 질문 벡터의 차원이 다르면 빈 결과 (모델이 바뀐 뒤 아직 동기화 전)
+        """
+        with self._lock:
+            matrix, payloads, sources, postings = self._matrix, self._payloads, self._sources, self._postings
+        if matrix is None or not len(matrix):
+            return []
+        if len(vector) != matrix.shape[1]:
+            self.mismatches += 1
+            logger.warning(f"로컬 인덱스 차원 불일치 (스냅샷 {matrix.shape[1]}, 질문 {len(vector)}) — 사용 안 함")
+            return []
+
+        query = np.array(vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = matrix @ query
+        allowed = sources == source_filter if source_filter else None
+        if allowed is not None:
+            scores = np.where(allowed, scores, -np.inf)
+
+        top = self._top(scores, limit)
+        if question and lexical_limit > 0:
+            lexical = self._lexical_scores(postings, question, len(matrix))
+            lexical = np.where(lexical > 0, lexical, -np.inf)
+            if allowed is not None:
+                lexical = np.where(allowed, lexical, -np.inf)
+            top = np.union1d(top, self._top(lexical, lexical_limit))
+        top = top[np.argsort(-scores[top])]
+        self.searches += 1
+        # 재랭킹에서 score를 덮어쓰므로 페이로드는 사본으로 반환
+        return [(dict(payloads[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "version": self.version,
+            "model": self.model,
+            "dim": self.dim,
+            "corpus_current": self.version == get_corpus_version(),
+            "searches": self.searches,
+            "mismatches": self.mismatches
+        }
@@ -0,0 +1,67 @@
+"""
+원본 게시글 → 문단(passage) 분할
+책갈피 컬렉션과 별도로 {QDRANT_COLLECTION}_passages 컬렉션에 문단 벡터를 저장하고
+(payload.bookmark_id로 부모 책갈피와 연결), 답변 생성 시 선택된 책갈피마다
+질문과 가장 가까운 문단만 GPT에 보낸다 → 긴 공략글도 관련 부분만, 프롬프트는 짧게.
+"""
+
+import os
+import re
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COLLECTION = os.getenv("QDRANT_COLLECTION", "lod_bookmarks")
+PASSAGE_COLLECTION = os.getenv("QDRANT_PASSAGE_COLLECTION", f"{COLLECTION}_passages")
+PASSAGES_ENABLED = os.getenv("PASSAGES_ENABLED", "true").lower() == "true"
+PASSAGE_MAX_CHARS = int(os.getenv("PASSAGE_MAX_CHARS", "600"))
+PASSAGES_PER_BOOKMARK = int(os.getenv("PASSAGES_PER_BOOKMARK", "2"))
+
+_PARAGRAPH = re.compile(r"\n\s*\n|\n")
+_SENTENCE = re.compile(r"(?<=[.!?。])\s+")
+
+
+def _pieces(paragraph: str, max_chars: int) -> list[str]:
+    """긴 문단 → 문장 경계로 자른 조각 (문장 하나가 너무 길면 글자 수로 자름)"""
+    if len(paragraph) <= max_chars:
+        return [paragraph]
+    pieces = []
+    for sentence in _SENTENCE.split(paragraph):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_MAX_CHARS) -> list[str]:
+    """본문 → max_chars 이하 문단 목록 (짧은 줄은 이웃과 합쳐 문맥 유지)"""
+    pieces = []
+    for paragraph in _PARAGRAPH.split(text or ""):
+        paragraph = paragraph.strip()
+        if paragraph:
+            pieces.extend(_pieces(paragraph, max_chars))
+
+    passages, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            passages.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def build_passage_text(title: str, passage: str) -> str:
+    """임베딩할 문단 텍스트 (제목을 붙여 문단만으로 모호한 경우 보완)"""
+    return f"제목: {title}\n{passage}"
+
+
+def passage_point_id(bookmark_id: str, index: int) -> str:
+    """(bookmark_id, 문단 번호) → 결정적 UUID"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{bookmark_id}#passage-{index}"))
@@ -0,0 +1,347 @@
+"""
+임베딩 / 채팅 모델 제공자
+EMBEDDING_PROVIDER, LLM_PROVIDER 환경변수로 선택 (openai | local).
+- openai: OpenAI API (기존 동작)
+- local: 네트워크 없이 동작하는 결정적 대체 구현 (오프라인 개발/프로파일링/부하 테스트용)
+  · 임베딩: 글자 n-gram feature hashing → 같은 텍스트는 항상 같은 벡터, 글자가 겹칠수록 가까움
+  · 채팅: 프롬프트에서 뽑은 내용으로 만든 템플릿 응답 + LOCAL_LLM_LATENCY_MS 지연
+local 벡터는 OpenAI 벡터와 호환되지 않으므로 별도 QDRANT_COLLECTION / data 경로에서 사용.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import zlib
+from typing import AsyncIterator
+
+import numpy as np
+from dotenv import load_dotenv
+
+from rag.rate_limit import (
+    EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT, LLM_RPM_LIMIT, LLM_TPM_LIMIT, get_limiter
+)
+from rag.sparse import char_ngrams
+from utils.metrics import record_usage
+
+load_dotenv()
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "1536"))
+LOCAL_EMBEDDING_LATENCY_MS = float(os.getenv("LOCAL_EMBEDDING_LATENCY_MS", "0"))
+LOCAL_LLM_LATENCY_MS = float(os.getenv("LOCAL_LLM_LATENCY_MS", "300"))
+# 임베딩 요청 1회에 넣을 입력 수 / 추정 토큰 수 상한 (OpenAI: 2048개, 30만 토큰)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "100000"))
+
+OPENAI_EMBEDDING_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+def _message_text(messages: list[dict]) -> str:
+    """메시지 목록에서 텍스트만 추출 (Vision 메시지의 이미지 파트는 제외)"""
+    parts = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(p.get("text", "") for p in content if p.get("type") == "text")
+    return "\n".join(parts)
+
+
+# Vision 입력 이미지 1장의 토큰 추정치 (detail high 타일 기준으로 넉넉히)
+IMAGE_TOKEN_ESTIMATE = 765
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 보수적으로 추정한 토큰 수.
+    한글은 글자당 1~2토큰, 영문은 4글자당 1토큰 정도라 UTF-8 바이트 수 / 2로 넉넉히 잡는다.
+    """
+    return len(text.encode("utf-8")) // 2 + 1
+
+
+def estimate_message_tokens(messages: list[dict], max_tokens: int = 0) -> int:
+    """채팅 요청 1회의 추정 토큰 (프롬프트 텍스트 + 이미지 + 최대 출력) — TPM 버킷 확보용"""
+    images = sum(
+        1 for message in messages if not isinstance(message.get("content", ""), str)
+        for part in message["content"] if part.get("type") == "image_url"
+    )
+    return estimate_tokens(_message_text(messages)) + images * IMAGE_TOKEN_ESTIMATE + max_tokens
+
+
+def token_batches(texts: list[str], max_items: int = EMBED_BATCH_SIZE,
+                  max_tokens: int = EMBED_BATCH_MAX_TOKENS) -> list[list[int]]:
+    """임베딩 요청 단위로 나눈 입력 인덱스 목록 (입력 수, 추정 토큰 수 상한을 모두 지킴)"""
+    batches, current, tokens = [], [], 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (len(current) >= max_items or tokens + cost > max_tokens):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+# ─── OpenAI ───
+
+class OpenAIEmbeddings:
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self.dim = OPENAI_EMBEDDING_DIMS.get(model, 1536)
+        self._client = None
+        self._aclient = None
+
+    @property
+    def client(self):
+        """동기 클라이언트 (일괄 처리용) — 재시도는 SDK 대신 RateLimiter가 한도에 맞춰 처리"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(max_retries=0)
+        return self._client
+
+    @property
+    def limiter(self):
+        return get_limiter(self.model, EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT)
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            from openai import AsyncOpenAI
+            self._aclient = AsyncOpenAI()
+        return self._aclient
+
+    def _ordered(self, response) -> list[list[float]]:
+        record_usage(self.model, response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        def request():
+            raw = self.client.embeddings.with_raw_response.create(model=self.model, input=texts)
+            response = raw.parse()
+            return self._ordered(response), raw.headers, getattr(response.usage, "total_tokens", None)
+
+        return self.limiter.call(request, sum(estimate_tokens(t) for t in texts))
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        return self._ordered(await self.aclient.embeddings.create(model=self.model, input=texts))
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.close()
+
+
+class OpenAIChat:
+    def __init__(self, model: str = LLM_MODEL):
+        self.model = model
+        self._client = None
+        self._aclient = None
+
+    @property
+    def client(self):
+        """동기 클라이언트 (책갈피 생성용) — 재시도는 SDK 대신 RateLimiter가 한도에 맞춰 처리"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(max_retries=0)
+        return self._client
+
+    @property
+    def limiter(self):
+        return get_limiter(self.model, LLM_RPM_LIMIT, LLM_TPM_LIMIT)
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            from openai import AsyncOpenAI
+            self._aclient = AsyncOpenAI()
+        return self._aclient
+
+    def complete(self, messages: list[dict], temperature: float = 0.3,
+                 max_tokens: int = 500, json_mode: bool = False) -> str:
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+
+        def request():
+            raw = self.client.chat.completions.with_raw_response.create(
+                model=self.model, messages=messages,
+                temperature=temperature, max_tokens=max_tokens, **kwargs
+            )
+            response = raw.parse()
+            record_usage(self.model, response.usage)
+            used = getattr(response.usage, "total_tokens", None)
+            return response.choices[0].message.content.strip(), raw.headers, used
+
+        return self.limiter.call(request, estimate_message_tokens(messages, max_tokens))
+
+    async def acomplete(self, messages: list[dict], temperature: float = 0.3,
+                        max_tokens: int = 500) -> str:
+        response = await self.aclient.chat.completions.create(
+            model=self.model, messages=messages,
+            temperature=temperature, max_tokens=max_tokens
+        )
+        record_usage(self.model, response.usage)
+        return response.choices[0].message.content.strip()
+
+    async def astream(self, messages: list[dict], temperature: float = 0.3,
+                      max_tokens: int = 500) -> AsyncIterator[str]:
+        """토큰 스트림. 요청 자체가 실패하면 첫 토큰 전에 예외 발생"""
+        stream = await self.aclient.chat.completions.create(
+            model=self.model, messages=messages,
+            temperature=temperature, max_tokens=max_tokens, stream=True
+        )
+
+        async def tokens():
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        return tokens()
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.close()
+
+
+# ─── 로컬 대체 구현 ───
+
+class LocalHashEmbeddings:
+    """글자 n-gram feature hashing 임베딩 (부호 있는 해싱 + L2 정규화)"""
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.model = f"local-hash-{dim}"
+
+    def _vector(self, text: str) -> list[float]:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for gram in char_ngrams(text):
+            h = zlib.crc32(gram.encode("utf-8"))
+            v[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(v)
+        if norm > 0:
+            v /= norm
+        return v.tolist()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if LOCAL_EMBEDDING_LATENCY_MS:
+            time.sleep(LOCAL_EMBEDDING_LATENCY_MS / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        if LOCAL_EMBEDDING_LATENCY_MS:
+            await asyncio.sleep(LOCAL_EMBEDDING_LATENCY_MS / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aclose(self):
+        pass
+
+
+class LocalTemplateChat:
+    """
+    템플릿 응답기. 프롬프트 형식(책갈피 생성 / 답변 생성)을 보고
+    - JSON 요청: 제목·본문에서 뽑은 summary/keywords/category_tags
+    - 답변 요청: 첫 번째 참고 게시글 본문 앞부분
+    을 돌려준다. 지연은 LOCAL_LLM_LATENCY_MS (스트리밍은 토큰마다 나눠서).
+    """
+
+    model = "local-template"
+
+    _FIELD = r"^{name}:\s*(.*)$"
+
+    def __init__(self, latency_ms: float = LOCAL_LLM_LATENCY_MS):
+        self.latency = latency_ms / 1000
+
+    @classmethod
+    def _field(cls, text: str, name: str) -> str:
+        match = re.search(cls._FIELD.format(name=name), text, re.MULTILINE)
+        return match.group(1).strip() if match else ""
+
+    @staticmethod
+    def _after(text: str, marker: str) -> str:
+        idx = text.find(marker)
+        return text[idx + len(marker):].strip() if idx >= 0 else ""
+
+    def _bookmark_json(self, prompt: str) -> str:
+        title = self._field(prompt, "제목")
+        body = self._after(prompt, "본문:")
+        words = [w for w in re.split(r"[\s\W_]+", title) if len(w) >= 2]
+        result = {
+            "summary": " ".join(body.split())[:200],
+            "keywords": list(dict.fromkeys(words))[:8],
+            "category_tags": ["기타"],
+        }
+        if "image_descriptions" in prompt:
+            result["image_descriptions"] = []
+        return json.dumps(result, ensure_ascii=False)
+
+    def _answer(self, prompt: str) -> str:
+        # 첫 번째 참고 게시글의 "내용:" ~ "출처:" 구간
+        body = self._after(prompt, "내용:").split("\n출처:")[0]
+        return " ".join(body.split())[:300] or "관련 내용을 찾지 못했습니다."
+
+    def _respond(self, messages: list[dict], json_mode: bool) -> str:
+        prompt = _message_text(messages)
+        return self._bookmark_json(prompt) if json_mode else self._answer(prompt)
+
+    def complete(self, messages: list[dict], temperature: float = 0.3,
+                 max_tokens: int = 500, json_mode: bool = False) -> str:
+        time.sleep(self.latency)
+        return self._respond(messages, json_mode)
+
+    async def acomplete(self, messages: list[dict], temperature: float = 0.3,
+                        max_tokens: int = 500) -> str:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages, False)
+
+    async def astream(self, messages: list[dict], temperature: float = 0.3,
+                      max_tokens: int = 500) -> AsyncIterator[str]:
+        tokens = re.findall(r"\S+\s*", self._respond(messages, False))
+        delay = self.latency / max(len(tokens), 1)
+
+        async def gen():
+            for token in tokens:
+                await asyncio.sleep(delay)
+                yield token
+
+        return gen()
+
+    async def aclose(self):
+        pass
+
+
+def default_embedding_model() -> str:
+    """model 없이 get_embedding_provider()를 부르면 쓰는 모델 (지문 도입 전 컬렉션의 모델로 간주)"""
+    if EMBEDDING_PROVIDER == "local":
+        return f"local-hash-{LOCAL_EMBEDDING_DIM}"
+    return EMBEDDING_MODEL
+
+
+def get_embedding_provider(model: str = None):
+    """
+    EMBEDDING_PROVIDER 설정에 맞는 임베딩 제공자.
+    model을 주면 EMBEDDING_MODEL 대신 사용 (재색인으로 교체된 컬렉션의 모델 등, local은 "local-hash-{차원}")
+    """
+    if EMBEDDING_PROVIDER == "local":
+        match = re.fullmatch(r"local-hash-(\d+)", model or "")
+        return LocalHashEmbeddings(int(match.group(1))) if match else LocalHashEmbeddings()
+    if EMBEDDING_PROVIDER != "openai":
+        raise ValueError(f"알 수 없는 EMBEDDING_PROVIDER: {EMBEDDING_PROVIDER}")
+    return OpenAIEmbeddings(model or EMBEDDING_MODEL)
+
+
+def get_chat_provider():
+    """LLM_PROVIDER 설정에 맞는 채팅 제공자"""
+    if LLM_PROVIDER == "local":
+        return LocalTemplateChat()
+    if LLM_PROVIDER != "openai":
+        raise ValueError(f"알 수 없는 LLM_PROVIDER: {LLM_PROVIDER}")
+    return OpenAIChat()
@@ -0,0 +1,202 @@
+"""
+검색 질의 로그 + 인기 질문 집계
+검색 1회마다 질문/필터/단계별 지연/신뢰도/캐시 적중을 JSONL 한 줄로 남긴다.
+기록은 큐에 넣기만 하고 파일 쓰기는 전용 스레드가 맡아 검색 응답을 늦추지 않는다.
+파일은 날짜별로 나눠 쓰고 (QUERY_LOG_PATH가 data/query_log.jsonl이면 data/query_log-2026-01-31.jsonl),
+QUERY_LOG_RETENTION_DAYS일이 지난 파일은 날짜가 바뀔 때 삭제한다.
+top_queries()는 최근 QUERY_LOG_WINDOW_DAYS일 파일만 읽어 자주 들어온 질문을 돌려주며,
+스케줄러가 수집/임베딩 작업 뒤 이 질문들로 캐시를 미리 채운다 (Retriever.warm_popular).
+"""
+
+import glob
+import json
+import os
+import queue
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from rag.cache import normalize_query
+
+load_dotenv()
+
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "./data/query_log.jsonl")
+QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+QUERY_LOG_WINDOW_DAYS = int(os.getenv("QUERY_LOG_WINDOW_DAYS", "7"))
+QUERY_LOG_RETENTION_DAYS = int(os.getenv("QUERY_LOG_RETENTION_DAYS", "30"))
+WARM_TOP_N = int(os.getenv("WARM_TOP_N", "20"))
+
+
+def _split_path(path: str) -> tuple[str, str]:
+    """data/query_log.jsonl → ("data/query_log", ".jsonl")"""
+    base, ext = os.path.splitext(path)
+    return base, ext or ".jsonl"
+
+
+def daily_path(path: str, day: date) -> str:
+    """날짜별 로그 파일 경로"""
+    base, ext = _split_path(path)
+    return f"{base}-{day.isoformat()}{ext}"
+
+
+def log_files(path: str = QUERY_LOG_PATH) -> list[tuple[date, str]]:
+    """
+    날짜별 로그 파일 목록 (날짜 오름차순).
+    날짜별로 나누기 전의 단일 파일(path 자체)이 남아 있으면 마지막 수정일 기준으로 포함
+    """
+    base, ext = _split_path(path)
+    prefix = f"{base}-"
+    files = []
+    for filepath in glob.glob(glob.escape(prefix) + "*" + ext):
+        try:
+            day = date.fromisoformat(filepath[len(prefix):-len(ext)])
+        except ValueError:
+            continue
+        files.append((day, filepath))
+    if os.path.exists(path):
+        files.append((datetime.fromtimestamp(os.path.getmtime(path)).date(), path))
+    return sorted(files)
+
+
+class QueryLog:
+    """append-only 질의 로그, 날짜별 파일 (record()는 큐에 넣고 바로 반환)"""
+
+    def __init__(self, path: str = QUERY_LOG_PATH):
+        self.path = path
+        self.current_path: str | None = None  # 지금 쓰고 있는 날짜별 파일
+        self.written = 0
+        self.dropped = 0  # 큐가 가득 차 버린 기록
+        self._queue: queue.Queue = queue.Queue(maxsize=QUERY_LOG_QUEUE_SIZE)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def record(self, entry: dict):
+        """기록 1건 추가 (파일 쓰기는 백그라운드 스레드)"""
+        entry = {"ts": datetime.now().isoformat(timespec="seconds"), **entry}
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="query-log", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            # 밀려 있는 기록은 한 번에 쓰기
+            batch = [entry]
+            stop = False
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list[dict]):
+        # 기록 시각(ts)의 날짜 파일로 나눠 쓰기 (자정 전후 기록이 한 배치에 섞일 수 있음)
+        by_path: dict[str, list[dict]] = {}
+        for entry in batch:
+            day = date.fromisoformat(entry["ts"][:10])
+            by_path.setdefault(daily_path(self.path, day), []).append(entry)
+
+        for filepath, entries in by_path.items():
+            if filepath != self.current_path:
+                self.current_path = filepath
+                self._prune()
+            try:
+                os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+                with open(filepath, "a", encoding="utf-8") as f:
+                    for entry in entries:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.written += len(entries)
+            except OSError as e:
+                logger.warning(f"질의 로그 기록 실패 ({len(entries)}건): {e}")
+
+    def _prune(self):
+        """QUERY_LOG_RETENTION_DAYS일이 지난 파일 삭제 (날짜가 바뀔 때만 호출)"""
+        if QUERY_LOG_RETENTION_DAYS <= 0:
+            return
+        cutoff = date.today() - timedelta(days=QUERY_LOG_RETENTION_DAYS)
+        for day, filepath in log_files(self.path):
+            if day >= cutoff:
+                break
+            try:
+                os.remove(filepath)
+                logger.info(f"오래된 질의 로그 삭제: {filepath}")
+            except OSError as e:
+                logger.warning(f"질의 로그 삭제 실패 {filepath}: {e}")
+
+    def close(self, timeout: float = 2.0):
+        """남은 기록을 쓰고 스레드 종료"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.current_path or self.path,
+            "written": self.written,
+            "pending": self._queue.qsize(),
+            "dropped": self.dropped
+        }
+
+
+def top_queries(limit: int = WARM_TOP_N, window_days: int = QUERY_LOG_WINDOW_DAYS,
+                path: str = QUERY_LOG_PATH) -> list[dict]:
+    """
+    최근 window_days일 동안 자주 들어온 질문 상위 limit개
+    → [{"query": 마지막으로 들어온 원문, "source_filter", "count"}]
+    기간 안의 날짜 파일만 읽는다
+    """
+    since = datetime.now() - timedelta(days=window_days)
+    counts: Counter = Counter()
+    latest: dict[tuple, str] = {}
+    for day, filepath in log_files(path):
+        if day < since.date():
+            continue
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        if datetime.fromisoformat(entry["ts"]) < since:
+                            continue
+                        query = entry["query"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 쓰는 도중 잘린 줄 등
+                    key = (normalize_query(query), entry.get("source_filter") or "")
+                    if not key[0]:
+                        continue
+                    counts[key] += 1
+                    latest[key] = query
+        except FileNotFoundError:
+            continue  # 읽는 사이 보존 기간이 지나 삭제됨
+
+    return [
+        {"query": latest[key], "source_filter": key[1] or None, "count": count}
+        for key, count in counts.most_common(limit)
+    ]
@@ -0,0 +1,259 @@
+"""
+OpenAI 레이트 리밋 인식 실행기
+임베딩 일괄 처리와 책갈피 생성이 요청을 하나씩 순서대로 보내면 처리량이 RPM/TPM 한도가 아니라
+왕복 시간으로 정해진다. 여기서는
+- 모델별 RateLimiter: 분당 요청 수(RPM) / 토큰 수(TPM) 토큰 버킷. 요청 전에 추정 토큰만큼 확보하고,
+  응답의 x-ratelimit-* 헤더로 한도와 남은 양을 맞춰 다른 프로세스(서버 검색 등) 사용량까지 반영.
+  429는 retry-after 이상으로 지터를 준 지수 백오프 후 재시도하고, 그동안 같은 모델의 다른 요청도 쉰다.
+- map_concurrent(): 공용 스레드 풀(RATE_LIMIT_CONCURRENCY)로 요청을 동시에 실행.
+  Embedder(배치 임베딩)와 BookmarkCreator(책갈피 생성)가 같은 풀과 같은 모델 버킷을 공유한다.
+초기 한도(*_RPM_LIMIT / *_TPM_LIMIT)는 첫 응답 헤더로 바로 갱신되므로 계정 tier와 달라도 된다.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from utils.metrics import RATE_LIMIT_RETRIES, RATE_LIMIT_WAIT_SECONDS
+
+load_dotenv()
+
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+# 한도의 몇 %까지 쓸지 (나머지는 서버 검색 요청 몫)
+RATE_LIMIT_TARGET = float(os.getenv("RATE_LIMIT_TARGET", "0.9"))
+# 동시에 보낼 요청 수 (파이프라인 작업 전체 공유)
+RATE_LIMIT_CONCURRENCY = int(os.getenv("RATE_LIMIT_CONCURRENCY", "8"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "6"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "1.0"))
+RATE_LIMIT_BACKOFF_MAX = 60.0
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str) -> float | None:
+    """x-ratelimit-reset-* / retry-after 값 ("6m0s", "1.5s", "20ms", "2") → 초"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """429 응답 예외인지 (openai.RateLimitError 등)"""
+    return getattr(error, "status_code", None) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    """재시도할 예외: 429, 5xx, 연결 끊김/시간 초과 (SDK 자체 재시도는 끄고 여기서 처리)"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class TokenBucket:
+    """분당 capacity만큼 균등하게 차는 버킷 (호출은 RateLimiter 락 안에서만)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount를 꺼낼 수 있을 때까지 남은 초 (0이면 지금 가능)"""
+        amount = min(amount, self.capacity)  # 한도보다 큰 요청도 가득 찼을 때는 보냄
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """모델 1개의 RPM/TPM 한도 (map_concurrent 워커 스레드들이 공유)"""
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.requests = TokenBucket(rpm * RATE_LIMIT_TARGET)
+        self.tokens = TokenBucket(tpm * RATE_LIMIT_TARGET)
+        self.retries = 0
+        self.waited = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """요청 1회 + 추정 토큰을 확보할 때까지 대기"""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens)
+                )
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    break
+            time.sleep(min(wait, 1.0))
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.waited += waited
+            RATE_LIMIT_WAIT_SECONDS.labels(self.name).inc(waited)
+
+    def settle(self, estimated: int, actual: int):
+        """응답의 실제 토큰 사용량으로 추정치와의 차이 보정"""
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+
+    def update(self, headers):
+        """x-ratelimit-* 응답 헤더로 한도/남은 양 갱신 (다른 프로세스 사용분 반영)"""
+        if not headers:
+            return
+        with self._lock:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                try:
+                    limit = headers.get(f"x-ratelimit-limit-{kind}")
+                    remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                    if limit:
+                        bucket.capacity = float(limit) * RATE_LIMIT_TARGET
+                    if remaining is not None:
+                        # 서버가 본 남은 양에서 목표 비율 밖의 몫을 빼고, 로컬 추정보다 적으면 맞춤
+                        reserve = float(limit or bucket.capacity / RATE_LIMIT_TARGET) * (1 - RATE_LIMIT_TARGET)
+                        bucket.level = min(bucket.level, max(0.0, float(remaining) - reserve))
+                except ValueError:
+                    continue
+
+    def backoff(self, attempt: int, headers=None, pause: bool = True) -> float:
+        """
+        재시도 전 지터 백오프 시간 (retry-after 이상).
+        pause=True(429)면 그동안 같은 모델의 다른 요청도 멈춤
+        """
+        retry_after = None
+        if headers:
+            retry_after_ms = headers.get("retry-after-ms")
+            retry_after = (float(retry_after_ms) / 1000 if retry_after_ms
+                           else parse_duration(headers.get("retry-after")))
+        ceiling = min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt)
+        delay = max(retry_after or 0.0, random.uniform(ceiling / 2, ceiling))
+        with self._lock:
+            if pause:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.retries += 1
+        return delay
+
+    def call(self, func, tokens: int):
+        """
+        func()를 한도 안에서 실행. func는 (결과, 응답 헤더, 실제 토큰 수)를 반환.
+        429/5xx/연결 오류면 백오프 후 RATE_LIMIT_MAX_RETRIES번까지 재시도, 그 밖의 예외는 그대로 전파.
+        """
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire(tokens)
+            try:
+                result, headers, used = func()
+            except Exception as e:
+                if not is_retryable(e) or attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise
+                limited = is_rate_limited(e)
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                self.update(headers)
+                delay = self.backoff(attempt, headers, pause=limited)
+                RATE_LIMIT_RETRIES.labels(self.name, "429" if limited else "error").inc()
+                logger.warning(
+                    f"{'레이트 리밋' if limited else f'요청 실패({e})'} ({self.name}) — "
+                    f"{delay:.1f}초 후 재시도 ({attempt + 1}/{RATE_LIMIT_MAX_RETRIES})"
+                )
+                time.sleep(delay)
+                continue
+            self.update(headers)
+            if used is not None:
+                self.settle(tokens, used)
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rpm_limit": round(self.requests.capacity / RATE_LIMIT_TARGET),
+                "tpm_limit": round(self.tokens.capacity / RATE_LIMIT_TARGET),
+                "requests_available": round(self.requests.level),
+                "tokens_available": round(self.tokens.level),
+                "retries": self.retries,
+                "waited_seconds": round(self.waited, 1)
+            }
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_limiter(model: str, rpm: int, tpm: int) -> RateLimiter:
+    """모델별 RateLimiter (같은 프로세스의 Embedder/BookmarkCreator/재색인이 공유)"""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(model, rpm, tpm)
+        return _limiters[model]
+
+
+def limiter_stats() -> dict:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _limiters_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, RATE_LIMIT_CONCURRENCY),
+                thread_name_prefix="openai"
+            )
+        return _executor
+
+
+def map_concurrent(func, items: list) -> list:
+    """
+    items 각각에 func 실행 (공용 풀에서 동시에, 결과는 입력 순서).
+    func 안에서 예외는 직접 처리할 것 — 남은 예외는 모든 작업이 끝난 뒤 첫 번째 것을 다시 발생.
+    항목이 1개이거나 이미 풀 안에서 호출됐으면 (교착 방지) 호출한 스레드에서 바로 실행.
+    """
+    nested = threading.current_thread().name.startswith("openai")
+    if len(items) <= 1 or RATE_LIMIT_CONCURRENCY <= 1 or nested:
+        return [func(item) for item in items]
+    futures = [_get_executor().submit(func, item) for item in items]
+    results, error = [], None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(None)
+            error = error or e
+    if error:
+        raise error
+    return results
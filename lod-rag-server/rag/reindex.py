@@ -0,0 +1,409 @@
+"""
+무중단 컬렉션 재구축 (blue/green)
+EMBEDDING_MODEL이나 임베딩 텍스트 형식을 바꿀 때 서비스 컬렉션을 지우고 embed-all을 다시 돌리면
+그동안 검색 결과가 비므로, 새 버전 컬렉션 {QDRANT_COLLECTION}_v{시각}(+ _passages)을 옆에서 채운 뒤
+건수/자기 검색 품질 검사를 통과하면 Qdrant 별칭 QDRANT_COLLECTION(+ 문단 별칭)을 한 번에 옮긴다.
+Retriever/Embedder는 항상 별칭 이름으로 조회하므로 교체 순간에도 검색이 끊기지 않는다.
+이전 컬렉션은 REINDEX_KEEP_PREVIOUS개까지 남겨 rollback()으로 되돌릴 수 있다.
+
+현재 별칭 대상과 모델, 교체 이력, 진행률은 REINDEX_STATE_PATH에 저장 (서버와 CLI가 공유).
+별칭 대상 모델이 바뀌면 서버의 Retriever/Embedder도 같은 모델로 질문/책갈피를 임베딩한다.
+"""
+
+import json
+import os
+import random
+import threading
+from datetime import datetime
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, PointStruct
+)
+from loguru import logger
+from dotenv import load_dotenv
+
+from rag.collection import PASSAGE_PAYLOAD_INDEXES, create_collection
+from rag.corpus import bump_corpus_version
+from rag.passages import PASSAGE_COLLECTION
+from rag.providers import default_embedding_model
+from rag.sparse import SPARSE_VECTOR_NAME
+
+try:
+    import fcntl
+except ImportError:  # Windows 로컬 실행 (쿠키 스크립트 등)
+    fcntl = None
+
+load_dotenv()
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+COLLECTION = os.getenv("QDRANT_COLLECTION", "lod_bookmarks")
+REINDEX_STATE_PATH = os.getenv("REINDEX_STATE_PATH", "./data/reindex_state.json")
+# 새 컬렉션 포인트 수 / 디스크 책갈피 수가 이 비율 미만이면 교체하지 않음
+REINDEX_MIN_COUNT_RATIO = float(os.getenv("REINDEX_MIN_COUNT_RATIO", "0.98"))
+# 자기 검색 검사: 책갈피 제목으로 검색해 그 책갈피가 상위 5위 안에 드는 비율
+REINDEX_QUALITY_SAMPLE = int(os.getenv("REINDEX_QUALITY_SAMPLE", "20"))
+REINDEX_MIN_RECALL = float(os.getenv("REINDEX_MIN_RECALL", "0.8"))
+# 롤백용으로 남겨 둘 이전 컬렉션 수 (넘으면 오래된 것부터 삭제)
+REINDEX_KEEP_PREVIOUS = int(os.getenv("REINDEX_KEEP_PREVIOUS", "1"))
+
+VERSION_PREFIX = f"{COLLECTION}_v"
+LEGACY_COLLECTION = f"{COLLECTION}_legacy"
+COPY_BATCH_SIZE = 256
+QUALITY_TOP_K = 5
+
+_lock = threading.Lock()
+_cached_stamp: tuple | None = None
+_cached_state: dict = {}
+
+
+def _read_state() -> dict:
+    try:
+        with open(REINDEX_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def read_state() -> dict:
+    """재색인 상태 (파일이 그대로면 메모리 값 재사용)"""
+    global _cached_stamp, _cached_state
+    try:
+        st = os.stat(REINDEX_STATE_PATH)
+    except FileNotFoundError:
+        return {}
+    stamp = (st.st_ino, st.st_mtime_ns)
+
+    with _lock:
+        if stamp != _cached_stamp:
+            _cached_state = _read_state()
+            _cached_stamp = stamp
+        return _cached_state
+
+
+def active_collection() -> dict:
+    """별칭이 가리키는 컬렉션 {collection, passage_collection, model, dim, swapped_at} (재색인 전이면 빈 dict)"""
+    return read_state().get("active") or {}
+
+
+def get_progress() -> dict:
+    """마지막 재색인 진행 상황 + 지금 실행 중인지"""
+    state = read_state()
+    return {
+        **(state.get("progress") or {}),
+        "running": is_running(),
+        "active": state.get("active") or {},
+        "history": state.get("history") or []
+    }
+
+
+def _update_state(func) -> dict:
+    """상태 파일 읽기 → func(state)로 수정 → 원자적으로 교체"""
+    global _cached_stamp, _cached_state
+    os.makedirs(os.path.dirname(os.path.abspath(REINDEX_STATE_PATH)), exist_ok=True)
+
+    with _lock, open(REINDEX_STATE_PATH + ".state.lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            state = _read_state()
+            func(state)
+            tmp_path = REINDEX_STATE_PATH + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, REINDEX_STATE_PATH)
+            _cached_state = state
+            st = os.stat(REINDEX_STATE_PATH)
+            _cached_stamp = (st.st_ino, st.st_mtime_ns)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return state
+
+
+def _set_progress(**fields):
+    def apply(state):
+        progress = state.setdefault("progress", {})
+        progress.update(fields, updated_at=datetime.now().isoformat(timespec="seconds"))
+    _update_state(apply)
+
+
+class ReindexRunning(RuntimeError):
+    """다른 재색인이 이미 실행 중"""
+
+
+class _RunLock:
+    """재색인은 프로세스(서버/CLI)를 통틀어 한 번에 하나만 (flock LOCK_NB)"""
+
+    def __init__(self):
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(REINDEX_STATE_PATH)), exist_ok=True)
+        self._file = open(REINDEX_STATE_PATH + ".lock", "w")
+        if fcntl:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._file.close()
+                raise ReindexRunning("재색인이 이미 실행 중입니다")
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def is_running() -> bool:
+    """다른 프로세스/스레드가 재색인 락을 잡고 있는지"""
+    if not fcntl:
+        return False
+    try:
+        with _RunLock():
+            return False
+    except ReindexRunning:
+        return True
+
+
+class Reindexer:
+    """
+    새 버전 컬렉션 빌드 → 검사 → 별칭 교체.
+    model을 주지 않으면 EMBEDDING_MODEL (임베딩 텍스트 형식만 바뀐 경우 같은 모델로 재구축).
+    """
+
+    def __init__(self, model: str = None):
+        self.model = model
+        self.qdrant = QdrantClient(url=f"http://{QDRANT_HOST}:{QDRANT_PORT}")
+
+    def run(self, swap: bool = True, force: bool = False) -> dict:
+        """
+        재색인 1회. swap=False면 빌드/검사만 하고 별칭은 그대로 (다음 실행 때 정리됨).
+        force=True면 검사에 실패해도 교체.
+        """
+        # 순환 import 방지 (embedder → reindex.active_collection)
+        from rag.embedder import Embedder
+
+        with _RunLock():
+            target = f"{VERSION_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            self._drop_stale_builds()
+            _update_state(lambda state: state.update(progress={
+                "phase": "building", "collection": target, "model": None,
+                "done": 0, "total": 0, "started_at": datetime.now().isoformat(timespec="seconds")
+            }))
+            try:
+                embedder = Embedder(collection=target, model=self.model)
+                _set_progress(model=embedder.provider.model)
+                logger.info(f"재색인 시작: {target} ({embedder.provider.model})")
+
+                report = embedder.process_all(
+                    progress=lambda done, total: _set_progress(done=done, total=total)
+                )
+                # 빌드하는 동안 새로 생기거나 바뀐 책갈피 따라잡기 (지문 비교라 그 부분만 임베딩)
+                catch_up = embedder.process_all()
+                report["catch_up"] = catch_up["saved"] + catch_up["updated"]
+
+                _set_progress(phase="checking")
+                check = self.check(embedder)
+                _set_progress(check=check)
+                if not check["passed"] and not force:
+                    logger.warning(f"재색인 검사 실패, 별칭 유지: {check}")
+                    _set_progress(phase="failed", error="검사 실패")
+                    return {"collection": target, "swapped": False, "check": check, "embed": report}
+                if not swap:
+                    _set_progress(phase="built")
+                    return {"collection": target, "swapped": False, "check": check, "embed": report}
+
+                _set_progress(phase="swapping")
+                self.swap({
+                    "collection": target,
+                    "passage_collection": self._existing(embedder.passage_collection),
+                    "model": embedder.provider.model,
+                    "dim": embedder.provider.dim
+                })
+                _set_progress(phase="done")
+                return {"collection": target, "swapped": True, "check": check, "embed": report}
+            except Exception as e:
+                _set_progress(phase="failed", error=str(e))
+                raise
+
+    def _existing(self, name: str) -> str | None:
+        return name if self.qdrant.collection_exists(name) else None
+
+    def check(self, embedder) -> dict:
+        """건수 비율 + 자기 검색 재현율 검사"""
+        expected = embedder._disk_bookmark_ids()
+        count = self.qdrant.count(collection_name=embedder.collection, exact=True).count
+        ratio = count / len(expected) if expected else 1.0
+
+        recall = None
+        sample_ids = random.sample(sorted(expected.values()), min(REINDEX_QUALITY_SAMPLE, len(expected)))
+        bookmarks, _ = embedder._load_bookmarks(sample_ids)
+        bookmarks = [bm for bm in bookmarks if bm.get("title")]
+        if bookmarks:
+            vectors = embedder._embed([bm["title"] for bm in bookmarks])
+            hits = 0
+            for bookmark, vector in zip(bookmarks, vectors):
+                response = self.qdrant.query_points(
+                    collection_name=embedder.collection,
+                    query=vector,
+                    limit=QUALITY_TOP_K,
+                    with_payload=False
+                )
+                point_id = embedder._bookmark_id_to_uuid(bookmark["bookmark_id"])
+                hits += any(str(hit.id) == point_id for hit in response.points)
+            recall = hits / len(bookmarks)
+
+        passed = ratio >= REINDEX_MIN_COUNT_RATIO and (recall is None or recall >= REINDEX_MIN_RECALL)
+        return {
+            "points": count,
+            "bookmarks": len(expected),
+            "count_ratio": round(ratio, 4),
+            "recall": round(recall, 4) if recall is not None else None,
+            "sample": len(bookmarks),
+            "passed": passed
+        }
+
+    def _aliases(self) -> dict[str, str]:
+        """별칭 → 실제 컬렉션"""
+        return {a.alias_name: a.collection_name for a in self.qdrant.get_aliases().aliases}
+
+    def _point_model(self, collection: str) -> str | None:
+        """포인트 페이로드에 기록된 임베딩 모델 (지문 도입 전 컬렉션이면 None)"""
+        points, _ = self.qdrant.scroll(
+            collection_name=collection, limit=1, with_payload=["embed_model"], with_vectors=False
+        )
+        return (points[0].payload or {}).get("embed_model") if points else None
+
+    def _copy_collection(self, source: str, target: str, indexes: dict = None):
+        """벡터 포함 전체 복사 (별칭으로 바꾸기 전 기존 실제 컬렉션 보존용)"""
+        params = self.qdrant.get_collection(source).config.params
+        sparse = SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+        create_collection(self.qdrant, target, params.vectors.size, sparse=sparse, indexes=indexes)
+        offset = None
+        while True:
+            points, offset = self.qdrant.scroll(
+                collection_name=source, limit=COPY_BATCH_SIZE, offset=offset,
+                with_payload=True, with_vectors=True
+            )
+            if points:
+                self.qdrant.upsert(
+                    collection_name=target,
+                    points=[PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points]
+                )
+            if offset is None:
+                break
+
+    def _migrate_legacy(self) -> dict | None:
+        """
+        QDRANT_COLLECTION이 아직 실제 컬렉션이면 {이름}_legacy로 복사한 뒤 삭제 (같은 이름의 별칭을 만들기 위해).
+        복사본은 첫 교체의 롤백 대상이 된다. 삭제~별칭 생성 사이의 짧은 공백은 첫 교체 때 한 번뿐.
+        """
+        real = {c.name for c in self.qdrant.get_collections().collections}
+        if COLLECTION not in real:
+            return None
+
+        logger.info(f"기존 컬렉션 보존 복사: {COLLECTION} → {LEGACY_COLLECTION}")
+        # 지문 도입 전 포인트는 모델 기록이 없음 → 그때 embed-all이 쓰던 기본 모델로 기록
+        # (None이면 롤백 후 서버가 모델을 전환하지 않고 새 모델로 질문을 임베딩하게 됨)
+        legacy = {
+            "collection": LEGACY_COLLECTION,
+            "passage_collection": None,
+            "model": self._point_model(COLLECTION) or default_embedding_model(),
+            "dim": self.qdrant.get_collection(COLLECTION).config.params.vectors.size
+        }
+        if self.qdrant.collection_exists(LEGACY_COLLECTION):
+            self.qdrant.delete_collection(LEGACY_COLLECTION)
+        self._copy_collection(COLLECTION, LEGACY_COLLECTION)
+        if PASSAGE_COLLECTION in real:
+            legacy_passages = f"{LEGACY_COLLECTION}_passages"
+            if self.qdrant.collection_exists(legacy_passages):
+                self.qdrant.delete_collection(legacy_passages)
+            self._copy_collection(PASSAGE_COLLECTION, legacy_passages, PASSAGE_PAYLOAD_INDEXES)
+            legacy["passage_collection"] = legacy_passages
+
+        self.qdrant.delete_collection(COLLECTION)
+        if PASSAGE_COLLECTION in real:
+            self.qdrant.delete_collection(PASSAGE_COLLECTION)
+        return legacy
+
+    def _point_aliases(self, target: dict):
+        """책갈피/문단 별칭을 target으로 옮기기 (요청 1회 → Qdrant가 원자적으로 적용)"""
+        aliases = self._aliases()
+        operations = []
+        for alias, name in ((COLLECTION, target["collection"]),
+                            (PASSAGE_COLLECTION, target.get("passage_collection"))):
+            if alias in aliases:
+                operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+            # 문단 컬렉션이 없는 대상이면 문단 별칭은 지움 → Retriever가 원본 앞부분으로 대체
+            if name:
+                operations.append(CreateAliasOperation(
+                    create_alias=CreateAlias(collection_name=name, alias_name=alias)
+                ))
+        self.qdrant.update_collection_aliases(change_aliases_operations=operations)
+
+    def swap(self, target: dict) -> dict:
+        """별칭 교체 + 상태 기록 + 오래된 이전 컬렉션 정리"""
+        previous = active_collection() or self._migrate_legacy()
+        self._point_aliases(target)
+        target = {
+            **target,
+            # 모델 없이 기록된 예전 이력(legacy)으로 롤백해도 기본 모델로 전환되도록
+            "model": target.get("model") or default_embedding_model(),
+            "swapped_at": datetime.now().isoformat(timespec="seconds")
+        }
+
+        def apply(state):
+            history = state.setdefault("history", [])
+            if previous and previous.get("collection") != target["collection"]:
+                history.append(previous)
+            history[:] = [h for h in history if h["collection"] != target["collection"]]
+            state["active"] = target
+        state = _update_state(apply)
+
+        self._prune(state)
+        # 답변 캐시(코퍼스 버전 키)와 로컬 인덱스가 새 컬렉션 기준으로 다시 만들어지도록
+        bump_corpus_version(reason="컬렉션 교체")
+        logger.info(
+            f"별칭 교체: {COLLECTION} → {target['collection']} ({target['model']})"
+            + (f", 이전 {previous['collection']}" if previous else "")
+        )
+        return target
+
+    def rollback(self) -> dict:
+        """직전 컬렉션으로 별칭 되돌리기"""
+        with _RunLock():
+            history = read_state().get("history") or []
+            if not history:
+                raise ValueError("되돌릴 이전 컬렉션 없음")
+            target = history[-1]
+            if not self.qdrant.collection_exists(target["collection"]):
+                raise ValueError(f"이전 컬렉션이 삭제됨: {target['collection']}")
+            _update_state(lambda state: state["history"].pop())
+            return self.swap({k: v for k, v in target.items() if k != "swapped_at"})
+
+    def _prune(self, state: dict):
+        """REINDEX_KEEP_PREVIOUS개를 넘는 이전 컬렉션 삭제"""
+        history = state.get("history") or []
+        excess = len(history) - REINDEX_KEEP_PREVIOUS
+        if excess <= 0:
+            return
+        for entry in history[:excess]:
+            self._drop(entry["collection"], entry.get("passage_collection"))
+        _update_state(lambda s: s.update(history=s.get("history", [])[excess:]))
+
+    def _drop_stale_builds(self):
+        """교체되지 않은 채 남은 빌드 (검사 실패, --no-swap, 중단) 삭제"""
+        state = read_state()
+        keep = {e["collection"] for e in (state.get("history") or []) + [state.get("active") or {}] if e}
+        for collection in self.qdrant.get_collections().collections:
+            name = collection.name
+            if name.startswith(VERSION_PREFIX) and not name.endswith("_passages") and name not in keep:
+                self._drop(name, f"{name}_passages")
+
+    def _drop(self, collection: str, passage_collection: str = None):
+        for name in (collection, passage_collection):
+            if name and self.qdrant.collection_exists(name):
+                self.qdrant.delete_collection(name)
+                logger.info(f"이전 컬렉션 삭제: {name}")
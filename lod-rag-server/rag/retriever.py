@@ -4,29 +4,59 @@
 2단계: 책갈피 → 원본 JSON 로드 → GPT 답변 생성
 """
 
+import asyncio
 import json
 import os
+import time
+from typing import AsyncIterator
 
-from openai import OpenAI
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, Prefetch, QueryRequest
 from loguru import logger
 from dotenv import load_dotenv
 
+from rag.cache import (
+    EmbeddingCache, JsonFileCache, SemanticCache, TTLCache, normalize_query,
+    SEMANTIC_CACHE_ENABLED
+)
+from rag.collection import search_params
+from rag.corpus import get_corpus_version
+from rag.deadline import Deadline, make_deadline
+from rag.passages import PASSAGE_COLLECTION, PASSAGES_ENABLED, PASSAGES_PER_BOOKMARK
+from rag.local_index import LocalIndex, LOCAL_INDEX_ENABLED, LOCAL_INDEX_FAST_PATH_MAX
+from rag.providers import default_embedding_model, get_chat_provider, get_embedding_provider
+from rag.reindex import active_collection
+from rag.query_log import QueryLog, WARM_TOP_N, top_queries
+from rag.singleflight import SingleFlight
+from rag.sparse import SPARSE_VECTOR_NAME, char_ngrams, encode_query, ngram_coverage
 from utils.image_handler import ImageHandler
+from utils.metrics import (
+    ANSWER_MODES, ANSWERS, CACHE_LOOKUPS, FALLBACKS, SEARCH_SECONDS,
+    observe_stage, stage_timer, start_stage_timings
+)
 
 load_dotenv()
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 COLLECTION = os.getenv("QDRANT_COLLECTION", "lod_bookmarks")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 BOOKMARK_TOP_K = int(os.getenv("BOOKMARK_TOP_K", "5"))
 SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "15"))
 MAX_ANSWER_LENGTH = int(os.getenv("MAX_ANSWER_LENGTH", "500"))
 SCORE_THRESHOLD = float(os.getenv("SCORE_THRESHOLD", "0.25"))
 KEYWORD_BOOST = float(os.getenv("KEYWORD_BOOST", "0.15"))
+HYBRID_SPARSE_CANDIDATES = int(os.getenv("HYBRID_SPARSE_CANDIDATES", "10"))
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "4"))
+WARM_CONCURRENCY = int(os.getenv("WARM_CONCURRENCY", "2"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+# Qdrant 호출이 실패하면 이 시간(초) 동안 다시 시도하지 않고 로컬 인덱스로 바로 검색
+QDRANT_RETRY_BACKOFF_SECONDS = float(os.getenv("QDRANT_RETRY_BACKOFF_SECONDS", "30"))
+
+ANSWER_ERROR_MESSAGE = "답변 생성 중 오류가 발생했습니다."
+NOT_FOUND_MESSAGE = "관련 내용을 찾지 못했습니다."
+DEGRADED_MESSAGE = "답변 생성이 지연되어 관련 게시글 요약을 먼저 전달합니다."
+DEADLINE_MESSAGE = "검색이 지연되고 있습니다. 잠시 후 다시 시도해주세요."
 
 SYSTEM_PROMPT = """당신은 어둠의전설 게임 전문 도우미입니다.
 
@@ -40,22 +70,120 @@ SYSTEM_PROMPT = """당신은 어둠의전설 게임 전문 도우미입니다.
 
 
 class Retriever:
-    def __init__(self):
-        self.openai = OpenAI()
-        self.qdrant = QdrantClient(url=f"http://{QDRANT_HOST}:{QDRANT_PORT}")
-
-    def _get_embedding(self, text: str) -> list[float]:
-        """질문 텍스트 임베딩"""
-        response = self.openai.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        return response.data[0].embedding
-
-    def _search_bookmarks(self, question: str, source_filter: str = None) -> list[dict]:
-        """1단계: Qdrant에서 유사 책갈피 검색 + 키워드 부스트 재랭킹"""
-        vector = self._get_embedding(question)
-
+    """
+    async 검색 파이프라인.
+    FastAPI 이벤트 루프를 막지 않도록 모델/Qdrant 호출은 모두 async 클라이언트 사용,
+    파일/이미지 로드는 스레드로 넘긴다. CLI용 동기 API는 search_sync().
+    query_log=True면 search()/search_stream() 호출을 질의 로그에 남긴다 (서버에서만 사용).
+    """
+
+    def __init__(self, query_log: bool = False):
+        # 재색인으로 별칭 대상이 바뀌면 그 컬렉션의 모델로 질문을 임베딩해야 같은 벡터 공간
+        active = active_collection()
+        self._active_collection = active.get("collection")
+        self.embedder = get_embedding_provider(active.get("model"))
+        self.llm = get_chat_provider()
+        self.qdrant = AsyncQdrantClient(url=f"http://{QDRANT_HOST}:{QDRANT_PORT}")
+        # 제공자/모델이 바뀌면 벡터가 달라지므로 모델 이름별로 캐시
+        self.embedding_cache = EmbeddingCache(self.embedder.model)
+        # 키: (정규화 질문, source_filter, 코퍼스 버전) → 컬렉션이 바뀌면 자동으로 다른 키
+        self.answer_cache = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+        self.semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+        self.original_cache = JsonFileCache()
+        self._original_paths: dict[str, str] = {}  # content_path → 절대경로
+        self._hybrid: bool | None = None
+        self._passages: bool | None = None
+        self._qdrant_retry_at = 0.0  # 이 시각(monotonic) 전까지 Qdrant 장애로 간주
+        # 키: (정규화 질문, source_filter) → 동시에 들어온 같은 질문은 계산 1회로 합침
+        self.inflight = SingleFlight()
+        # Qdrant 장애 대체 + 소규모 코퍼스 빠른 경로 (prepare_local_index()에서 로드)
+        self.local_index = LocalIndex() if LOCAL_INDEX_ENABLED else None
+        self._local_sync_task: asyncio.Task | None = None
+        self.query_log = QueryLog() if query_log else None
+
+    def _sync_active_collection(self):
+        """별칭이 다른 컬렉션으로 교체됐으면 컬렉션 설정 캐시를 비우고, 모델이 바뀌었으면 임베딩 모델도 전환"""
+        active = active_collection()
+        if active.get("collection") == self._active_collection:
+            return
+        self._active_collection = active.get("collection")
+        self._hybrid = None
+        self._passages = None
+
+        # 모델 기록이 없는 컬렉션(지문 도입 전 legacy)은 기본 모델로 만든 것
+        model = active.get("model") or default_embedding_model()
+        if model != self.embedder.model:
+            logger.info(f"질문 임베딩 모델 전환: {self.embedder.model} → {model}")
+            # 진행 중인 요청이 이전 제공자를 쓰고 있을 수 있으므로 닫지 않고 교체만
+            self.embedder = get_embedding_provider(model)
+            self.embedding_cache.close(timeout=0)
+            self.embedding_cache = EmbeddingCache(model)
+            if self.semantic_cache:
+                self.semantic_cache = SemanticCache()
+
+        # 로컬 인덱스는 새 모델로 다시 동기화될 때까지 matches()가 False → 사용 안 함
+        if self.local_index:
+            self._schedule_local_sync()
+
+    async def _get_embedding(self, text: str) -> list[float]:
+        """질문 텍스트 임베딩 (같은 질문은 캐시에서 바로 반환)"""
+        self._sync_active_collection()
+        cached = await self.embedding_cache.aget(text)
+        CACHE_LOOKUPS.labels("embedding", "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            return cached
+
+        with stage_timer("embedding"):
+            vector = (await self.embedder.aembed([text]))[0]
+        self.embedding_cache.set(text, vector)
+        return vector
+
+    async def _get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """여러 질문 임베딩 (캐시에 없는 것만 embeddings.create 1회로 요청)"""
+        self._sync_active_collection()
+        vectors = await asyncio.gather(*[self.embedding_cache.aget(text) for text in texts])
+        missing = list(dict.fromkeys(
+            normalize_query(text) for text, v in zip(texts, vectors) if v is None
+        ))
+
+        if missing:
+            with stage_timer("embedding"):
+                fetched = dict(zip(missing, await self.embedder.aembed(missing)))
+            for text, vector in fetched.items():
+                self.embedding_cache.set(text, vector)
+            vectors = [
+                v if v is not None else fetched[normalize_query(text)]
+                for text, v in zip(texts, vectors)
+            ]
+        return vectors
+
+    def _qdrant_unavailable(self) -> bool:
+        """최근 Qdrant 호출이 실패해 재시도 대기 중인지"""
+        return time.monotonic() < self._qdrant_retry_at
+
+    def _mark_qdrant_failure(self):
+        """Qdrant 실패 기록 → QDRANT_RETRY_BACKOFF_SECONDS 동안 확인/검색 호출을 건너뜀"""
+        self._qdrant_retry_at = time.monotonic() + QDRANT_RETRY_BACKOFF_SECONDS
+
+    async def _hybrid_enabled(self) -> bool:
+        """컬렉션에 어휘 인덱스(sparse 벡터)가 있는지 (최초 1회 확인 후 캐시, 실패하면 대기 시간 동안 False)"""
+        if self._hybrid is None:
+            if self._qdrant_unavailable():
+                return False
+            try:
+                info = await self.qdrant.get_collection(COLLECTION)
+            except Exception as e:
+                logger.warning(f"Qdrant 컬렉션 정보 조회 실패: {e}")
+                self._mark_qdrant_failure()
+                return False
+            self._hybrid = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+            if not self._hybrid:
+                logger.warning(f"컬렉션 {COLLECTION}에 어휘 인덱스 없음 — dense 검색만 사용")
+        return self._hybrid
+
+    def _build_query(self, question: str, vector: list[float],
+                     source_filter: str, hybrid: bool) -> QueryRequest:
+        """질문 1개에 대한 Qdrant 쿼리 구성"""
         # source 필터 (lod_nexon / naver_cafe / None=전체)
         query_filter = None
         if source_filter:
@@ -63,41 +191,137 @@ class Retriever:
                 must=[FieldCondition(key="source", match=MatchValue(value=source_filter))]
             )
 
-        try:
-            response = self.qdrant.query_points(
-                collection_name=COLLECTION,
-                query=vector,
-                query_filter=query_filter,
-                limit=SEARCH_CANDIDATES,
-                score_threshold=SCORE_THRESHOLD
+        # 양자화 컬렉션이면 oversampling 후 원본 벡터로 재채점
+        params = search_params()
+
+        if not hybrid:
+            return QueryRequest(
+                query=vector, filter=query_filter, params=params,
+                limit=SEARCH_CANDIDATES, score_threshold=SCORE_THRESHOLD, with_payload=True
             )
-            results = response.points
+
+        # dense 후보 + 어휘 후보를 한 쿼리로 합친 뒤 dense 코사인으로 다시 점수화
+        # → 임베딩 상위권 밖에 있던 정확한 스킬명/제목 일치도 후보에 포함된다
+        return QueryRequest(
+            prefetch=[
+                Prefetch(query=vector, filter=query_filter, params=params, limit=SEARCH_CANDIDATES),
+                Prefetch(
+                    query=encode_query(question),
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=HYBRID_SPARSE_CANDIDATES
+                )
+            ],
+            query=vector,
+            params=params,
+            limit=SEARCH_CANDIDATES + HYBRID_SPARSE_CANDIDATES,
+            score_threshold=SCORE_THRESHOLD,
+            with_payload=True
+        )
+
+    async def _search_bookmarks(self, question: str, source_filter: str = None,
+                                vector: list[float] = None) -> list[dict]:
+        """1단계: Qdrant 하이브리드 검색 (dense + 어휘 n-gram) + 어휘 일치도 재랭킹"""
+        if vector is None:
+            vector = await self._get_embedding(question)
+        results = await self._search_bookmarks_batch([(question, source_filter, vector)])
+        return results[0]
+
+    async def _search_bookmarks_batch(self, items: list[tuple[str, str, list[float]]]) -> list[list[dict]]:
+        """여러 질문의 1단계 검색을 Qdrant 배치 쿼리 1회로 처리. items: [(질문, source_filter, 벡터)]"""
+        local = self.local_index
+        model = self.embedder.model
+        if (LOCAL_INDEX_FAST_PATH_MAX > 0 and local
+                and local.size <= LOCAL_INDEX_FAST_PATH_MAX and local.is_fresh(model)):
+            return self._search_local(items)
+        # 직전 실패 후 대기 중이면 Qdrant 왕복 없이 로컬 인덱스로 (없으면 Qdrant 재시도)
+        if self._qdrant_unavailable() and local and local.size and local.matches(model):
+            FALLBACKS.labels("local_index").inc()
+            return self._search_local(items)
+
+        hybrid = await self._hybrid_enabled()
+        requests = [
+            self._build_query(question, vector, source_filter, hybrid)
+            for question, source_filter, vector in items
+        ]
+
+        try:
+            with stage_timer("qdrant"):
+                responses = await self.qdrant.query_batch_points(
+                    collection_name=COLLECTION,
+                    requests=requests
+                )
         except Exception as e:
             logger.error(f"Qdrant 검색 실패: {e}")
-            return []
+            self._hybrid = None  # 컬렉션이 교체됐을 수 있으므로 다음 검색에서 재확인
+            self._mark_qdrant_failure()
+            if local and local.size and local.matches(model):
+                logger.warning(f"로컬 인덱스로 대체 검색 (코퍼스 버전 {local.version})")
+                FALLBACKS.labels("local_index").inc()
+                return self._search_local(items)
+            FALLBACKS.labels("qdrant_error").inc()
+            return [[] for _ in items]
+
+        if local and not local.is_fresh(model):
+            self._schedule_local_sync()
+
+        return [
+            self._rerank(question, [(hit.payload, hit.score) for hit in response.points])
+            for (question, _, _), response in zip(items, responses)
+        ]
+
+    def _search_local(self, items: list[tuple[str, str, list[float]]]) -> list[list[dict]]:
+        """로컬 인덱스 검색 (Qdrant 하이브리드 쿼리처럼 dense 후보 + 어휘 후보 → 재랭킹)"""
+        with stage_timer("local_index"):
+            return [
+                self._rerank(question, self.local_index.search(
+                    vector, source_filter, SEARCH_CANDIDATES,
+                    question=question, lexical_limit=HYBRID_SPARSE_CANDIDATES
+                ))
+                for question, source_filter, vector in items
+            ]
+
+    async def prepare_local_index(self):
+        """서버 시작 시 로컬 인덱스 스냅샷 로드 → 낡았으면 백그라운드로 Qdrant에서 다시 동기화"""
+        if not self.local_index:
+            return
+        await asyncio.to_thread(self.local_index.load)
+        if LOCAL_INDEX_FAST_PATH_MAX > 0:
+            logger.info(
+                f"로컬 인덱스 빠른 경로 사용 ({LOCAL_INDEX_FAST_PATH_MAX}건 이하) — "
+                f"Qdrant 양자화/재채점 설정은 적용되지 않음"
+            )
+        if not self.local_index.is_fresh(self.embedder.model):
+            self._schedule_local_sync()
 
-        # 키워드 부스트: 제목/키워드에 검색어가 포함되면 점수 가산
-        # 띄어쓰기 변형도 함께 매칭 ("진정한 강자" ↔ "진정한강자")
-        query_terms = question.lower().split()
-        joined = "".join(query_terms)
-        match_terms = list(query_terms)
-        if len(query_terms) > 1:
-            match_terms.append(joined)
+    def _schedule_local_sync(self):
+        """로컬 인덱스 동기화를 백그라운드로 1개만 실행"""
+        if self._local_sync_task is None or self._local_sync_task.done():
+            self._local_sync_task = asyncio.create_task(self._sync_local_index())
+
+    async def _sync_local_index(self):
+        try:
+            await self.local_index.sync(self.qdrant, self.embedder.model)
+        except Exception as e:
+            logger.warning(f"로컬 인덱스 동기화 실패: {e}")
+
+    @staticmethod
+    def _rerank(question: str, hits: list[tuple[dict, float]]) -> list[dict]:
+        """
+        코사인 점수 + 어휘 일치도 가산 → 상위 BOOKMARK_TOP_K 반환.
+        질문의 글자 n-gram이 제목/키워드에 얼마나 들어있는지로 가산하므로
+        띄어쓰기 변형("진정한 강자" ↔ "진정한강자")과 부분 일치도 반영된다.
+        SCORE_THRESHOLD는 가산 전 코사인 점수에 적용 (가산은 순위에만 반영)
+        """
+        query_grams = set(char_ngrams(question))
 
         bookmarks = []
-        for hit in results:
-            payload = hit.payload
-            score = hit.score
-
-            title = payload.get("title", "").lower()
-            title_nospace = title.replace(" ", "")
-            keywords = [k.lower() for k in payload.get("keywords", [])]
-            keywords_nospace = [k.replace(" ", "") for k in keywords]
-            for term in match_terms:
-                if term in title or term in title_nospace:
-                    score += KEYWORD_BOOST
-                if term in keywords or term in keywords_nospace:
-                    score += KEYWORD_BOOST * 0.5
+        for payload, score in hits:
+            # 로컬 인덱스 대체 검색은 Qdrant score_threshold를 거치지 않으므로 여기서도 확인
+            if score < SCORE_THRESHOLD:
+                continue
+            score += KEYWORD_BOOST * ngram_coverage(query_grams, [payload.get("title", "")])
+            score += KEYWORD_BOOST * 0.5 * ngram_coverage(query_grams, payload.get("keywords", []))
 
             payload["score"] = score
             bookmarks.append(payload)
@@ -106,41 +330,113 @@ class Retriever:
         bookmarks.sort(key=lambda x: x["score"], reverse=True)
         return bookmarks[:BOOKMARK_TOP_K]
 
+    def _resolve_content_path(self, content_path: str) -> str:
+        """content_path → 절대경로 (한 번 계산한 것은 재사용)"""
+        filepath = self._original_paths.get(content_path)
+        if filepath is None:
+            # Docker 환경에서 상대경로 처리
+            relative = content_path[2:] if content_path.startswith("./") else content_path
+            filepath = os.path.join(os.getcwd(), relative)
+            self._original_paths[content_path] = filepath
+        return filepath
+
     def _load_original_data(self, content_path: str) -> dict:
-        """책갈피의 content_path로 원본 JSON 로드 → 전체 dict 반환"""
+        """책갈피의 content_path로 원본 JSON 로드 → 전체 dict 반환 (파싱 결과 캐시)"""
         if not content_path:
             return {}
 
-        # Docker 환경에서 상대경로 처리
-        if content_path.startswith("./"):
-            content_path = content_path[2:]
-        filepath = os.path.join(os.getcwd(), content_path)
+        filepath = self._resolve_content_path(content_path)
 
-        if not os.path.exists(filepath):
+        try:
+            return self.original_cache.load(filepath)
+        except FileNotFoundError:
             logger.warning(f"원본 파일 없음: {filepath}")
             return {}
+        except Exception as e:
+            logger.error(f"원본 로드 실패 {filepath}: {e}")
+            return {}
+
+    async def _passages_enabled(self) -> bool:
+        """문단 컬렉션이 있는지 (최초 1회 확인 후 캐시, 실패하면 대기 시간 동안 False)"""
+        if not PASSAGES_ENABLED:
+            return False
+        if self._passages is None:
+            if self._qdrant_unavailable():
+                return False
+            try:
+                self._passages = await self.qdrant.collection_exists(PASSAGE_COLLECTION)
+            except Exception as e:
+                logger.warning(f"문단 컬렉션 확인 실패: {e}")
+                self._mark_qdrant_failure()
+                return False
+            if not self._passages:
+                logger.warning(f"문단 컬렉션 {PASSAGE_COLLECTION} 없음 — 원본 앞부분을 컨텍스트로 사용")
+        return self._passages
+
+    async def _search_passages(self, vector: list[float] | None,
+                               bookmarks: list[dict]) -> dict[str, list[str]]:
+        """선택된 책갈피별로 질문과 가장 가까운 문단 → {bookmark_id: [문단(본문 순서)]}"""
+        ids = [bm.get("bookmark_id", "") for bm in bookmarks if bm.get("bookmark_id")]
+        if vector is None or not ids or not await self._passages_enabled():
+            return {}
 
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with stage_timer("passages"):
+                response = await self.qdrant.query_points_groups(
+                    collection_name=PASSAGE_COLLECTION,
+                    query=vector,
+                    group_by="bookmark_id",
+                    group_size=PASSAGES_PER_BOOKMARK,
+                    limit=len(ids),
+                    query_filter=Filter(
+                        must=[FieldCondition(key="bookmark_id", match=MatchAny(any=ids))]
+                    ),
+                    search_params=search_params(),
+                    with_payload=["index", "text"]
+                )
         except Exception as e:
-            logger.error(f"원본 로드 실패 {filepath}: {e}")
+            logger.warning(f"문단 검색 실패 — 원본 앞부분 사용: {e}")
+            self._passages = None
+            self._mark_qdrant_failure()
             return {}
 
-    def _build_context(self, bookmarks: list[dict]) -> dict:
+        found = {}
+        for group in response.groups:
+            hits = sorted(group.hits, key=lambda hit: hit.payload.get("index", 0))
+            found[str(group.id)] = [hit.payload.get("text", "") for hit in hits]
+        return found
+
+    async def _load_originals(self, bookmarks: list[dict]) -> list[dict]:
+        # 원본 JSON 로드는 디스크 I/O → 스레드에서 병렬 로드
+        with stage_timer("originals"):
+            return await asyncio.gather(*[
+                asyncio.to_thread(self._load_original_data, bm.get("content_path", ""))
+                for bm in bookmarks
+            ])
+
+    async def _build_context(self, bookmarks: list[dict], vector: list[float] = None) -> dict:
         """
         GPT에 전달할 컨텍스트 구성.
+        질문 벡터가 있고 문단 인덱스가 있으면 책갈피마다 관련 문단만,
+        없으면 원본 본문 앞부분을 사용.
         반환: {"text": str, "images": list[dict]}
         """
+        originals, passages = await asyncio.gather(
+            self._load_originals(bookmarks),
+            self._search_passages(vector, bookmarks)
+        )
+
         context_parts = []
         all_images = []
         max_images_per_post = 3
         max_total_images = int(os.getenv("IMAGE_MAX_FOR_ANSWER", "6"))
 
-        for i, bm in enumerate(bookmarks, 1):
-            # 원본 전체 데이터 로드
-            original_data = self._load_original_data(bm.get("content_path", ""))
-            content = original_data.get("content", "") if original_data else ""
+        for i, (bm, original_data) in enumerate(zip(bookmarks, originals), 1):
+            relevant = passages.get(bm.get("bookmark_id", ""))
+            if relevant:
+                content = "\n...\n".join(relevant)
+            else:
+                content = original_data.get("content", "") if original_data else ""
 
             # 원본 없으면 책갈피 summary로 대체
             if not content:
@@ -175,9 +471,9 @@ class Retriever:
             "images": all_images
         }
 
-    def _generate_answer(self, question: str, context_text: str,
-                          images: list[dict] = None) -> str:
-        """GPT-4o-mini로 최종 답변 생성 (이미지 있으면 Vision API 사용)"""
+    async def _prepare_messages(self, question: str, context_text: str,
+                                images: list[dict] = None) -> tuple[list[dict], bool]:
+        """GPT 메시지 구성 → (messages, 이미지 포함 여부)"""
         system = SYSTEM_PROMPT.format(max_length=MAX_ANSWER_LENGTH)
 
         user_prompt = f"""참고 게시글:
@@ -189,7 +485,11 @@ class Retriever:
         # 이미지 base64 변환
         images_b64 = []
         if images and ImageHandler.is_enabled():
-            images_b64 = ImageHandler.load_images_as_base64(images)
+            with stage_timer("images"):
+                images_b64 = await asyncio.to_thread(
+                    ImageHandler.load_images_as_base64, images,
+                    detail=ImageHandler.IMAGE_VISION_DETAIL_ANSWER
+                )
 
         if images_b64:
             user_content = ImageHandler.build_vision_messages(
@@ -199,28 +499,77 @@ class Retriever:
         else:
             user_content = user_prompt
 
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user_content}
+        ]
+        return messages, bool(images_b64)
+
+    async def _generate_answer(self, question: str, context_text: str,
+                               images: list[dict] = None) -> str:
+        """GPT-4o-mini로 최종 답변 생성 (이미지 있으면 Vision API 사용)"""
+        messages, has_images = await self._prepare_messages(question, context_text, images)
+
         try:
-            response = self.openai.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user_content}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            return response.choices[0].message.content.strip()
+            with stage_timer("generation"):
+                answer = await self.llm.acomplete(messages, temperature=0.3, max_tokens=500)
+            ANSWER_MODES.labels("vision" if has_images else "text").inc()
+            return answer
         except Exception as e:
             # Vision 실패 시 텍스트만으로 재시도
-            if images_b64:
+            if has_images:
                 logger.warning(f"Vision 답변 생성 실패, 텍스트만으로 재시도: {e}")
-                return self._generate_answer(question, context_text, images=None)
+                FALLBACKS.labels("vision_to_text").inc()
+                return await self._generate_answer(question, context_text, images=None)
             logger.error(f"GPT 답변 생성 실패: {e}")
-            return "답변 생성 중 오류가 발생했습니다."
+            ANSWER_MODES.labels("error").inc()
+            return ANSWER_ERROR_MESSAGE
+
+    async def _stream_answer(self, question: str, context_text: str,
+                             images: list[dict] = None) -> AsyncIterator[str]:
+        """_generate_answer의 스트리밍 버전: 생성되는 토큰을 순서대로 yield"""
+        messages, has_images = await self._prepare_messages(question, context_text, images)
+
+        start = time.perf_counter()
+        try:
+            tokens = await self.llm.astream(messages, temperature=0.3, max_tokens=500)
+        except Exception as e:
+            # 스트림 시작 전 Vision 실패 → 텍스트만으로 재시도 (중간 실패는 호출자에서 처리)
+            if not has_images:
+                ANSWER_MODES.labels("error").inc()
+                raise
+            logger.warning(f"Vision 스트리밍 실패, 텍스트만으로 재시도: {e}")
+            FALLBACKS.labels("vision_to_text").inc()
+            async for token in self._stream_answer(question, context_text, images=None):
+                yield token
+            return
+
+        first = True
+        async for token in tokens:
+            if first:
+                observe_stage("first_token", time.perf_counter() - start)
+                first = False
+            yield token
+        observe_stage("generation", time.perf_counter() - start)
+        ANSWER_MODES.labels("vision" if has_images else "text").inc()
+
+    async def _collect_stream(self, question: str, context_text: str,
+                              images: list[dict], emit) -> str:
+        """_stream_answer 토큰을 emit으로 넘기면서 모아 최종 답변 반환 (실패하면 오류 안내 문구)"""
+        parts = []
+        try:
+            async for token in self._stream_answer(question, context_text, images):
+                parts.append(token)
+                emit(("token", {"text": token}))
+        except Exception as e:
+            logger.error(f"GPT 답변 스트리밍 실패: {e}")
+            emit(("_error", str(e)))
+            return ANSWER_ERROR_MESSAGE
+        return "".join(parts).strip()
 
     @staticmethod
     def _get_confidence(top_score: float) -> str:
-        """유사도 점수 → 신뢰도 등급 (키워드 부스트 반영)"""
+        """유사도 점수 → 신뢰도 등급 (어휘 일치도 가산 반영)"""
         if top_score >= 0.50:
             return "high"
         elif top_score >= 0.38:
@@ -230,46 +579,235 @@ class Retriever:
         else:
             return "not_found"
 
-    def search(self, question: str, source_filter: str = None) -> dict:
+    async def _lookup_caches(self, question: str,
+                             source_filter: str = None) -> tuple[tuple, list[float] | None, dict | None]:
+        """답변 캐시 → 의미 캐시 순으로 조회 → (답변 캐시 키, 질문 벡터, 캐시된 결과)"""
+        cache_key = (normalize_query(question), source_filter or "", get_corpus_version())
+        cached = self.answer_cache.get(cache_key)
+        CACHE_LOOKUPS.labels("answer", "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            return cache_key, None, cached
+
+        vector = await self._get_embedding(question)
+        if self.semantic_cache:
+            cached = self.semantic_cache.lookup(vector, source_filter)
+            CACHE_LOOKUPS.labels("semantic", "miss" if cached is None else "hit").inc()
+            if cached is not None:
+                self.answer_cache.set(cache_key, cached)
+                return cache_key, vector, cached
+
+        return cache_key, vector, None
+
+    def _store_caches(self, cache_key: tuple, vector: list[float], source_filter: str,
+                      result: dict, cited_ids: list[str]):
+        """생성된 결과를 답변/의미 캐시에 저장 (오류/요약 대체 답변은 저장하지 않음)"""
+        if result["answer"] == ANSWER_ERROR_MESSAGE or result.get("degraded"):
+            return
+        self.answer_cache.set(cache_key, result)
+        if self.semantic_cache and result["confidence"] != "not_found":
+            self.semantic_cache.add(vector, source_filter, result, cited_ids)
+
+    async def search(self, question: str, source_filter: str = None,
+                     deadline_seconds: float = None) -> dict:
         """
         메인 검색 메서드 (2단계 RAG)
+        같은 코퍼스 버전에서 이미 답한 질문은 답변 캐시에서 반환,
+        표현만 다른 비슷한 질문은 의미 캐시에서 반환,
+        같은 질문이 동시에 여러 번 들어오면 진행 중인 계산 결과를 공유.
+        deadline_seconds(기본 SEARCH_DEADLINE_SECONDS)는 임베딩/Qdrant/원본 로드/GPT 전 단계에 적용:
+        GPT 답변이 어려우면 출처 + 책갈피 요약을, 책갈피 검색부터 넘기면 지연 안내를 "degraded": true로 반환.
+        진행 중인 계산은 예산이 같은 요청끼리만 공유 (예산 없는 캐시 예열이나 더 긴 예산의 계산을 기다리지 않도록)
 
         반환:
         {
             "answer": "AI 답변",
             "sources": [{"title", "url", "board_name", "date", "score"}],
-            "confidence": "high|medium|low|not_found"
+            "confidence": "high|medium|low|not_found",
+            "degraded": true  (요약 대체 응답일 때만)
         }
         """
-        # 1단계: 책갈피 검색
-        bookmarks = self._search_bookmarks(question, source_filter)
+        deadline = make_deadline(deadline_seconds)
+        flight_key = (normalize_query(question), source_filter or "", deadline and deadline.seconds)
+        timings = start_stage_timings()
+        start = time.perf_counter()
+        result, path = await self.inflight.do(
+            flight_key, lambda: self._search_cached(question, source_filter, deadline)
+        )
+        elapsed = time.perf_counter() - start
+        SEARCH_SECONDS.labels("search", path).observe(elapsed)
+        self._log_query("search", question, source_filter, path, result, elapsed, timings)
+        return result
+
+    def _log_query(self, endpoint: str, question: str, source_filter: str, path: str,
+                   result: dict, elapsed: float, timings: dict, error: str = None):
+        """질의 로그 1건 기록 (큐에 넣기만 하므로 응답 지연 없음). error: 답변 생성 실패 사유"""
+        if self.query_log is None:
+            return
+        entry = {
+            "endpoint": endpoint,
+            "query": question,
+            "source_filter": source_filter,
+            "path": path,
+            "cache_hit": path != "computed",
+            "confidence": result.get("confidence"),
+            "degraded": bool(result.get("degraded")),
+            "latency_ms": round(elapsed * 1000, 1),
+            "stages_ms": {stage: round(sec * 1000, 1) for stage, sec in timings.items()}
+        }
+        if error:
+            entry["error"] = error
+        self.query_log.record(entry)
+
+    async def warm_popular(self, limit: int = WARM_TOP_N) -> dict:
+        """
+        질의 로그의 인기 질문으로 임베딩/답변/의미 캐시 미리 채우기.
+        수집 작업 뒤 코퍼스 버전이 바뀌어 답변 캐시가 비었을 때 스케줄러가 호출한다.
+        예열 질문은 질의 로그에 남기지 않는다 (인기 순위가 스스로 강화되지 않도록).
+        """
+        popular = await asyncio.to_thread(top_queries, limit)
+        stats = {"queries": len(popular), "computed": 0, "cached": 0, "failed": 0}
+        semaphore = asyncio.Semaphore(WARM_CONCURRENCY)
+
+        async def warm_one(item):
+            question, source_filter = item["query"], item["source_filter"]
+            flight_key = (normalize_query(question), source_filter or "", None)
+            async with semaphore:
+                try:
+                    _, path = await self.inflight.do(
+                        flight_key, lambda: self._search_cached(question, source_filter)
+                    )
+                except Exception as e:
+                    logger.warning(f"캐시 예열 실패 ({question}): {e}")
+                    stats["failed"] += 1
+                    return
+            stats["computed" if path == "computed" else "cached"] += 1
+
+        await asyncio.gather(*[warm_one(item) for item in popular])
+        logger.info(f"인기 질문 캐시 예열: {stats}")
+        return stats
+
+    async def _search_cached(self, question: str, source_filter: str = None,
+                             deadline: Deadline = None, emit=None) -> tuple[dict, str]:
+        """
+        캐시 조회 → 없으면 계산 후 캐시 저장 → (결과, 경로: answer_cache/semantic_cache/computed)
+        emit을 주면 계산 도중 ("sources", ...) / ("token", ...) 이벤트를 넘긴다 (스트리밍)
+        """
+        try:
+            cache_key, vector, cached = await self._within(
+                deadline, self._lookup_caches(question, source_filter)
+            )
+        except asyncio.TimeoutError:
+            return self._deadline_exceeded(deadline, "embedding"), "computed"
+        if cached is not None:
+            return cached, "answer_cache" if vector is None else "semantic_cache"
+
+        result, cited_ids = await self._search_uncached(question, source_filter, vector, deadline, emit)
+        self._store_caches(cache_key, vector, source_filter, result, cited_ids)
+        return result, "computed"
+
+    @staticmethod
+    async def _within(deadline: Deadline | None, awaitable):
+        """deadline이 있으면 남은 시간 안에서만 기다림 (넘기면 asyncio.TimeoutError)"""
+        if deadline is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+
+    @staticmethod
+    def _deadline_exceeded(deadline: Deadline, stage: str) -> dict:
+        """책갈피를 찾기 전에 지연 예산을 다 쓴 경우의 응답 (출처 없음)"""
+        logger.warning(f"지연 예산 초과 ({stage}, {deadline.seconds:.0f}초 예산) — 지연 안내 응답")
+        FALLBACKS.labels("deadline_degraded").inc()
+        return {
+            "answer": DEADLINE_MESSAGE,
+            "sources": [],
+            "confidence": "not_found",
+            "degraded": True
+        }
 
+    async def search_stream(self, question: str, source_filter: str = None,
+                            deadline_seconds: float = None) -> AsyncIterator[tuple[str, dict]]:
+        """
+        스트리밍 검색. 책갈피 검색이 끝나는 즉시 출처/신뢰도를 보내고,
+        답변은 GPT가 생성하는 대로 토큰 단위로 전달.
+        캐시/동일 요청 합치기/지연 예산은 search()와 같은 경로(_search_cached)를 쓴다:
+        같은 질문이 이미 계산 중이면 GPT를 다시 부르지 않고 그 결과를 한 번에 보낸다.
+
+        이벤트 순서:
+        ("sources", {"sources", "confidence"}) → ("token", {"text"}) * N → ("done", {"answer"})
+        지연 예산을 넘겨 요약 응답으로 바뀌면 done에 "degraded": true (answer가 최종 본문)
+        생성 도중 실패하면 마지막 이벤트는 ("error", {"message"})
+        """
+        deadline = make_deadline(deadline_seconds)
+        flight_key = (normalize_query(question), source_filter or "", deadline and deadline.seconds)
+        timings = start_stage_timings()
+        start = time.perf_counter()
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def compute():
+            try:
+                return await self._search_cached(question, source_filter, deadline, events.put_nowait)
+            finally:
+                events.put_nowait(None)
+
+        task, leader = self.inflight.start(flight_key, compute)
+
+        # 계산을 시작한 요청만 이벤트를 실시간으로 전달 (합류한 요청은 완료 결과를 한 번에)
+        streamed, error = set(), None
+        if leader:
+            while (event := await events.get()) is not None:
+                kind, data = event
+                if kind == "_error":
+                    error = data
+                    continue
+                streamed.add(kind)
+                yield kind, data
+
+        result, path = await asyncio.shield(task)
+        elapsed = time.perf_counter() - start
+        SEARCH_SECONDS.labels("stream", path).observe(elapsed)
+        self._log_query("stream", question, source_filter, path, result, elapsed, timings, error=error)
+
+        if "sources" not in streamed:
+            yield "sources", {"sources": result["sources"], "confidence": result["confidence"]}
+        if result["answer"] == ANSWER_ERROR_MESSAGE:
+            yield "error", {"message": ANSWER_ERROR_MESSAGE}
+            return
+        if "token" not in streamed:
+            yield "token", {"text": result["answer"]}
+        done = {"answer": result["answer"]}
+        if result.get("degraded"):
+            done["degraded"] = True
+        yield "done", done
+
+    async def _retrieve(self, question: str, source_filter: str,
+                        vector: list[float]) -> tuple[list[dict], str]:
+        """1단계 검색 + 컨텍스트로 쓸 책갈피 선별 → (context_bms, confidence)"""
+        bookmarks = await self._search_bookmarks(question, source_filter, vector)
+        return self._select_context(bookmarks)
+
+    def _select_context(self, bookmarks: list[dict]) -> tuple[list[dict], str]:
+        """검색 결과 중 답변 컨텍스트로 쓸 책갈피 선별 → (context_bms, confidence)"""
         if not bookmarks:
-            return {
-                "answer": "관련 내용을 찾지 못했습니다.",
-                "sources": [],
-                "confidence": "not_found"
-            }
+            ANSWERS.labels("not_found").inc()
+            return [], "not_found"
 
         top_score = bookmarks[0].get("score", 0)
         confidence = self._get_confidence(top_score)
+        ANSWERS.labels(confidence).inc()
 
         # not_found는 답변 생성 생략
         if confidence == "not_found":
-            return {
-                "answer": "관련 내용을 찾지 못했습니다.",
-                "sources": [],
-                "confidence": "not_found"
-            }
+            return [], "not_found"
 
-        # 2단계: 관련성 높은 게시글만 GPT 컨텍스트로 사용
+        # 관련성 높은 게시글만 GPT 컨텍스트로 사용
         # 상위 3개 중 1위 대비 점수가 50% 이상인 것만 포함
-        top = bookmarks[0].get("score", 0)
-        context_bms = [bm for bm in bookmarks[:3] if bm.get("score", 0) >= top * 0.5]
-        context = self._build_context(context_bms)
-        answer = self._generate_answer(question, context["text"], context["images"])
+        context_bms = [bm for bm in bookmarks[:3] if bm.get("score", 0) >= top_score * 0.5]
+        return context_bms, confidence
 
-        sources = [
+    @staticmethod
+    def _format_sources(context_bms: list[dict]) -> list[dict]:
+        """응답용 출처 목록"""
+        return [
             {
                 "title": bm.get("title", ""),
                 "url": bm.get("url", ""),
@@ -280,8 +818,172 @@ class Retriever:
             for bm in context_bms
         ]
 
+    @staticmethod
+    def _not_found_result() -> dict:
+        return {
+            "answer": NOT_FOUND_MESSAGE,
+            "sources": [],
+            "confidence": "not_found"
+        }
+
+    @staticmethod
+    def _degraded_result(context_bms: list[dict], confidence: str) -> dict:
+        """지연 예산 초과 시 응답: 출처 + 책갈피 요약 (GPT 답변 없음)"""
+        lines = [DEGRADED_MESSAGE, ""]
+        for i, bm in enumerate(context_bms, 1):
+            lines.append(f"{i}. {bm.get('title', '')}: {bm.get('summary', '')}")
+        return {
+            "answer": "\n".join(lines),
+            "sources": Retriever._format_sources(context_bms),
+            "confidence": confidence,
+            "degraded": True
+        }
+
+    async def _search_uncached(self, question: str, source_filter: str, vector: list[float],
+                               deadline: Deadline = None, emit=None) -> tuple[dict, list[str]]:
+        """캐시를 거치지 않는 실제 2단계 RAG 수행 → (결과, 인용 책갈피 ID 목록)"""
+        # 1단계: 책갈피 검색
+        try:
+            context_bms, confidence = await self._within(
+                deadline, self._retrieve(question, source_filter, vector)
+            )
+        except asyncio.TimeoutError:
+            return self._deadline_exceeded(deadline, "qdrant"), []
+        if emit:
+            emit(("sources", {"sources": self._format_sources(context_bms), "confidence": confidence}))
+        return await self._answer(question, context_bms, confidence, vector, deadline, emit)
+
+    async def _answer(self, question: str, context_bms: list[dict], confidence: str,
+                      vector: list[float] = None, deadline: Deadline = None,
+                      emit=None) -> tuple[dict, list[str]]:
+        """
+        선별된 책갈피로 2단계(원본 로드 → 답변 생성) 수행 → (결과, 인용 책갈피 ID 목록)
+        deadline이 있으면 남은 시간 안에서만 원본 로드/GPT 호출 (모자라거나 넘기면 요약 응답)
+        emit을 주면 GPT 답변을 스트리밍으로 받아 토큰마다 ("token", {"text"}) 이벤트로 넘긴다
+        """
+        if not context_bms:
+            return self._not_found_result(), []
+
+        # 2단계: 원본 로드 → 답변 생성
+        try:
+            context = await self._within(deadline, self._build_context(context_bms, vector))
+        except asyncio.TimeoutError:
+            logger.warning(f"원본 로드 시간 초과 ({deadline.seconds:.0f}초 예산) — 요약 응답")
+            FALLBACKS.labels("deadline_degraded").inc()
+            return self._degraded_result(context_bms, confidence), []
+        images = context["images"]
+
+        if deadline is not None:
+            if not deadline.can_generate():
+                logger.warning(f"지연 예산 부족 ({deadline.remaining():.1f}초) — 요약 응답")
+                FALLBACKS.labels("deadline_degraded").inc()
+                return self._degraded_result(context_bms, confidence), []
+            if images and not deadline.can_use_vision():
+                FALLBACKS.labels("deadline_skip_vision").inc()
+                images = []
+
+        if emit:
+            generation = self._collect_stream(question, context["text"], images, emit)
+        else:
+            generation = self._generate_answer(question, context["text"], images)
+        try:
+            answer = await self._within(deadline, generation)
+        except asyncio.TimeoutError:
+            logger.warning(f"답변 생성 시간 초과 ({deadline.seconds:.0f}초 예산) — 요약 응답")
+            FALLBACKS.labels("deadline_degraded").inc()
+            return self._degraded_result(context_bms, confidence), []
+
         return {
             "answer": answer,
-            "sources": sources,
+            "sources": self._format_sources(context_bms),
             "confidence": confidence
+        }, [bm.get("bookmark_id", "") for bm in context_bms]
+
+    async def search_batch(self, questions: list[str], source_filter: str = None) -> list[dict]:
+        """
+        여러 질문 일괄 검색 (평가/캐시 예열용). 결과는 입력 순서대로 반환.
+        임베딩은 embeddings.create 1회, Qdrant 검색은 query_batch_points 1회로 묶고,
+        답변 생성은 SEARCH_BATCH_CONCURRENCY개까지 동시에 진행.
+        """
+        results: list[dict | None] = [None] * len(questions)
+
+        # 1. 답변 캐시 (같은 질문이 여러 번 있으면 한 번만 계산)
+        pending: dict[tuple, list[int]] = {}
+        for i, question in enumerate(questions):
+            cache_key = (normalize_query(question), source_filter or "", get_corpus_version())
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(cache_key, []).append(i)
+
+        if pending:
+            keys = list(pending)
+            texts = [questions[pending[key][0]] for key in keys]
+            vectors = await self._get_embeddings(texts)
+
+            # 2. 의미 캐시
+            to_search = []
+            for key, text, vector in zip(keys, texts, vectors):
+                cached = self.semantic_cache.lookup(vector, source_filter) if self.semantic_cache else None
+                if cached is not None:
+                    self.answer_cache.set(key, cached)
+                    for i in pending[key]:
+                        results[i] = cached
+                else:
+                    to_search.append((key, text, vector))
+
+            # 3. Qdrant 배치 검색 → 4. 답변 동시 생성
+            if to_search:
+                found = await self._search_bookmarks_batch(
+                    [(text, source_filter, vector) for _, text, vector in to_search]
+                )
+                semaphore = asyncio.Semaphore(SEARCH_BATCH_CONCURRENCY)
+
+                async def answer_one(key, text, vector, bookmarks):
+                    async with semaphore:
+                        context_bms, confidence = self._select_context(bookmarks)
+                        result, cited_ids = await self._answer(text, context_bms, confidence, vector)
+                    self._store_caches(key, vector, source_filter, result, cited_ids)
+                    for i in pending[key]:
+                        results[i] = result
+
+                await asyncio.gather(*[
+                    answer_one(key, text, vector, bookmarks)
+                    for (key, text, vector), bookmarks in zip(to_search, found)
+                ])
+
+        return results
+
+    def cache_stats(self) -> dict:
+        """검색 경로 캐시 통계"""
+        return {
+            "embedding": self.embedding_cache.stats(),
+            "answer": self.answer_cache.stats(),
+            "semantic": self.semantic_cache.stats() if self.semantic_cache else {},
+            "original": self.original_cache.stats(),
+            "singleflight": self.inflight.stats(),
+            "local_index": self.local_index.stats() if self.local_index else {},
+            "query_log": self.query_log.stats() if self.query_log else {}
         }
+
+    def search_sync(self, question: str, source_filter: str = None) -> dict:
+        """동기 검색 (CLI용). 이벤트 루프가 없는 곳에서만 호출"""
+        async def run():
+            try:
+                return await self.search(question, source_filter)
+            finally:
+                await self.close()
+
+        return asyncio.run(run())
+
+    async def close(self):
+        """async 클라이언트 연결 정리"""
+        if self._local_sync_task and not self._local_sync_task.done():
+            self._local_sync_task.cancel()
+        if self.query_log:
+            await asyncio.to_thread(self.query_log.close)
+        await asyncio.to_thread(self.embedding_cache.close)
+        await self.embedder.aclose()
+        await self.llm.aclose()
+        await self.qdrant.close()
@@ -0,0 +1,50 @@
+"""
+동일 요청 합치기 (single-flight)
+같은 키의 계산이 진행 중이면 새로 시작하지 않고 진행 중인 결과를 함께 기다린다.
+단톡방에서 여러 명이 같은 질문을 몇 초 안에 보낼 때 임베딩/Qdrant/GPT 호출을 1회로 줄인다.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    def __init__(self):
+        self.started = 0  # 실제로 계산을 시작한 횟수
+        self.shared = 0  # 진행 중인 계산에 합류한 횟수
+        self._inflight: dict = {}
+
+    def start(self, key, func: Callable[[], Awaitable]) -> tuple[asyncio.Future, bool]:
+        """
+        key로 진행 중인 계산이 있으면 (그 Task, False), 없으면 func()를 시작해 (새 Task, True).
+        기다리지 않고 바로 반환 (스트리밍처럼 계산 도중 이벤트를 따로 받는 호출용)
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            return task, False
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        self.started += 1
+        return task, True
+
+    async def do(self, key, func: Callable[[], Awaitable]):
+        """key로 진행 중인 계산이 있으면 그 결과를, 없으면 func()를 실행한 결과를 반환"""
+        task, _ = self.start(key, func)
+        # 요청 하나가 끊겨도(클라이언트 종료 등) 함께 기다리는 요청의 계산은 계속되도록 shield
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 아무도 기다리지 않는 상태에서 실패한 경우 "exception was never retrieved" 경고 방지
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "started": self.started,
+            "shared": self.shared
+        }
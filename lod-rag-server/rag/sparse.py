@@ -0,0 +1,85 @@
+"""
+책갈피 어휘(sparse) 인덱스용 인코더
+제목/키워드/요약을 글자 n-gram으로 쪼개 Qdrant sparse 벡터로 저장한다.
+띄어쓰기를 지운 뒤 n-gram을 만들기 때문에 "진정한 강자" ↔ "진정한강자"가 같은 토큰이 된다.
+IDF는 Qdrant(Modifier.IDF)가 컬렉션 통계로 계산.
+"""
+
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+from qdrant_client.models import SparseVector
+
+SPARSE_VECTOR_NAME = "text"
+NGRAM_SIZES = (2, 3)
+
+# BM25 TF 포화 상수 (문서 길이 정규화는 생략 — 책갈피 텍스트 길이가 비슷함)
+BM25_K1 = 1.2
+
+_NON_WORD = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def _compact(text: str) -> str:
+    """소문자 + 공백/기호 제거"""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return _NON_WORD.sub("", text)
+
+
+def char_ngrams(text: str) -> list[str]:
+    """띄어쓰기 무시 글자 n-gram (너무 짧으면 그대로 1개 토큰)"""
+    compact = _compact(text)
+    if not compact:
+        return []
+    if len(compact) < min(NGRAM_SIZES):
+        return [compact]
+    grams = []
+    for n in NGRAM_SIZES:
+        grams.extend(compact[i:i + n] for i in range(len(compact) - n + 1))
+    return grams
+
+
+def _token_index(token: str) -> int:
+    # 프로세스마다 달라지는 hash() 대신 crc32 → 인덱스가 재시작 후에도 동일
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _to_sparse(counts: Counter, weight) -> SparseVector:
+    merged: dict[int, float] = {}
+    for token, tf in counts.items():
+        idx = _token_index(token)
+        merged[idx] = merged.get(idx, 0.0) + weight(tf)
+    indices = sorted(merged)
+    return SparseVector(indices=indices, values=[merged[i] for i in indices])
+
+
+def build_sparse_segments(bookmark: dict) -> list[str]:
+    """어휘 인덱스에 넣을 필드 (필드 경계를 넘는 n-gram이 생기지 않도록 따로 분리)"""
+    segments = [bookmark.get("title", "")]
+    segments.extend(bookmark.get("keywords", []))
+    segments.append(bookmark.get("summary", ""))
+    return [s for s in segments if s]
+
+
+def encode_document(bookmark: dict) -> SparseVector:
+    """책갈피 → 문서 sparse 벡터 (BM25 TF 포화 가중치)"""
+    counts = Counter()
+    for segment in build_sparse_segments(bookmark):
+        counts.update(char_ngrams(segment))
+    return _to_sparse(counts, lambda tf: tf * (BM25_K1 + 1) / (tf + BM25_K1))
+
+
+def encode_query(text: str) -> SparseVector:
+    """질문 → 쿼리 sparse 벡터 (등장 여부만, 가중치 1)"""
+    return _to_sparse(Counter(set(char_ngrams(text))), lambda tf: 1.0)
+
+
+def ngram_coverage(query_grams: set[str], texts: list[str]) -> float:
+    """질문 n-gram 중 주어진 텍스트들에 등장하는 비율 (0~1)"""
+    if not query_grams:
+        return 0.0
+    doc_grams = set()
+    for text in texts:
+        doc_grams.update(char_ngrams(text))
+    return len(query_grams & doc_grams) / len(query_grams)
@@ -0,0 +1,195 @@
+"""
+내용 주소 기반 임베딩 저장소 (content-addressed)
+키: sha256("{모델}:{sha256(임베딩 텍스트)}") → 같은 텍스트를 같은 모델로 다시 임베딩할 때 API를 호출하지 않는다.
+Qdrant 볼륨이 사라지거나 컬렉션을 새로 만들어도 벡터는 여기서 다시 읽어 올리면 되므로
+재구축 속도가 API 레이트 리밋이 아니라 디스크 속도로 정해진다.
+
+모델마다 파일 3개 (VECTOR_STORE_PATH 아래):
+- {모델}.f32  : float32 행렬 (행 단위 append, np.memmap으로 읽음)
+- {모델}.keys : 32바이트 키를 행 순서대로 이어 붙인 오프셋 인덱스
+- {모델}.json : 차원 수
+벡터를 먼저 쓰고 키를 나중에 쓰므로 중간에 죽어도 키가 있는 행은 항상 완전하다.
+여러 프로세스(서버, CLI embed-all)가 함께 쓰므로 append는 flock으로 직렬화.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+from loguru import logger
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows 로컬 실행 (쿠키 스크립트 등)
+    fcntl = None
+
+load_dotenv()
+
+VECTOR_STORE_ENABLED = os.getenv("VECTOR_STORE_ENABLED", "true").lower() == "true"
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./data/vectors")
+
+KEY_BYTES = 32
+
+
+def text_hash(text: str) -> str:
+    """임베딩 텍스트 지문 (포인트 페이로드 embed_hash와 같은 값)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class VectorStore:
+    def __init__(self, model: str, path: str = VECTOR_STORE_PATH):
+        self.model = model
+        base = os.path.join(path, re.sub(r"[^A-Za-z0-9._-]", "_", model))
+        self.vectors_path = base + ".f32"
+        self.keys_path = base + ".keys"
+        self.meta_path = base + ".json"
+        self.dim: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self._index: dict[bytes, int] = {}  # 키 → 행 번호
+        self._rows = 0
+        self._matrix: np.memmap | None = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load_meta()
+        self._refresh()
+
+    def key(self, embed_hash: str) -> bytes:
+        return hashlib.sha256(f"{self.model}:{embed_hash}".encode("utf-8")).digest()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = int(json.load(f)["dim"])
+        except (FileNotFoundError, ValueError, KeyError):
+            self.dim = None
+
+    def _complete_rows(self) -> int:
+        """키와 벡터가 모두 기록된 행 수"""
+        try:
+            keys = os.path.getsize(self.keys_path) // KEY_BYTES
+        except FileNotFoundError:
+            return 0
+        if not self.dim:
+            return 0
+        try:
+            vectors = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        except FileNotFoundError:
+            return 0
+        return min(keys, vectors)
+
+    def _refresh(self):
+        """다른 프로세스가 추가한 행까지 인덱스에 반영"""
+        if self.dim is None:
+            self._load_meta()
+        rows = self._complete_rows()
+        if rows <= self._rows:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._rows * KEY_BYTES)
+            data = f.read((rows - self._rows) * KEY_BYTES)
+        for i in range(rows - self._rows):
+            self._index.setdefault(data[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._rows + i)
+        self._rows = rows
+        self._matrix = None  # 다음 조회 때 늘어난 크기로 다시 매핑
+
+    def _mapped(self) -> np.memmap:
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim)
+            )
+        return self._matrix
+
+    def get_many(self, embed_hashes: list[str]) -> list[list[float] | None]:
+        """지문 목록 → 저장된 벡터 (없으면 None)"""
+        with self._lock:
+            self._refresh()
+            rows = [self._index.get(self.key(h)) for h in embed_hashes]
+            found = [r for r in rows if r is not None]
+            matrix = self._mapped() if found else None
+            vectors = [matrix[r].tolist() if r is not None else None for r in rows]
+        self.hits += len(found)
+        self.misses += len(rows) - len(found)
+        return vectors
+
+    def put_many(self, embed_hashes: list[str], vectors: list[list[float]]) -> int:
+        """새 벡터 추가 (이미 있는 키는 건너뜀) → 추가한 행 수"""
+        if not embed_hashes:
+            return 0
+        matrix = np.asarray(vectors, dtype=np.float32)
+        dim = matrix.shape[1]
+
+        with self._lock, open(self.keys_path + ".lock", "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self.dim is None:
+                    self.dim = dim
+                    with open(self.meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model, "dim": dim}, f)
+                elif dim != self.dim:
+                    raise ValueError(f"벡터 차원 불일치: {dim} != {self.dim} ({self.model})")
+
+                keys, rows, seen = [], [], set()
+                for i, embed_hash in enumerate(embed_hashes):
+                    key = self.key(embed_hash)
+                    if key in self._index or key in seen:
+                        continue
+                    seen.add(key)
+                    keys.append(key)
+                    rows.append(i)
+                if not keys:
+                    return 0
+
+                # 이전에 중간에 끊긴 기록이 있으면 완전한 행까지만 남기고 이어 쓰기
+                self._truncate(self.vectors_path, self._rows * self.dim * 4)
+                self._truncate(self.keys_path, self._rows * KEY_BYTES)
+                with open(self.vectors_path, "ab") as f:
+                    f.write(matrix[rows].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.keys_path, "ab") as f:
+                    f.write(b"".join(keys))
+                self._refresh()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return len(keys)
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        try:
+            if os.path.getsize(path) > size:
+                os.truncate(path, size)
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model,
+            "vectors": self._rows,
+            "dim": self.dim,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+def open_vector_store(model: str) -> VectorStore | None:
+    """VECTOR_STORE_ENABLED면 모델별 저장소 열기 (실패하면 None → API만 사용)"""
+    if not VECTOR_STORE_ENABLED:
+        return None
+    try:
+        return VectorStore(model)
+    except Exception as e:
+        logger.warning(f"임베딩 저장소 열기 실패, API만 사용: {VECTOR_STORE_PATH} - {e}")
+        return None
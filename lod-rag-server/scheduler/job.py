@@ -1,6 +1,7 @@
 """
 APScheduler 기반 자동 크롤링/책갈피/임베딩 스케줄러
-FastAPI lifespan에서 시작/정지
+FastAPI lifespan에서 시작/정지.
+수집 작업이 끝나면 질의 로그의 인기 질문으로 검색 캐시를 다시 채운다.
 """
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -12,40 +13,70 @@ from crawler.lod_crawler import LodCrawler
 from crawler.naver_cafe_crawler import NaverCafeCrawler, CookieExpiredException
 from rag.bookmark_creator import BookmarkCreator
 from rag.embedder import Embedder
+from scheduler.pipeline import PipelineRun, get_pipeline_lock, shutdown_executor
 from utils.notify import send_kakao_notify, CRAWL_COMPLETE_MSG, COOKIE_EXPIRED_MSG
 
 scheduler = AsyncIOScheduler()
+_retriever = None  # start_scheduler()에서 받은 서버 Retriever (캐시 예열용)
+
+
+def _create_bookmarks(new_only: bool = False) -> dict:
+    """책갈피 생성 단계 (GPT 호출 → 스레드 풀에서 실행)"""
+    creator = BookmarkCreator()
+    return creator.create_new() if new_only else creator.create_all()
+
+
+def _embed_bookmarks(new_only: bool = False) -> dict:
+    """임베딩 단계 (OpenAI + Qdrant 호출 → 스레드 풀에서 실행)"""
+    embedder = Embedder()
+    return embedder.process_new() if new_only else embedder.process_all()
+
+
+async def _crawl_cafe(run: PipelineRun, full: bool) -> dict:
+    """네이버 카페 크롤링 (Playwright async → 루프에서 실행)"""
+    cafe_stats = {"new": 0}
+    try:
+        cafe_crawler = NaverCafeCrawler()
+        if full:
+            coro = cafe_crawler.crawl_all_boards(pages_per_board=10)
+        else:
+            coro = cafe_crawler.crawl_new()
+        cafe_stats = await run.stage_async("카페 크롤링", coro)
+    except CookieExpiredException:
+        logger.warning("네이버 쿠키 만료 — 카페 크롤링 스킵")
+        await send_kakao_notify(COOKIE_EXPIRED_MSG)
+    except FileNotFoundError:
+        logger.warning("네이버 쿠키 파일 없음 — 카페 크롤링 스킵")
+    except Exception as e:
+        logger.error(f"카페 크롤링 실패: {e}")
+    return cafe_stats
+
+
+async def warm_popular_queries(run: PipelineRun):
+    """수집 후 인기 질문 상위 WARM_TOP_N개를 미리 검색해 임베딩/답변 캐시 채우기"""
+    if _retriever is None:
+        return
+    try:
+        await run.stage_async("캐시 예열", _retriever.warm_popular())
+    except Exception as e:
+        logger.error(f"캐시 예열 실패: {e}")
 
 
 async def hourly_job():
     """매 1시간: 신규 게시글 크롤링 + 책갈피 + 임베딩"""
     logger.info("=== 시간별 크롤링 시작 ===")
+    run = PipelineRun("시간별")
     try:
-        crawler = LodCrawler()
-        lod_stats = crawler.crawl_new()
-
-        # 네이버 카페 크롤링
-        cafe_stats = {"new": 0}
-        try:
-            cafe_crawler = NaverCafeCrawler()
-            cafe_stats = await cafe_crawler.crawl_new()
-        except CookieExpiredException:
-            logger.warning("네이버 쿠키 만료 — 카페 크롤링 스킵")
-            await send_kakao_notify(COOKIE_EXPIRED_MSG)
-        except FileNotFoundError:
-            logger.warning("네이버 쿠키 파일 없음 — 카페 크롤링 스킵")
-        except Exception as e:
-            logger.error(f"카페 크롤링 실패: {e}")
-
-        creator = BookmarkCreator()
-        bm_stats = creator.create_new()
-
-        embedder = Embedder()
-        embed_stats = embedder.process_new()
+        async with get_pipeline_lock():
+            lod_stats = await run.stage("LOD 크롤링", lambda: LodCrawler().crawl_new())
+            cafe_stats = await _crawl_cafe(run, full=False)
+            bm_stats = await run.stage("책갈피", _create_bookmarks, new_only=True)
+            embed_stats = await run.stage("임베딩", _embed_bookmarks, new_only=True)
+        await warm_popular_queries(run)
 
         logger.info(
             f"시간별 작업 완료: LOD {lod_stats['new']}건, 카페 {cafe_stats['new']}건, "
-            f"책갈피 {bm_stats['created']}건, 임베딩 {embed_stats['saved']}건"
+            f"책갈피 {bm_stats['created']}건, 임베딩 {embed_stats['saved']}건 — {run.summary()}"
         )
     except Exception as e:
         logger.error(f"시간별 작업 실패: {e}")
@@ -54,15 +85,15 @@ async def hourly_job():
 async def daily_job():
     """매일 03:00: 미처리분 전체 보정"""
     logger.info("=== 일일 보정 작업 시작 ===")
+    run = PipelineRun("일일")
     try:
-        creator = BookmarkCreator()
-        bm_stats = creator.create_all()
-
-        embedder = Embedder()
-        embed_stats = embedder.process_all()
+        async with get_pipeline_lock():
+            bm_stats = await run.stage("책갈피", _create_bookmarks)
+            embed_stats = await run.stage("임베딩", _embed_bookmarks)
+        await warm_popular_queries(run)
 
         logger.info(
-            f"일일 보정 완료: 책갈피 {bm_stats['created']}건, 임베딩 {embed_stats['saved']}건"
+            f"일일 보정 완료: 책갈피 {bm_stats['created']}건, 임베딩 {embed_stats['saved']}건 — {run.summary()}"
         )
     except Exception as e:
         logger.error(f"일일 보정 작업 실패: {e}")
@@ -71,28 +102,16 @@ async def daily_job():
 async def weekly_job():
     """매주 일요일 02:00: 전체 재크롤링"""
     logger.info("=== 주간 전체 크롤링 시작 ===")
+    run = PipelineRun("주간")
     try:
-        crawler = LodCrawler()
-        lod_stats = crawler.crawl_all(start_page=1, end_page=20)
-
-        # 네이버 카페 전체 크롤링
-        cafe_stats = {"new": 0}
-        try:
-            cafe_crawler = NaverCafeCrawler()
-            cafe_stats = await cafe_crawler.crawl_all_boards(pages_per_board=10)
-        except CookieExpiredException:
-            logger.warning("네이버 쿠키 만료 — 카페 크롤링 스킵")
-            await send_kakao_notify(COOKIE_EXPIRED_MSG)
-        except FileNotFoundError:
-            logger.warning("네이버 쿠키 파일 없음 — 카페 크롤링 스킵")
-        except Exception as e:
-            logger.error(f"카페 크롤링 실패: {e}")
-
-        creator = BookmarkCreator()
-        bm_stats = creator.create_all()
-
-        embedder = Embedder()
-        embed_stats = embedder.process_all()
+        async with get_pipeline_lock():
+            lod_stats = await run.stage(
+                "LOD 크롤링", lambda: LodCrawler().crawl_all(start_page=1, end_page=20)
+            )
+            cafe_stats = await _crawl_cafe(run, full=True)
+            bm_stats = await run.stage("책갈피", _create_bookmarks)
+            await run.stage("임베딩", _embed_bookmarks)
+        await warm_popular_queries(run)
 
         msg = CRAWL_COMPLETE_MSG.format(
             lod_count=lod_stats["new"],
@@ -101,13 +120,18 @@ async def weekly_job():
         )
         await send_kakao_notify(msg)
 
-        logger.info(f"주간 크롤링 완료: LOD {lod_stats['new']}건, 카페 {cafe_stats['new']}건")
+        logger.info(
+            f"주간 크롤링 완료: LOD {lod_stats['new']}건, 카페 {cafe_stats['new']}건 — {run.summary()}"
+        )
     except Exception as e:
         logger.error(f"주간 크롤링 실패: {e}")
 
 
-def start_scheduler():
-    """스케줄러 시작"""
+def start_scheduler(retriever=None):
+    """스케줄러 시작 (retriever를 주면 수집 작업 뒤 인기 질문 캐시 예열)"""
+    global _retriever
+    _retriever = retriever
+
     # 매 1시간
     scheduler.add_job(
         hourly_job,
@@ -144,3 +168,4 @@ def stop_scheduler():
     if scheduler.running:
         scheduler.shutdown(wait=False)
         logger.info("스케줄러 정지됨")
+    shutdown_executor()
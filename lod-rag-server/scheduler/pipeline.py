@@ -0,0 +1,110 @@
+"""
+파이프라인 작업 실행 계층
+크롤링/책갈피/임베딩처럼 블로킹되는 단계를 전용 스레드 풀에서 실행해
+FastAPI 이벤트 루프(/search, /health)가 멈추지 않도록 한다
+"""
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from utils.metrics import PIPELINE_FAILURES, PIPELINE_STAGE_SECONDS, record_stage_items
+
+load_dotenv()
+
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "2"))
+
+_executor: ThreadPoolExecutor | None = None
+_pipeline_lock: asyncio.Lock | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """파이프라인 전용 스레드 풀 (워커 수 상한: PIPELINE_MAX_WORKERS)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=PIPELINE_MAX_WORKERS,
+            thread_name_prefix="pipeline"
+        )
+    return _executor
+
+
+def get_pipeline_lock() -> asyncio.Lock:
+    """크롤링→책갈피→임베딩 작업이 동시에 두 개 돌지 않도록 하는 락"""
+    global _pipeline_lock
+    if _pipeline_lock is None:
+        _pipeline_lock = asyncio.Lock()
+    return _pipeline_lock
+
+
+async def run_blocking(func, *args, **kwargs):
+    """블로킹 함수를 파이프라인 스레드 풀에서 실행하고 결과 반환"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor():
+    """스레드 풀 정리 (실행 중인 단계는 끝날 때까지 기다리지 않음)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class PipelineRun:
+    """
+    작업 1회 실행 단위.
+    각 단계를 실행하면서 소요 시간을 기록하고, 끝나면 단계별 요약을 남긴다.
+    단계 소요 시간/처리 건수/실패는 Prometheus 메트릭으로도 기록.
+    """
+
+    def __init__(self, job_name: str):
+        self.job_name = job_name
+        self.timings: dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    async def stage(self, name: str, func, *args, **kwargs):
+        """블로킹 단계 → 스레드 풀에서 실행"""
+        start = time.perf_counter()
+        try:
+            result = await run_blocking(func, *args, **kwargs)
+        except Exception:
+            PIPELINE_FAILURES.labels(self.job_name, name).inc()
+            raise
+        finally:
+            self._record(name, start)
+        record_stage_items(name, result)
+        return result
+
+    async def stage_async(self, name: str, coro):
+        """이미 async인 단계 (Playwright 카페 크롤링 등) → 루프에서 그대로 실행, 시간만 기록"""
+        start = time.perf_counter()
+        try:
+            result = await coro
+        except Exception:
+            PIPELINE_FAILURES.labels(self.job_name, name).inc()
+            raise
+        finally:
+            self._record(name, start)
+        record_stage_items(name, result)
+        return result
+
+    def _record(self, name: str, start: float):
+        elapsed = time.perf_counter() - start
+        self.timings[name] = round(elapsed, 2)
+        PIPELINE_STAGE_SECONDS.labels(self.job_name, name).observe(elapsed)
+        logger.info(f"[{self.job_name}] {name} 단계 {elapsed:.1f}초")
+
+    @property
+    def total_seconds(self) -> float:
+        return round(time.perf_counter() - self._started, 2)
+
+    def summary(self) -> str:
+        """'크롤링 12.3초, 책갈피 40.1초 (총 52.4초)' 형태의 요약"""
+        parts = [f"{name} {sec:.1f}초" for name, sec in self.timings.items()]
+        return f"{', '.join(parts)} (총 {self.total_seconds:.1f}초)"
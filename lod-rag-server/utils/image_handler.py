@@ -3,10 +3,13 @@
 크롤러와 RAG 모듈이 공통으로 사용하는 이미지 처리 함수 모음
 """
 
+import io
 import os
 import re
 import base64
 import mimetypes
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 import httpx
@@ -14,6 +17,11 @@ import requests
 from loguru import logger
 from dotenv import load_dotenv
 
+try:
+    from PIL import Image
+except ImportError:  # Pillow 없으면 원본 그대로 base64 (축소본 생성 생략)
+    Image = None
+
 load_dotenv()
 
 # ─── 설정값 ───
@@ -27,6 +35,12 @@ IMAGE_MAX_FOR_ANSWER = int(os.getenv("IMAGE_MAX_FOR_ANSWER", "6"))
 IMAGE_VISION_DETAIL_BOOKMARK = os.getenv("IMAGE_VISION_DETAIL_BOOKMARK", "low")
 IMAGE_VISION_DETAIL_ANSWER = os.getenv("IMAGE_VISION_DETAIL_ANSWER", "auto")
 IMAGE_DOWNLOAD_TIMEOUT = int(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "15"))
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "85"))
+IMAGE_B64_CACHE_MB = int(os.getenv("IMAGE_B64_CACHE_MB", "64"))
+
+# Vision detail별 축소 기준 (OpenAI Vision 내부 리사이즈 규칙과 동일)
+# low: 512x512 안에 맞춤 / high·auto: 2048x2048 안에 맞춘 뒤 짧은 변 768
+DERIVATIVE_DIRNAME = ".vision"
 
 # 이모티콘/아이콘 등 제외 패턴
 EXCLUDE_URL_PATTERNS = re.compile(
@@ -36,6 +50,40 @@ EXCLUDE_URL_PATTERNS = re.compile(
 )
 
 
+class _Base64Cache:
+    """Vision용 base64 메모리 캐시 (바이트 상한 LRU)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict = OrderedDict()  # key → (mtime_ns, b64)
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, mtime_ns: int) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime_ns:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: tuple, mtime_ns: int, b64: str):
+        if len(b64) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old[1])
+            self._entries[key] = (mtime_ns, b64)
+            self.total_bytes += len(b64)
+            while self.total_bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+
+_b64_cache = _Base64Cache(IMAGE_B64_CACHE_MB * 1024 * 1024)
+
+
 class ImageHandler:
     """이미지 다운로드, 필터링, GPT Vision 연동 유틸리티"""
 
@@ -281,12 +329,89 @@ class ImageHandler:
             logger.warning(f"이미지 다운로드 실패 (playwright): {url} - {e}")
             return None
 
+    @staticmethod
+    def _target_size(width: int, height: int, detail: str) -> tuple[int, int]:
+        """Vision detail에 맞는 축소 크기 (확대는 하지 않음)"""
+        if detail == "low":
+            scale = min(1.0, 512 / max(width, height))
+        else:
+            scale = min(1.0, 2048 / max(width, height))
+            scale *= min(1.0, 768 / (min(width, height) * scale))
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    @staticmethod
+    def _derivative_path(local_path: str, detail: str) -> str:
+        """축소본 base64 저장 위치: images/{post_id}/.vision/{파일명}.{detail}.b64"""
+        directory, filename = os.path.split(local_path)
+        return os.path.join(directory, DERIVATIVE_DIRNAME, f"{filename}.{detail}.b64")
+
+    @staticmethod
+    def _build_derivative(local_path: str, detail: str) -> str:
+        """원본 → detail 해상도로 축소 + JPEG 재인코딩 → base64"""
+        with Image.open(local_path) as img:
+            img.seek(0)  # 움직이는 GIF는 첫 프레임만
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+
+            size = ImageHandler._target_size(img.width, img.height, detail)
+            if size != img.size:
+                img = img.resize(size, Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=IMAGE_DERIVATIVE_QUALITY, optimize=True)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    @staticmethod
+    def get_vision_base64(local_path: str, detail: str) -> dict:
+        """
+        Vision 요청용 base64 반환 (메모리 → 디스크 축소본 → 생성 순).
+        반환: {"base64": str, "mime_type": str}
+        Pillow가 없거나 변환 실패 시 원본을 그대로 인코딩.
+        """
+        mtime_ns = os.stat(local_path).st_mtime_ns
+        key = (local_path, detail)
+
+        cached = _b64_cache.get(key, mtime_ns)
+        if cached is not None:
+            return {"base64": cached, "mime_type": "image/jpeg"}
+
+        if Image is not None:
+            derivative_path = ImageHandler._derivative_path(local_path, detail)
+            try:
+                if os.path.exists(derivative_path) and os.stat(derivative_path).st_mtime_ns >= mtime_ns:
+                    with open(derivative_path, "r", encoding="ascii") as f:
+                        b64 = f.read()
+                else:
+                    b64 = ImageHandler._build_derivative(local_path, detail)
+                    os.makedirs(os.path.dirname(derivative_path), exist_ok=True)
+                    tmp_path = derivative_path + ".tmp"
+                    with open(tmp_path, "w", encoding="ascii") as f:
+                        f.write(b64)
+                    os.replace(tmp_path, derivative_path)
+                _b64_cache.set(key, mtime_ns, b64)
+                return {"base64": b64, "mime_type": "image/jpeg"}
+            except Exception as e:
+                logger.debug(f"이미지 축소본 생성 실패, 원본 사용: {local_path} - {e}")
+
+        with open(local_path, "rb") as f:
+            data = f.read()
+        return {
+            "base64": base64.b64encode(data).decode("utf-8"),
+            "mime_type": mimetypes.guess_type(local_path)[0] or "image/jpeg"
+        }
+
     @staticmethod
     def load_images_as_base64(
-        images: list[dict], max_count: int = IMAGE_MAX_FOR_ANSWER
+        images: list[dict], max_count: int = IMAGE_MAX_FOR_ANSWER,
+        detail: str = IMAGE_VISION_DETAIL_ANSWER
     ) -> list[dict]:
         """
-        로컬 이미지 파일을 base64로 변환.
+        로컬 이미지 → Vision detail에 맞춘 축소본 base64 (캐시 사용).
         입력: [{"local_path": str, ...}, ...]
         반환: [{"base64": str, "mime_type": str, "filename": str}, ...]
         """
@@ -306,15 +431,9 @@ class ImageHandler:
                 continue
 
             try:
-                with open(local_path, "rb") as f:
-                    data = f.read()
-
-                mime_type = mimetypes.guess_type(local_path)[0] or "image/jpeg"
-                b64 = base64.b64encode(data).decode("utf-8")
-
+                encoded = ImageHandler.get_vision_base64(local_path, detail)
                 results.append({
-                    "base64": b64,
-                    "mime_type": mime_type,
+                    **encoded,
                     "filename": img.get("filename", os.path.basename(local_path))
                 })
             except Exception as e:
@@ -322,6 +441,13 @@ class ImageHandler:
 
         return results
 
+    @staticmethod
+    def prepare_derivatives(images: list[dict], details: tuple[str, ...] = None):
+        """축소본 미리 생성 (책갈피 생성 단계에서 호출 → 답변 경로는 캐시만 읽음)"""
+        details = details or (IMAGE_VISION_DETAIL_BOOKMARK, IMAGE_VISION_DETAIL_ANSWER)
+        for detail in dict.fromkeys(details):
+            ImageHandler.load_images_as_base64(images, max_count=len(images), detail=detail)
+
     @staticmethod
     def build_vision_messages(
         text_content: str, images_b64: list[dict],
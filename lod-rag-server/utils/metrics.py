@@ -0,0 +1,119 @@
+"""
+Prometheus 메트릭 정의 (/metrics에서 텍스트 형식으로 노출)
+- 검색: 단계별 지연 히스토그램, 캐시 적중, 신뢰도, Vision/텍스트 답변, 대체 경로
+- 파이프라인: 단계별 소요 시간, 처리 건수(신규/스킵/실패), 실패 횟수
+- 모델: 제공자별 토큰 사용량, 레이트 리밋 대기/재시도
+검색 단계 시간은 stage_timer()로 재면 히스토그램과 함께 요청별 기록(질의 로그용)에도 남는다.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# 검색 단계: embedding, qdrant, local_index, originals, images, generation, first_token
+SEARCH_STAGE_SECONDS = Histogram(
+    "rag_search_stage_seconds", "검색 단계별 소요 시간",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+SEARCH_SECONDS = Histogram(
+    "rag_search_seconds", "검색 요청 전체 소요 시간 (path: answer_cache/semantic_cache/computed)",
+    ["endpoint", "path"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total", "캐시 조회 (result: hit/miss)",
+    ["cache", "result"]
+)
+ANSWERS = Counter(
+    "rag_answers_total", "생성된 답변 (confidence별)",
+    ["confidence"]
+)
+ANSWER_MODES = Counter(
+    "rag_answer_mode_total", "답변 생성 방식 (vision/text/error)",
+    ["mode"]
+)
+FALLBACKS = Counter(
+    "rag_fallbacks_total", "대체 경로 사용 (local_index/vision_to_text/qdrant_error/deadline_degraded/deadline_skip_vision)",
+    ["kind"]
+)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "rag_pipeline_stage_seconds", "파이프라인 단계별 소요 시간",
+    ["job", "stage"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+)
+PIPELINE_ITEMS = Counter(
+    "rag_pipeline_items_total", "파이프라인 단계 처리 건수 (result: new/created/saved/skipped/failed 등)",
+    ["stage", "result"]
+)
+PIPELINE_FAILURES = Counter(
+    "rag_pipeline_failures_total", "예외로 끝난 파이프라인 단계",
+    ["job", "stage"]
+)
+
+RATE_LIMIT_WAIT_SECONDS = Counter(
+    "rag_rate_limit_wait_seconds_total", "RPM/TPM 한도 때문에 요청 전에 기다린 시간",
+    ["model"]
+)
+RATE_LIMIT_RETRIES = Counter(
+    "rag_rate_limit_retries_total", "모델 요청 재시도 (reason: 429/error)",
+    ["model", "reason"]
+)
+
+MODEL_TOKENS = Counter(
+    "rag_model_tokens_total", "모델 토큰 사용량 (kind: prompt/completion)",
+    ["model", "kind"]
+)
+
+# 현재 검색 요청의 단계별 소요 시간 (start_stage_timings()로 시작, 자식 태스크에도 전파)
+_stage_timings: ContextVar[dict | None] = ContextVar("search_stage_timings", default=None)
+
+
+def start_stage_timings() -> dict:
+    """이 요청(태스크)에서 측정할 단계별 시간 dict를 새로 시작"""
+    timings: dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+def observe_stage(stage: str, seconds: float):
+    """검색 단계 소요 시간 기록 (히스토그램 + 현재 요청 기록)"""
+    SEARCH_STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """with stage_timer("qdrant"): ... 형태로 검색 단계 시간 측정"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_stage_items(stage: str, result):
+    """단계 결과 dict의 정수 값들을 처리 건수로 기록 ({"new": 3, "skipped": 10} 등)"""
+    if not isinstance(result, dict):
+        return
+    for key, value in result.items():
+        if isinstance(value, int) and not isinstance(value, bool) and key != "total" and value > 0:
+            PIPELINE_ITEMS.labels(stage, key).inc(value)
+
+
+def record_usage(model: str, usage):
+    """OpenAI 응답의 usage → 토큰 카운터"""
+    if usage is None:
+        return
+    MODEL_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    MODEL_TOKENS.labels(model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def render() -> tuple[bytes, str]:
+    """Prometheus 텍스트 형식 → (본문, Content-Type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,178 @@
+"""
+수집 현황 카운터 (/health, /ready, /stats)
+요청마다 데이터 디렉토리를 glob하거나 Qdrant에 count를 보내지 않도록 메모리 값만 응답한다.
+- 파일 수(원본 게시글/이미지가 있는 게시글/책갈피): 서버 시작 시 백그라운드로 한 번 세고,
+  크롤링·책갈피 생성·제외 때 record_post()/record_bookmark()로 증감.
+  CLI 등 다른 프로세스에서 생긴 변경분은 STATS_RESCAN_SECONDS마다 재집계로 맞춘다.
+- Qdrant 건수: 백그라운드 루프가 STATS_QDRANT_REFRESH_SECONDS마다 코퍼스 버전을 보고
+  바뀌었을 때만 다시 센다 (바뀌지 않아도 STATS_QDRANT_MAX_AGE_SECONDS마다 한 번은 확인 → /ready 판단).
+"""
+
+import asyncio
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from rag.corpus import get_corpus_version
+
+load_dotenv()
+
+DATA_LOD_PATH = os.getenv("DATA_LOD_PATH", "./data/lod_nexon")
+DATA_CAFE_PATH = os.getenv("DATA_CAFE_PATH", "./data/naver_cafe")
+DATA_BOOKMARK_PATH = os.getenv("DATA_BOOKMARK_PATH", "./data/bookmarks")
+STATS_QDRANT_REFRESH_SECONDS = float(os.getenv("STATS_QDRANT_REFRESH_SECONDS", "30"))
+STATS_QDRANT_MAX_AGE_SECONDS = float(os.getenv("STATS_QDRANT_MAX_AGE_SECONDS", "300"))
+STATS_RESCAN_SECONDS = float(os.getenv("STATS_RESCAN_SECONDS", "3600"))
+
+SOURCE_PATHS = {"lod_nexon": DATA_LOD_PATH, "naver_cafe": DATA_CAFE_PATH}
+
+_lock = threading.Lock()
+_counts = {
+    "raw_posts": {source: 0 for source in SOURCE_PATHS},
+    "images": {source: 0 for source in SOURCE_PATHS},
+    "bookmarks": 0
+}
+_qdrant: dict = {}
+_qdrant_state = {"ok": None, "version": None, "checked_at": 0.0, "updated_at": None, "error": None}
+_scanned_at: str | None = None
+_task: asyncio.Task | None = None
+
+
+def record_post(source: str, has_images: bool = False):
+    """
+    원본 게시글 1건 저장.
+    images 카운터는 이미지 장수가 아니라 이미지 폴더(images/{post_id}/)가 있는 게시글 수 (기존 /stats와 같은 단위)
+    """
+    with _lock:
+        if source in _counts["raw_posts"]:
+            _counts["raw_posts"][source] += 1
+            if has_images:
+                _counts["images"][source] += 1
+
+
+def record_bookmark(delta: int = 1):
+    """책갈피 JSON 생성(+1) / 삭제(-1)"""
+    with _lock:
+        _counts["bookmarks"] = max(0, _counts["bookmarks"] + delta)
+
+
+def scan_files() -> dict:
+    """데이터 디렉토리 전체 재집계 (블로킹 — 백그라운드에서만 호출)"""
+    global _scanned_at
+    raw_posts, images = {}, {}
+    for source, path in SOURCE_PATHS.items():
+        raw_posts[source] = len(glob.glob(os.path.join(path, "*.json")))
+        # 게시글별 이미지 폴더 수
+        images[source] = len(glob.glob(os.path.join(path, "images", "*", "")))
+    bookmarks = len(glob.glob(os.path.join(DATA_BOOKMARK_PATH, "*.json")))
+
+    with _lock:
+        _counts["raw_posts"] = raw_posts
+        _counts["images"] = images
+        _counts["bookmarks"] = bookmarks
+        _scanned_at = datetime.now().isoformat(timespec="seconds")
+    return snapshot()
+
+
+def refresh_qdrant(embedder, force: bool = False) -> bool:
+    """
+    코퍼스 버전이 바뀌었거나 마지막 확인이 오래됐으면 Qdrant 건수 다시 세기 (블로킹).
+    반환: Qdrant 응답 여부
+    """
+    version = get_corpus_version()
+    now = time.monotonic()
+    with _lock:
+        fresh = (
+            _qdrant_state["ok"]
+            and _qdrant_state["version"] == version
+            and now - _qdrant_state["checked_at"] < STATS_QDRANT_MAX_AGE_SECONDS
+        )
+    if fresh and not force:
+        return True
+
+    if embedder is None:
+        result, error = None, "Qdrant 미연결"
+    else:
+        try:
+            result, error = embedder.count_stats(), None
+        except Exception as e:
+            result, error = None, str(e)
+
+    with _lock:
+        _qdrant_state.update(ok=error is None, checked_at=now, error=error)
+        if result is not None:
+            _qdrant.clear()
+            _qdrant.update(result)
+            _qdrant_state["version"] = version
+            _qdrant_state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    if error:
+        logger.warning(f"Qdrant 통계 갱신 실패: {error}")
+    return error is None
+
+
+def qdrant_stats() -> dict:
+    """마지막으로 센 Qdrant 건수 (아직 없으면 0)"""
+    with _lock:
+        return dict(_qdrant) or {"total_bookmarks": 0, "lod_nexon": 0, "naver_cafe": 0}
+
+
+def readiness() -> dict:
+    """준비 상태: 파일 집계 완료 + 마지막 Qdrant 확인 성공"""
+    with _lock:
+        checks = {
+            "files_scanned": _scanned_at is not None,
+            "qdrant": bool(_qdrant_state["ok"])
+        }
+        error = _qdrant_state["error"]
+    return {"ready": all(checks.values()), "checks": checks, "error": error}
+
+
+def snapshot() -> dict:
+    """현재 카운터 (메모리 값만 읽음)"""
+    with _lock:
+        return {
+            "raw_posts": dict(_counts["raw_posts"]),
+            "images": dict(_counts["images"]),
+            "bookmarks": _counts["bookmarks"],
+            "qdrant": dict(_qdrant) or {"total_bookmarks": 0, "lod_nexon": 0, "naver_cafe": 0},
+            "updated": {
+                "files_scanned_at": _scanned_at,
+                "qdrant_updated_at": _qdrant_state["updated_at"]
+            }
+        }
+
+
+async def _refresh_loop(get_embedder):
+    last_scan = None
+    while True:
+        try:
+            if last_scan is None or time.monotonic() - last_scan >= STATS_RESCAN_SECONDS:
+                await asyncio.to_thread(scan_files)
+                last_scan = time.monotonic()
+            await asyncio.to_thread(refresh_qdrant, get_embedder())
+        except Exception as e:
+            logger.warning(f"통계 갱신 실패: {e}")
+        await asyncio.sleep(STATS_QDRANT_REFRESH_SECONDS)
+
+
+def start_stats_refresher(get_embedder):
+    """백그라운드 갱신 시작 (get_embedder: 현재 Embedder 또는 None을 돌려주는 함수)"""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_refresh_loop(get_embedder))
+
+
+async def stop_stats_refresher():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -207,6 +207,40 @@ app.post('/ask/search', async (req, res) => {
   }
 });
 
+// RAG 스트리밍 검색 (/ask/search/stream) - 웹 UI 연동 (SSE 그대로 중계)
+app.post('/ask/search/stream', async (req, res) => {
+  const { query, source_filter } = req.body;
+  if (!query) {
+    return res.status(400).json({ success: false, answer: '검색어를 입력해주세요.', sources: [] });
+  }
+
+  try {
+    const upstream = await axios.post(`${process.env.RAG_SERVER_URL || 'http://localhost:8100'}/search/stream`, {
+      query,
+      source_filter: source_filter || null
+    }, { responseType: 'stream', timeout: 30000 });
+
+    res.setHeader('Content-Type', 'text/event-stream; charset=utf-8');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('X-Accel-Buffering', 'no');
+    res.flushHeaders();
+
+    // pipe()는 원본 스트림 오류를 넘겨주지 않으므로 직접 처리 (없으면 프로세스 전체가 죽음)
+    upstream.data.on('error', (error) => {
+      console.error('RAG stream upstream error:', error.message);
+      res.end();
+    });
+    upstream.data.pipe(res);
+    // 요청 본문은 express.json()이 이미 읽었으므로 req가 아닌 res의 close로 클라이언트 이탈 감지
+    res.on('close', () => upstream.data.destroy());
+  } catch (error) {
+    console.error('RAG stream error:', error.message);
+    if (!res.headersSent) {
+      res.status(500).json({ success: false, answer: 'RAG 검색 중 오류가 발생했습니다.', sources: [] });
+    }
+  }
+});
+
 // 공지사항 조회 (/ask/notice) - Rate limiting 적용
 app.post('/ask/notice', async (req, res) => {
   try {